@@ -0,0 +1,88 @@
+"""
+Microbenchmark comparing the `CommitStrategy` options.
+
+The committer records offsets in a Java `HashMap`, and every event exposes its source partition as a Java
+`HashMap`, so each `markProcessed` call and each partition lookup is a real Python to Java call, like with
+the Debezium engine.
+
+Usage:
+    python benchmarks/bench_commit_strategy.py --batch-size 10000 --partitions 1 --repeat 5
+"""
+import argparse
+import time
+
+from pydbzengine import CommitStrategy, RecordCommitter, ChangeEvent
+from jnius import autoclass
+
+JavaHashMap = autoclass('java.util.HashMap')
+
+
+class BenchSourceRecord:
+    def __init__(self, source_partition):
+        self._source_partition = source_partition
+
+    def sourcePartition(self):
+        return self._source_partition
+
+
+class BenchChangeEvent(ChangeEvent):
+    def __init__(self, offset: int, source_partition):
+        self.offset = offset
+        self._source_record = BenchSourceRecord(source_partition)
+
+    def sourceRecord(self):
+        return self._source_record
+
+
+class JavaOffsetsCommitter(RecordCommitter):
+    """Stores the offset of every marked record in a Java map, one Python to Java call per record."""
+
+    def __init__(self):
+        self.offsets = JavaHashMap()
+        self.calls = 0
+
+    def markProcessed(self, record):
+        self.calls += 1
+        self.offsets.put(record.sourceRecord().sourcePartition(), record.offset)
+
+    def markBatchFinished(self):
+        self.calls += 1
+
+
+def make_batch(batch_size: int, partitions: int) -> list:
+    source_partitions = []
+    for i in range(partitions):
+        source_partition = JavaHashMap()
+        source_partition.put("server", "bench")
+        source_partition.put("database", f"db{i}")
+        source_partitions.append(source_partition)
+    return [BenchChangeEvent(offset=i, source_partition=source_partitions[i % partitions]) for i in range(batch_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--partitions", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    records = make_batch(batch_size=args.batch_size, partitions=args.partitions)
+    print(f"batch size: {args.batch_size}, source partitions: {args.partitions}, repeat: {args.repeat}")
+    for strategy in CommitStrategy:
+        if strategy == CommitStrategy.LAST_RECORD and args.partitions > 1:
+            continue  # not safe with multiple source partitions
+        timings = []
+        calls = 0
+        for _ in range(args.repeat):
+            committer = JavaOffsetsCommitter()
+            start = time.perf_counter()
+            strategy.commit(records=records, committer=committer)
+            timings.append(time.perf_counter() - start)
+            calls = committer.calls
+        best = min(timings)
+        print(f"{strategy.name:<20} committer calls: {calls:>8}  best: {best * 1000:10.3f} ms  "
+              f"({args.batch_size / best:,.0f} records/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark of `DltChangeHandler` loading to DuckDB: one pipeline run per batch with the events normalized by dlt
+(the default), Arrow tables per batch (`arrow=True`), and Arrow tables buffered across batches (`flush_max_rows`).
+
+Usage:
+    python benchmarks/bench_dlt_arrow.py --batches 20 --batch-size 500 --tables 2
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import dlt
+
+from pydbzengine import ChangeEvent
+from pydbzengine.handlers.dlt import DltChangeHandler
+
+
+class BenchChangeEvent(ChangeEvent):
+    def __init__(self, key: str, value: str, destination: str):
+        self._key = key
+        self._value = value
+        self._destination = destination
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def destination(self):
+        return self._destination
+
+    def partition(self):
+        return None
+
+
+def make_batches(batches: int, batch_size: int, tables: int) -> list:
+    result = []
+    for b in range(batches):
+        records = []
+        for i in range(batch_size):
+            id = b * batch_size + i
+            value = {"before": None,
+                     "after": {"id": id, "name": f"row {id}", "price": id * 0.5},
+                     "source": {"connector": "postgresql", "db": "postgres", "table": f"table_{id % tables}",
+                                "lsn": 1000 + id, "ts_ms": 1700000000000 + id},
+                     "op": "c", "ts_ms": 1700000000000 + id}
+            records.append(BenchChangeEvent(json.dumps({"id": id}, separators=(",", ":")),
+                                            json.dumps(value, separators=(",", ":")),
+                                            f"bench.inventory.table_{id % tables}"))
+        result.append(records)
+    return result
+
+
+def run(batches: list, **handler_args) -> float:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        pipeline = dlt.pipeline(pipeline_name="bench_dlt", pipelines_dir=str(tmp.joinpath("pipelines")),
+                                destination=dlt.destinations.duckdb(str(tmp.joinpath("bench.duckdb"))),
+                                dataset_name="dbz_data")
+        handler = DltChangeHandler(dlt_pipeline=pipeline, **handler_args)
+        start = time.perf_counter()
+        for records in batches:
+            handler.handleJsonBatch(records)
+        handler.close()
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--tables", type=int, default=2)
+    args = parser.parse_args()
+    logging.getLogger("dlt").setLevel(logging.ERROR)
+
+    batches = make_batches(args.batches, args.batch_size, args.tables)
+    events = args.batches * args.batch_size
+    print(f"{args.batches} batches of {args.batch_size} events to {args.tables} tables")
+    modes = {
+        "json per batch": {},
+        "arrow per batch": {"arrow": True},
+        "arrow buffered": {"arrow": True, "flush_max_rows": events},
+    }
+    for name, handler_args in modes.items():
+        elapsed = run(batches, **handler_args)
+        print(f"{name:<16} {elapsed:8.2f} s  {events / elapsed:10,.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
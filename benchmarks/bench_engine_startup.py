@@ -0,0 +1,68 @@
+"""
+Compares the engine startup time without and with a Class Data Sharing archive, see `pydbzengine.cds`.
+
+Each start runs in a fresh Python process and measures the time from `import pydbzengine` until the
+engine is built. The archive is trained with the same configuration before the archived starts,
+in a separate archive directory, so existing archives are not used or replaced.
+
+Usage:
+    python benchmarks/bench_engine_startup.py --properties-file engine.properties --repeat 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+from pydbzengine import DebeziumJsonEngine, BasePythonChangeHandler, jvm
+from pydbzengine.cds import read_properties_file
+error = ""
+try:
+    DebeziumJsonEngine(properties=read_properties_file(sys.argv[1]), handler=BasePythonChangeHandler())
+except Exception as e:
+    # the connector may not be startable here, the classes loaded until the failure are still measured
+    error = type(e).__name__
+elapsed = time.perf_counter() - start
+print(elapsed, jvm.cds_archive_file() is not None, error)
+"""
+
+
+def measure(properties_file: Path, env: dict):
+    result = subprocess.run([sys.executable, "-c", SCRIPT, properties_file.as_posix()],
+                            capture_output=True, text=True, check=True, env=env)
+    elapsed, archived, *error = result.stdout.strip().splitlines()[-1].split()
+    return float(elapsed), archived == "True", " ".join(error)
+
+
+def run_case(name: str, properties_file: Path, env: dict, repeat: int):
+    timings = []
+    archived, error = False, ""
+    for _ in range(repeat):
+        elapsed, archived, error = measure(properties_file, env)
+        timings.append(elapsed)
+    timings.sort()
+    print(f"{name:<12} best: {timings[0] * 1000:9.1f} ms  median: {timings[len(timings) // 2] * 1000:9.1f} ms  "
+          f"archive used: {archived}" + (f"  (engine build failed: {error})" if error else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--properties-file", required=True, type=Path)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--training-duration", type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cds_dir:
+        env = {**os.environ, "PYDBZENGINE_CDS": "true", "PYDBZENGINE_CDS_DIR": cds_dir}
+        run_case("cold", args.properties_file, env, args.repeat)
+        subprocess.run([sys.executable, "-m", "pydbzengine.cds", "--properties-file", args.properties_file.as_posix(),
+                        "--duration", str(args.training_duration)], capture_output=True, env=env)
+        run_case("archived", args.properties_file, env, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
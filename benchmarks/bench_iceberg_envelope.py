@@ -0,0 +1,97 @@
+"""
+Microbenchmark comparing the conversion of a batch of Debezium JSON events to the Arrow table written by
+`IcebergChangeHandler`: the per-event path (`json.loads`, `json.dumps` of `source`, `before` and `after`,
+`uuid.uuid5` per key and `pa.Table.from_pylist`) against the vectorized path (envelope scanning, bulk key hashing
+and direct column building). Nothing is written to Iceberg.
+
+Usage:
+    python benchmarks/bench_iceberg_envelope.py --batch-size 10000 --columns 20 --repeat 5
+"""
+import argparse
+import datetime
+import json
+import time
+
+import pyarrow as pa
+
+from pydbzengine import ChangeEvent
+from pydbzengine.handlers.iceberg import IcebergChangeHandler
+
+
+class BenchChangeEvent(ChangeEvent):
+    def __init__(self, key: str, value: str):
+        self._key = key
+        self._value = value
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def destination(self):
+        return "bench.inventory.customers"
+
+    def partition(self):
+        return None
+
+
+def make_batch(batch_size: int, columns: int) -> list:
+    records = []
+    for i in range(batch_size):
+        row = {"id": i, **{f"col_{c}": f"value {c} of row {i}" for c in range(columns - 1)}}
+        value = {
+            "before": row,
+            "after": {**row, "col_0": "updated"},
+            "source": {"version": "3.2.0.Final", "connector": "postgresql", "name": "bench", "ts_ms": 1700000000000,
+                       "snapshot": "false", "db": "postgres", "sequence": f"[null,\"{i}\"]", "schema": "inventory",
+                       "table": "customers", "txId": i, "lsn": 100000 + i, "xmin": None},
+            "transaction": None,
+            "op": "u",
+            "ts_ms": 1700000000000 + i,
+            "ts_us": 1700000000000000 + i,
+            "ts_ns": 1700000000000000000 + i,
+        }
+        # compact like the Debezium JSON converter
+        records.append(BenchChangeEvent(json.dumps({"id": i}, separators=(",", ":")),
+                                        json.dumps(value, separators=(",", ":"))))
+    return records
+
+
+def row_path(handler: IcebergChangeHandler, records: list, consumed_at) -> pa.Table:
+    rows = [handler._transform_event_to_row_dict(record=r, consumed_at=consumed_at) for r in records]
+    return pa.Table.from_pylist(mapping=rows, schema=handler._target_arrow_schema)
+
+
+def vectorized_path(handler: IcebergChangeHandler, records: list, consumed_at) -> pa.Table:
+    return handler._records_to_arrow_table(records=records, consumed_at=consumed_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    handler = IcebergChangeHandler(catalog=None, destination_namespace=("bench",))
+    records = make_batch(args.batch_size, args.columns)
+    consumed_at = datetime.datetime.now(datetime.timezone.utc)
+    payload_mb = sum(len(r.value()) for r in records) / 1024 / 1024
+    print(f"batch: {args.batch_size} events, {payload_mb:.1f} MB of JSON")
+
+    results = {}
+    for name, path in [("per-event", row_path), ("vectorized", vectorized_path)]:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            table = path(handler, records, consumed_at)
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+        assert table.num_rows == args.batch_size
+        print(f"{name:<12} best: {min(timings) * 1000:9.1f} ms  {args.batch_size / min(timings):12,.0f} events/s")
+    print(f"speedup: {results['per-event'] / results['vectorized']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
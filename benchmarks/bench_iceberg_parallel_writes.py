@@ -0,0 +1,104 @@
+"""
+Benchmark of fan-out batches written by `IcebergChangeHandler`, with the tables written one by one and with
+`max_parallel_writes`. Uses a local SQLite catalog and warehouse directory, `--latency-ms` adds a delay to every
+data file write to simulate an object store.
+
+Usage:
+    python benchmarks/bench_iceberg_parallel_writes.py --tables 40 --rows 1000 --max-parallel-writes 8 --latency-ms 50
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from pyiceberg.catalog.sql import SqlCatalog
+from pyiceberg.io.pyarrow import PyArrowFileIO
+
+from pydbzengine import ChangeEvent
+from pydbzengine.handlers.iceberg import IcebergChangeHandler
+
+
+class BenchChangeEvent(ChangeEvent):
+    def __init__(self, key: str, value: str, destination: str):
+        self._key = key
+        self._value = value
+        self._destination = destination
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def destination(self):
+        return self._destination
+
+    def partition(self):
+        return None
+
+
+def make_batch(tables: int, rows: int) -> list:
+    records = []
+    for t in range(tables):
+        for i in range(rows):
+            value = {"before": None, "after": {"id": i, "name": f"row {i}"}, "source": {"table": f"table_{t}"},
+                     "op": "c", "ts_ms": 1700000000000 + i}
+            records.append(BenchChangeEvent(json.dumps({"id": i}, separators=(",", ":")),
+                                            json.dumps(value, separators=(",", ":")), f"bench.inventory.table_{t}"))
+    return records
+
+
+def slow_file_io(latency_sec: float):
+    new_output = PyArrowFileIO.new_output
+
+    def new_output_with_latency(self, location):
+        if location.endswith(".parquet"):
+            time.sleep(latency_sec)
+        return new_output(self, location)
+
+    PyArrowFileIO.new_output = new_output_with_latency
+
+
+def run(records: list, max_parallel_writes: int, repeat: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        warehouse = Path(tmp_dir)
+        catalog = SqlCatalog("bench", uri=f"sqlite:///{warehouse.joinpath('catalog.db').as_posix()}",
+                             warehouse=warehouse.as_uri())
+        catalog.create_namespace(("bench",))
+        handler = IcebergChangeHandler(catalog=catalog, destination_namespace=("bench",),
+                                       max_parallel_writes=max_parallel_writes)
+        handler.handleJsonBatch(records)  # creates the tables
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            handler.handleJsonBatch(records)
+            timings.append(time.perf_counter() - start)
+        handler.close()
+        catalog.engine.dispose()
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=1000, help="Events per table in the batch")
+    parser.add_argument("--max-parallel-writes", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.latency_ms > 0:
+        slow_file_io(args.latency_ms / 1000)
+    records = make_batch(args.tables, args.rows)
+    print(f"batch: {len(records)} events to {args.tables} tables")
+    results = {}
+    for workers in sorted({1, args.max_parallel_writes}):
+        results[workers] = run(records, workers, args.repeat)
+        print(f"max_parallel_writes={workers:<3} best: {results[workers] * 1000:9.1f} ms  "
+              f"{len(records) / results[workers]:12,.0f} events/s")
+    print(f"speedup: {results[1] / results[args.max_parallel_writes]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measures the import time of pydbzengine modules, each import runs in a fresh Python process.
+
+Importing pydbzengine and the handler modules must not start the JVM, the JVM is started on first use of a
+Java class. The last row shows the JVM startup cost for comparison.
+
+Usage:
+    python benchmarks/bench_import_time.py --repeat 5
+"""
+import argparse
+import subprocess
+import sys
+
+CASES = {
+    "import pydbzengine": "import pydbzengine",
+    "import pydbzengine.handlers.iceberg": "import pydbzengine.handlers.iceberg",
+    "import pydbzengine.handlers.dlt": "import pydbzengine.handlers.dlt",
+    "import pydbzengine + start JVM": "import pydbzengine; pydbzengine.Properties()",
+}
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed, 'jnius' in sys.modules)
+"""
+
+
+def measure(statement: str):
+    result = subprocess.run([sys.executable, "-c", SCRIPT.format(statement=statement)],
+                            capture_output=True, text=True, check=True)
+    elapsed, jvm_started = result.stdout.strip().splitlines()[-1].split()
+    return float(elapsed), jvm_started == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, statement in CASES.items():
+        try:
+            timings = []
+            jvm_started = False
+            for _ in range(args.repeat):
+                elapsed, jvm_started = measure(statement)
+                timings.append(elapsed)
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<40} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{name:<40} best: {min(timings) * 1000:9.1f} ms  JVM started: {jvm_started}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Database-free benchmark suite of the consumer and the built-in handlers, driven by synthetic Debezium events.
+
+Runners:
+    consumer  `PythonChangeConsumer.handleBatch` with a handler reading every record, and a fake committer
+    iceberg   `IcebergChangeHandler` with a SQLite catalog and a local warehouse directory
+    dlt       `DltChangeHandler` loading to DuckDB, `--dlt-arrow`, `--dlt-flush-rows` and `--dlt-write-disposition`
+              select the mode
+
+Every runner runs in its own process, so the peak RSS is the one of the runner. Reports events/s, the p50 and p99
+batch latency and the peak RSS, and saves them as JSON. `--compare` prints the change against a saved result and
+exits with 1 when the events/s of a runner dropped by more than `--tolerance`.
+
+Usage:
+    python benchmarks/bench_suite.py --batches 50 --batch-size 1000 --output results.json
+    python benchmarks/bench_suite.py --runners iceberg --row-width 40 --tables 8 --compare results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydbzengine import ChangeEvent, RecordCommitter, BasePythonChangeHandler, to_payload
+
+
+class BenchChangeEvent(ChangeEvent):
+    def __init__(self, key: Optional[str], value: Optional[str], destination: str):
+        self._key = key
+        self._value = value
+        self._destination = destination
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def destination(self):
+        return self._destination
+
+    def partition(self):
+        return None
+
+
+class FakeRecordCommitter(RecordCommitter):
+    """
+    Counts the acknowledged records and batches.
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.finished_batches = 0
+
+    def markProcessed(self, record):
+        self.processed += 1
+
+    def markBatchFinished(self):
+        self.finished_batches += 1
+
+
+class SyntheticEventGenerator:
+    """
+    Generates Debezium change events of PostgreSQL tables, in the JSON format of the engine (without schema).
+
+    Args:
+        row_width: Number of columns of the rows, of mixed types (integer, text, decimal as double, boolean,
+            timestamp in microseconds).
+        tables: Number of source tables the events are spread over.
+        op_mix: Relative frequency of the operations `c`, `u` and `d`, updates and deletes change existing rows.
+        tombstones: Emit a tombstone after every delete, like Debezium with `tombstones.on.delete=true`.
+        seed: Seed of the random generator, the same arguments generate the same events.
+    """
+
+    def __init__(self, row_width: int = 10, tables: int = 4, op_mix: Optional[Dict[str, float]] = None,
+                 tombstones: bool = True, seed: int = 42):
+        if row_width < 1 or tables < 1:
+            raise ValueError("row_width and tables must be greater than 0!")
+        self.row_width = row_width
+        self.tables = tables
+        self.op_mix = op_mix or {"c": 0.6, "u": 0.3, "d": 0.1}
+        self.tombstones = tombstones
+        self.random = random.Random(seed)
+        self.next_id = [1] * tables
+        self.live_ids: List[List[int]] = [[] for _ in range(tables)]
+        self.lsn = 10_000_000
+        self.ts_ms = 1_700_000_000_000
+
+    def _row(self, id: int) -> dict:
+        row = {"id": id}
+        for column in range(1, self.row_width):
+            kind = column % 5
+            if kind == 0:
+                row[f"c{column}"] = self.random.randint(0, 1 << 40)
+            elif kind == 1:
+                row[f"c{column}"] = f"value {self.random.randint(0, 1 << 20)} of column {column}"
+            elif kind == 2:
+                row[f"c{column}"] = round(self.random.uniform(0, 10_000), 2)
+            elif kind == 3:
+                row[f"c{column}"] = self.random.random() < 0.5
+            else:
+                row[f"c{column}"] = self.ts_ms * 1000 + self.random.randint(0, 1 << 30)
+        return row
+
+    def _op(self, table: int) -> str:
+        op = self.random.choices(list(self.op_mix), weights=list(self.op_mix.values()))[0]
+        return op if op == "c" or self.live_ids[table] else "c"
+
+    def events(self, count: int) -> List[BenchChangeEvent]:
+        """
+        Returns the next `count` events, tombstones included.
+        """
+        result = []
+        while len(result) < count:
+            table = self.random.randrange(self.tables)
+            op = self._op(table)
+            if op == "c":
+                id = self.next_id[table]
+                self.next_id[table] += 1
+                self.live_ids[table].append(id)
+                before, after = None, self._row(id)
+            else:
+                ids = self.live_ids[table]
+                position = self.random.randrange(len(ids))
+                id = ids[position]
+                before = self._row(id)
+                after = self._row(id) if op == "u" else None
+                if op == "d":
+                    ids[position] = ids[-1]
+                    ids.pop()
+            self.lsn += self.random.randint(50, 500)
+            self.ts_ms += self.random.randint(0, 3)
+            source = {"version": "3.1.0.Final", "connector": "postgresql", "name": "bench", "ts_ms": self.ts_ms,
+                      "snapshot": "false", "db": "postgres", "sequence": f'["{self.lsn - 100}","{self.lsn}"]',
+                      "schema": "inventory", "table": f"table_{table}", "txId": self.lsn // 100,
+                      "lsn": self.lsn, "xmin": None}
+            value = {"before": before, "after": after, "source": source, "transaction": None, "op": op,
+                     "ts_ms": self.ts_ms + 5, "ts_us": (self.ts_ms + 5) * 1000, "ts_ns": (self.ts_ms + 5) * 1000000}
+            key = json.dumps({"id": id}, separators=(",", ":"))
+            destination = f"bench.inventory.table_{table}"
+            result.append(BenchChangeEvent(key, json.dumps(value, separators=(",", ":")), destination))
+            if op == "d" and self.tombstones:
+                result.append(BenchChangeEvent(key, None, destination))
+        return result
+
+    def batches(self, batches: int, batch_size: int) -> List[List[BenchChangeEvent]]:
+        return [self.events(batch_size) for _ in range(batches)]
+
+
+class ReadingChangeHandler(BasePythonChangeHandler):
+    """
+    Reads the destination and the value of every record, the minimum work of any handler.
+    """
+
+    def __init__(self):
+        self.nbytes = 0
+
+    def handleJsonBatch(self, records: List[ChangeEvent]):
+        for record in records:
+            record.destination()
+            value = to_payload(record.value())
+            if value is not None:
+                self.nbytes += len(value)
+
+
+def _timed_batches(handle_batch: Callable[[list], None], batches: List[list], warmup: int) -> Tuple[List[float], int]:
+    """
+    Returns the time of each batch after the warmup, and the number of measured events.
+    """
+    for records in batches[:warmup]:
+        handle_batch(records)
+    timings = []
+    for records in batches[warmup:]:
+        start = time.perf_counter()
+        handle_batch(records)
+        timings.append(time.perf_counter() - start)
+    return timings, sum(len(records) for records in batches[warmup:])
+
+
+def _without_tombstones(batches: List[list]) -> List[list]:
+    return [[record for record in records if record.value() is not None] for records in batches]
+
+
+def run_consumer(batches: List[list], args) -> Tuple[List[float], int]:
+    from pydbzengine import PythonChangeConsumer
+
+    consumer = PythonChangeConsumer()
+    consumer.set_change_handler(ReadingChangeHandler())
+    committer = FakeRecordCommitter()
+    timings, events = _timed_batches(lambda records: consumer.handleBatch(records, committer), batches, args.warmup)
+    consumer.close()
+    return timings, events
+
+
+def run_iceberg(batches: List[list], args) -> Tuple[List[float], int]:
+    from pyiceberg.catalog.sql import SqlCatalog
+    from pydbzengine.handlers.iceberg import IcebergChangeHandler
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        warehouse = Path(tmp_dir)
+        catalog = SqlCatalog("bench", uri=f"sqlite:///{warehouse.joinpath('catalog.db').as_posix()}",
+                             warehouse=warehouse.as_uri())
+        catalog.create_namespace(("bench",))
+        handler = IcebergChangeHandler(catalog=catalog, destination_namespace=("bench",),
+                                       max_parallel_writes=args.iceberg_parallel_writes)
+        # the append handler stores the events as they are, tombstones have no event to store
+        batches = _without_tombstones(batches)
+        timings, events = _timed_batches(handler.handleJsonBatch, batches, args.warmup)
+        handler.close()
+        catalog.engine.dispose()
+    return timings, events
+
+
+def run_dlt(batches: List[list], args) -> Tuple[List[float], int]:
+    os.environ.setdefault("RUNTIME__LOG_LEVEL", "ERROR")
+    import dlt
+    from pydbzengine.handlers.dlt import DltChangeHandler
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        pipeline = dlt.pipeline(pipeline_name="bench_suite", pipelines_dir=str(tmp.joinpath("pipelines")),
+                                destination=dlt.destinations.duckdb(str(tmp.joinpath("bench.duckdb"))),
+                                dataset_name="dbz_data")
+        handler = DltChangeHandler(dlt_pipeline=pipeline, arrow=args.dlt_arrow, flush_max_rows=args.dlt_flush_rows,
+                                   write_disposition=args.dlt_write_disposition)
+        if args.dlt_write_disposition == "append" and not args.dlt_arrow and not args.dlt_flush_rows:
+            # the events are parsed one by one, tombstones have no event to parse
+            batches = _without_tombstones(batches)
+        timings, events = _timed_batches(handler.handleJsonBatch, batches, args.warmup)
+        # the buffered events are part of the measured work
+        start = time.perf_counter()
+        handler.close()
+        if timings:
+            timings[-1] += time.perf_counter() - start
+    return timings, events
+
+
+RUNNERS = {"consumer": run_consumer, "iceberg": run_iceberg, "dlt": run_dlt}
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Percentile with linear interpolation between the closest ranks.
+    """
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = q * (len(ordered) - 1)
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def _run_runner(name: str, args, results):
+    generator = SyntheticEventGenerator(row_width=args.row_width, tables=args.tables, op_mix=args.op_mix,
+                                        tombstones=not args.no_tombstones, seed=args.seed)
+    batches = generator.batches(args.warmup + args.batches, args.batch_size)
+    timings, events = RUNNERS[name](batches, args)
+    results.put({
+        "events": events,
+        "batches": len(timings),
+        "seconds": sum(timings),
+        "events_per_sec": events / sum(timings),
+        "p50_batch_ms": percentile(timings, 0.5) * 1000,
+        "p99_batch_ms": percentile(timings, 0.99) * 1000,
+        "mean_batch_ms": statistics.mean(timings) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    })
+
+
+def run_isolated(name: str, args) -> dict:
+    """
+    Runs the runner in a new process, the peak RSS then excludes the other runners.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_runner, args=(name, args, results), name=f"bench-{name}")
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Runner {name} failed with exit code {process.exitcode}")
+    return results.get()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """
+    Prints the change of each runner against the baseline, returns False if the events/s of a runner dropped
+    by more than the tolerance.
+    """
+    ok = True
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        change = result["events_per_sec"] / base["events_per_sec"] - 1
+        regression = change < -tolerance
+        ok = ok and not regression
+        print(f"{name:<10} events/s {change:+7.1%}  p99 {result['p99_batch_ms'] / base['p99_batch_ms'] - 1:+7.1%}"
+              f"  peak RSS {result['peak_rss_mb'] - base['peak_rss_mb']:+8.1f} MB"
+              f"{'  REGRESSION' if regression else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runners", default=",".join(RUNNERS), help="Comma separated runners")
+    parser.add_argument("--batches", type=int, default=20, help="Measured batches per runner")
+    parser.add_argument("--warmup", type=int, default=2, help="Batches run before the measurement")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--row-width", type=int, default=10, help="Columns of the source rows")
+    parser.add_argument("--tables", type=int, default=4, help="Source tables the events are spread over")
+    parser.add_argument("--op-mix", type=json.loads, default={"c": 0.6, "u": 0.3, "d": 0.1},
+                        help='Relative frequency of the operations, e.g. \'{"c": 1, "u": 4}\'')
+    parser.add_argument("--no-tombstones", action="store_true", help="Don't emit tombstones after deletes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iceberg-parallel-writes", type=int, default=1)
+    parser.add_argument("--dlt-arrow", action="store_true")
+    parser.add_argument("--dlt-flush-rows", type=int, default=0)
+    parser.add_argument("--dlt-write-disposition", choices=("append", "merge"), default="append")
+    parser.add_argument("--output", help="Saves the results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed events/s drop with --compare")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.runners.split(",") if name.strip()]
+    unknown = set(names) - set(RUNNERS)
+    if unknown:
+        parser.error(f"Unknown runners: {', '.join(sorted(unknown))}")
+    print(f"{args.batches} batches of {args.batch_size} events, {args.tables} tables, {args.row_width} columns")
+    results = {}
+    for name in names:
+        result = results[name] = run_isolated(name, args)
+        print(f"{name:<10} {result['events_per_sec']:12,.0f} events/s  p50 {result['p50_batch_ms']:9.2f} ms  "
+              f"p99 {result['p99_batch_ms']:9.2f} ms  peak RSS {result['peak_rss_mb']:8.1f} MB")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"saved {args.output}")
+    if args.compare:
+        if not compare(results, json.loads(Path(args.compare).read_text()), args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,29 @@
-import traceback
+import threading
+import time
 from abc import ABC
-from pathlib import Path
-from typing import List
+from concurrent.futures import Future
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING, Callable, List, Optional, Union
 
-################# INIT PYJNIUS ####################
-# Define paths to Debezium Java libraries and configuration directory.
-DEBEZIUM_JAVA_LIBS_DIR = Path(__file__).parent.joinpath("debezium/libs/*").as_posix()
-DEBEZIUM_CONF_DIR = Path(__file__).parent.joinpath("config").as_posix()
-CLASS_PATHS = [DEBEZIUM_JAVA_LIBS_DIR, DEBEZIUM_CONF_DIR]
+from pydbzengine.jvm import java_class, to_java_properties, call_overload, detach_thread, JAVA_CLASSES, \
+    DEBEZIUM_JAVA_LIBS_DIR, DEBEZIUM_CONF_DIR
+from pydbzengine.metrics import MetricsSink
 
-# Add current working directory's config folder to classpath if exists
-CONFIG_DIR = Path().cwd().joinpath('config')
-if CONFIG_DIR.is_dir() and CONFIG_DIR.exists():
-    print(f"Adding classpath: {CONFIG_DIR.as_posix()}")
-    CLASS_PATHS.append(CONFIG_DIR.as_posix())
+if TYPE_CHECKING:
+    from pydbzengine.errors import ErrorPolicy  # pydbzengine.errors imports this module
 
-import jnius_config
-
-# Add the necessary classpaths for JNI interaction with Java.
-jnius_config.add_classpath(*CLASS_PATHS)
-
-from jnius import autoclass
-from jnius import PythonJavaClass, java_method, JavaMethod
 
 ################# JAVA REFLECTION CLASSES #################
-# Import Java classes using jnius's autoclass for reflection.
-Properties = autoclass('java.util.Properties')
-DebeziumEngine = autoclass('io.debezium.engine.DebeziumEngine')
-DebeziumEngineBuilder = autoclass('io.debezium.engine.DebeziumEngine$Builder')
-
-# Override the notifying method of DebeziumEngineBuilder to use the correct JavaMethod signature.
-# This is a workaround for a potential jnius issue where the wrong Java method is called.
-DebeziumEngineBuilder.notifying = JavaMethod(
-    '(Lio/debezium/engine/DebeziumEngine$ChangeConsumer;)Lio/debezium/engine/DebeziumEngine$Builder;')
-
-StopEngineException = autoclass('io.debezium.engine.StopEngineException')
-JavaLangSystem = autoclass('java.lang.System')
-JavaLangThread = autoclass('java.lang.Thread')
+# Java classes (`Properties`, `DebeziumEngine`, `JavaLangThread` ...) and the `PythonChangeConsumer` are resolved
+# lazily on first access, importing pydbzengine doesn't start the JVM. See `pydbzengine.jvm`.
+def __getattr__(name: str):
+    if name == "PythonChangeConsumer":
+        from pydbzengine.consumer import PythonChangeConsumer
+        return PythonChangeConsumer
+    if name in JAVA_CLASSES:
+        return java_class(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class RecordCommitter(ABC):
@@ -77,11 +64,97 @@ class ChangeEvent(ABC):
         pass
 
 
-class EngineFormat:
+class BinaryChangeEvent(ChangeEvent):
+    """
+    Abstract base class for type hinting the ChangeEvent of the binary engine formats
+    (`EngineFormat.JSON_BYTE_ARRAY`, `EngineFormat.AVRO`, `EngineFormat.PROTOBUF`).
+    Key and value are Java byte arrays, use `to_bytes` or `to_memoryview` to access them
+    without copying them element by element.
+    """
+
+    def key(self) -> "jnius.ByteArray":
+        """Returns the serialized record key."""
+        pass
+
+    def value(self) -> "jnius.ByteArray":
+        """Returns the serialized record value (payload)."""
+        pass
+
+
+class _LazyEngineFormats(type):
+    """
+    Resolves the Java format classes of `EngineFormat` on first access.
+    """
+    _FORMAT_CLASSES = {
+        "JSON": "io.debezium.engine.format.Json",
+        "JSON_BYTE_ARRAY": "io.debezium.engine.format.JsonByteArray",
+        "AVRO": "io.debezium.engine.format.Avro",
+        "PROTOBUF": "io.debezium.engine.format.Protobuf",
+        "CLOUDEVENTS": "io.debezium.engine.format.CloudEvents",
+    }
+
+    def __getattr__(cls, name):
+        if name not in cls._FORMAT_CLASSES:
+            raise AttributeError(f"type object {cls.__name__!r} has no attribute {name!r}")
+        java_class("DebeziumEngine")  # starts the JVM
+        from jnius import autoclass
+        format_class = autoclass(cls._FORMAT_CLASSES[name])
+        setattr(cls, name, format_class)
+        return format_class
+
+
+class EngineFormat(metaclass=_LazyEngineFormats):
     """
     Class holding constants for Debezium engine formats.
+
+    JSON: Key and value are JSON strings.
+    JSON_BYTE_ARRAY: Key and value are UTF-8 encoded JSON byte arrays.
+    AVRO: Key and value are Avro byte arrays, requires schema registry configuration
+        (e.g. `converter.schema.registry.url`).
+    PROTOBUF: Key and value are Protobuf byte arrays, requires schema registry configuration.
+    CLOUDEVENTS: Value is a CloudEvents envelope, serialized as configured with
+        `converter.serializer.type`.
+    """
+
+
+def to_payload(value: Union[str, bytes, "jnius.ByteArray", None]) -> Union[str, bytes, None]:
+    """
+    Converts a record key or value to a Python object accepted by JSON parsers and Arrow.
+
+    Strings and bytes are returned as they are, Java byte arrays are copied to `bytes`
+    with a single copy.
+
+    Args:
+        value: Record key or value, as returned by `ChangeEvent.key()` or `ChangeEvent.value()`.
+    """
+    if value is None or isinstance(value, (str, bytes)):
+        return value
+    return value.tostring()
+
+
+def to_bytes(value: Union[str, bytes, "jnius.ByteArray", None]) -> Optional[bytes]:
     """
-    JSON = autoclass('io.debezium.engine.format.Json')
+    Converts a record key or value to `bytes`, strings are UTF-8 encoded.
+
+    Args:
+        value: Record key or value, as returned by `ChangeEvent.key()` or `ChangeEvent.value()`.
+    """
+    payload = to_payload(value)
+    if isinstance(payload, str):
+        return payload.encode("utf-8")
+    return payload
+
+
+def to_memoryview(value: Union[str, bytes, "jnius.ByteArray", None]) -> Optional[memoryview]:
+    """
+    Returns a `memoryview` of the record key or value. This isn't zero-copy: Java byte arrays are copied to
+    `bytes` and strings are encoded first (see `to_bytes`), only slicing the returned view doesn't copy the data.
+
+    Args:
+        value: Record key or value, as returned by `ChangeEvent.key()` or `ChangeEvent.value()`.
+    """
+    payload = to_bytes(value)
+    return memoryview(payload) if payload is not None else None
 
 
 class BasePythonChangeHandler(ABC):
@@ -89,6 +162,7 @@ class BasePythonChangeHandler(ABC):
     Abstract base class for user-defined change event handlers.
     Users must implement the `handleJsonBatch` method to process Debezium events.
     """
+    metrics: Optional[MetricsSink] = None  # set by the consumer when metrics are enabled
 
     def handleJsonBatch(self, records: List[ChangeEvent]):
         """
@@ -106,105 +180,290 @@ class BasePythonChangeHandler(ABC):
         raise NotImplementedError(
             "Not implemented, Please implement BasePythonChangeHandler and use it to consume events!")
 
+    def set_commit_listener(self, listener: Callable[[int], None]) -> bool:
+        """
+        Enables deferred commits, called by the consumer before the first batch.
 
-class PythonChangeConsumer(PythonJavaClass):
-    """
-    Python implementation of the Debezium ChangeConsumer interface.
-    This class acts as a bridge between Java Debezium Engine and the Python handler.
-    """
-    __javainterfaces__ = ['io/debezium/engine/DebeziumEngine$ChangeConsumer']
+        Handlers buffering events across batches return True, and call `listener(n)` once the first `n` batches
+        received by `handleJsonBatch` are durably written. The batches are acknowledged to the engine only then,
+        in order. By default returns False, and each batch is acknowledged when `handleJsonBatch` returns.
+
+        Args:
+            listener: Function acknowledging the first `n` received batches.
+        """
+        return False
 
-    def __init__(self):
-        self.handler: BasePythonChangeHandler = None  # The Python handler instance.
+    def close(self):
+        """
+        Called when the engine stops, handlers buffering events should write them here.
+        """
+        pass
 
-    @java_method('(Ljava/util/List;Lio/debezium/engine/DebeziumEngine$RecordCommitter;)V')
-    def handleBatch(self, records: List[ChangeEvent], committer: RecordCommitter):
+    def set_metrics_sink(self, sink: Optional[MetricsSink]):
         """
-        Handles a batch of change events received from the Debezium engine.
+        Called by the consumer with the metrics sink of the engine, handlers report their metrics to `self.metrics`,
+        see `pydbzengine.metrics`. None when the metrics are disabled.
+        """
+        self.metrics = sink
+
+
+class CommitStrategy(Enum):
+    """
+    Defines how processed records of a batch are acknowledged to the Debezium engine.
+
+    PER_RECORD: Calls `markProcessed` for every record of the batch. This is the default and
+        matches the behaviour of the Debezium embedded engine examples.
+    LAST_PER_PARTITION: Calls `markProcessed` only for the last record of each source partition.
+        The engine keeps only the latest offset per source partition, so the committed offsets are
+        the same as with PER_RECORD, while the number of Python to Java calls drops to the number of
+        source partitions in the batch plus the partition lookups.
+    LAST_RECORD: Calls `markProcessed` only for the last record of the batch. A single call per batch,
+        only safe for connectors producing events for a single source partition, e.g. PostgreSQL or MySQL.
+
+    Note: `SourceTask.commitRecord` is called by the engine only for the marked records, connectors
+    relying on it for every record should keep using PER_RECORD.
+    """
+    PER_RECORD = "per_record"
+    LAST_PER_PARTITION = "last_per_partition"
+    LAST_RECORD = "last_record"
 
-        This method is called by the Java Debezium engine. It calls the user-defined
-        Python handler to process the events and then acknowledges the batch.
+    def commit(self, records: List[ChangeEvent], committer: RecordCommitter):
+        """
+        Acknowledges the processed batch according to the strategy and marks the batch as finished.
 
         Args:
-            records: A list of ChangeEvent objects representing the changes.
+            records: A list of ChangeEvent objects which are processed.
             committer: The RecordCommitter used to acknowledge processed records.
         """
-        try:
-            self.handler.handleJsonBatch(records=records)
+        if self == CommitStrategy.PER_RECORD:
             for e in records:
                 committer.markProcessed(e)  # Mark each record as processed.
-            committer.markBatchFinished()  # Mark the batch as finished.
-        except Exception as e:
-            print("ERROR: failed to consume events in python")
-            print(str(e))
-            print(traceback.format_exc())
-            JavaLangThread.currentThread().interrupt()  # Interrupt the Debezium engine on error.
-
-    @java_method('()Z')
-    def supportsTombstoneEvents(self):
-        """
-        Indicates whether the consumer supports tombstone events.
+        elif self == CommitStrategy.LAST_PER_PARTITION:
+            for e in self.last_record_per_partition(records):
+                committer.markProcessed(e)
+        elif self == CommitStrategy.LAST_RECORD:
+            if len(records) > 0:
+                committer.markProcessed(records[len(records) - 1])
+        committer.markBatchFinished()  # Mark the batch as finished.
+
+    @staticmethod
+    def last_record_per_partition(records: List[ChangeEvent]) -> list:
         """
-        return True
-
-    def set_change_handler(self, handler: BasePythonChangeHandler):
-        """
-        Sets the Python change event handler.
+        Returns the last record of each source partition, in the order the partitions are last seen.
 
         Args:
-            handler: The Python change event handler instance.
+            records: A list of ChangeEvent objects.
         """
-        self.handler = handler
+        last_records = {}
+        for e in records:
+            partition_key = e.sourceRecord().sourcePartition().toString()
+            last_records.pop(partition_key, None)
+            last_records[partition_key] = e
+        return list(last_records.values())
 
-    def interrupt(self):
-        """
-        Interrupts the Debezium engine.
-        """
-        print("Interrupt called in python consumer")
-        JavaLangThread.currentThread().interrupt()  # Interrupt the current thread (Debezium engine thread).
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        print("Python Exit method called! calling interrupt to stop the engine")
-        self.interrupt()
+@dataclass
+class EngineCompletion:
+    """
+    Outcome of an engine run, reported by the Debezium engine when it stops.
+
+    success: False if the engine stopped because of an error.
+    message: Description of the outcome by the engine.
+    error: The Java exception which stopped the engine, as string.
+    """
+    success: bool
+    message: Optional[str] = None
+    error: Optional[str] = None
+
 
 class DebeziumJsonEngine:
     """
     Main class to manage the Debezium embedded engine.
+
+    `run()` runs the engine in the current thread. `start()` runs it in a new thread and returns a future,
+    `stop()` stops it from any thread. As a context manager the engine is started on enter and stopped on exit.
     """
 
-    def __init__(self, properties: Properties, handler: BasePythonChangeHandler):
+    def __init__(self, properties: Union[dict, "Properties"], handler: BasePythonChangeHandler,
+                 commit_strategy: CommitStrategy = CommitStrategy.PER_RECORD, max_queued_batches: int = 0,
+                 engine_format=None, metrics: Optional[MetricsSink] = None,
+                 completion_callback: Optional[Callable[[EngineCompletion], None]] = None,
+                 error_policy: Optional["ErrorPolicy"] = None):
         """
         Initializes the DebeziumJsonEngine.
 
         Args:
-            properties: Java Properties object containing the Debezium configuration.
+            properties: Java Properties object or dict containing the Debezium configuration.
             handler: The Python change event handler instance.
+            commit_strategy: How processed records are acknowledged to the engine, see `CommitStrategy`.
+                Defaults to `CommitStrategy.PER_RECORD`.
+            max_queued_batches: Enables pipelined execution when greater than 0, the handler runs in a sink
+                worker thread and up to this many batches are queued while the engine keeps polling.
+                Defaults to 0, the handler runs synchronously in the engine thread.
+            engine_format: Serialization format of the event keys and values, see `EngineFormat`.
+                Defaults to `EngineFormat.JSON`, with the binary formats the handler receives `BinaryChangeEvent`s.
+            metrics: Sink of the pipeline metrics of the consumer and the handler, see `pydbzengine.metrics`.
+                Defaults to None, no metrics are collected.
+            completion_callback: Called with the `EngineCompletion` when the engine stops, see also
+                `add_completion_callback`.
+            error_policy: Retries failing batches and isolates failing records, see `pydbzengine.errors.ErrorPolicy`.
+                Defaults to None, the engine stops when the handler fails.
         """
-        self.properties: Properties = properties
-
-        if self.properties is None:
+        if properties is None:
             raise ValueError("Please provide debezium config properties!")
         if handler is None:
             raise ValueError("Please provide handler class, see example class `pydbzengine.BasePythonChangeHandler`!")
+        self.properties: "Properties" = to_java_properties(properties)
 
+        from pydbzengine.consumer import PythonChangeConsumer, PythonCompletionCallback  # starts the JVM on first use
         self.consumer = PythonChangeConsumer()  # Create the Python change consumer.
         self._handler = handler  # Store the handler.
         self.consumer.set_change_handler(self._handler)  # Set the handler for the consumer.
+        self.consumer.set_commit_strategy(commit_strategy)  # Set how the processed batches are acknowledged.
+        self.consumer.set_pipelined(max_queued_batches)  # Enable the pipelined execution if requested.
+        self.consumer.set_metrics_sink(metrics)  # Report the pipeline metrics if requested.
+        self.consumer.set_error_policy(error_policy)  # Retry and isolate the failing records if requested.
+
+        self._completion_callback = PythonCompletionCallback()  # Receives the outcome when the engine stops.
+        if completion_callback is not None:
+            self._completion_callback.callbacks.append(completion_callback)
+
+        self.engine_format = engine_format if engine_format is not None else EngineFormat.JSON
+        self.engine: "DebeziumEngine" = self._build_engine()
+
+        self._run_thread = None  # Java thread running the engine
+        self._stopped = threading.Event()  # set while the engine is not running
+        self._stopped.set()
+        self._future: Optional[Future] = None
+
+    def _build_engine(self) -> "DebeziumEngine":
+        """
+        Creates and configures the Debezium engine.
+        """
+        DebeziumEngine = java_class("DebeziumEngine")
+        builder = (DebeziumEngine.create(self.engine_format)  # Set the serialization format.
+                   .using(self.properties)  # Set the configuration properties.
+                   .notifying(self.consumer))  # Set the change consumer.
+        builder = call_overload(builder, "using",  # Set the completion callback.
+                                "(Lio/debezium/engine/DebeziumEngine$CompletionCallback;)"
+                                "Lio/debezium/engine/DebeziumEngine$Builder;", self._completion_callback)
+        return builder.build()  # Build the engine.
+
+    @property
+    def completion(self) -> Optional[EngineCompletion]:
+        """
+        Outcome of the engine run, None until the engine stopped.
+        """
+        return self._completion_callback.completion
 
-        # Create and configure the Debezium engine.
-        self.engine: DebeziumEngine = (DebeziumEngine.create(EngineFormat.JSON)  # Use JSON format.
-                                       .using(self.properties)  # Set the configuration properties.
-                                       .notifying(self.consumer)  # Set the change consumer.
-                                       .build())  # Build the engine.
+    def add_completion_callback(self, callback: Callable[[EngineCompletion], None]):
+        """
+        Registers a function called with the `EngineCompletion` when the engine stops, in the engine thread.
+        """
+        self._completion_callback.callbacks.append(callback)
 
     def run(self):
         """
-        Starts the Debezium embedded engine.
+        Runs the Debezium embedded engine in the current thread until it stops, then closes the handler.
+        """
+        self._stopped.clear()
+        self._run_thread = java_class("JavaLangThread").currentThread()
+        try:
+            self.engine.run()
+        finally:
+            try:
+                self.consumer.close()
+            finally:
+                self._run_thread = None
+                self._stopped.set()
+
+    def start(self) -> Future:
+        """
+        Runs the Debezium embedded engine in a new thread and returns at once.
+
+        The returned future completes when the engine stopped and the handler was closed. Its result is the
+        `EngineCompletion`, it fails with a RuntimeError if the engine stopped because of an error.
+        An engine can be started once, create a new engine to restart.
+        """
+        if self._future is not None:
+            raise RuntimeError("Engine was already started, create a new engine to restart it")
+        future = self._future = Future()
+        future.set_running_or_notify_cancel()
+        self._stopped.clear()  # stop() called right after start() waits for the engine
+
+        def run():
+            try:
+                self.run()
+                completion = self.completion
+                if completion is not None and not completion.success:
+                    future.set_exception(
+                        RuntimeError(f"Debezium engine failed: {completion.error or completion.message}"))
+                else:
+                    future.set_result(completion)
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                detach_thread()
+
+        threading.Thread(target=run, name="pydbzengine-engine").start()
+        return future
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stops the Debezium embedded engine and waits until it stopped. Can be called from any thread.
+
+        Batches delivered by the engine from now on are dropped, the batches queued by the pipelined execution are
+        processed, then the engine commits the offsets of the acknowledged records and stops, and the handler is
+        closed. The dropped batches and the batches written by a handler only when it's closed (see
+        `set_commit_listener`) are not acknowledged, they are delivered again after a restart.
+
+        Args:
+            timeout: Maximum seconds to wait, None waits until the engine stopped.
+
+        Returns:
+            bool: False if the engine is still running after the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        self.consumer.reject_batches()
+        self.consumer.drain(timeout=remaining())
+        closer = threading.Thread(target=self._close_engine, daemon=True, name="pydbzengine-engine-close")
+        closer.start()
+        closer.join(remaining())
+        return not closer.is_alive() and self._stopped.wait(remaining())
+
+    def _close_engine(self):
+        try:
+            self.close()
+        except Exception as e:
+            print("ERROR: failed to close the Debezium engine")
+            print(str(e))
+        finally:
+            detach_thread()
+
+    def close(self):
+        """
+        Closes the Debezium embedded engine, `run` returns once the engine stopped. Can be called from any thread,
+        see `stop` to wait for the handler.
         """
-        self.engine.run()
+        self.engine.close()
 
     def interrupt(self):
         """
-        Interrupts the Debezium embedded engine.
+        Interrupts the thread running the Debezium embedded engine, `stop` stops the engine cleanly.
         """
-        self.consumer.interrupt()
\ No newline at end of file
+        run_thread = self._run_thread
+        if run_thread is not None:
+            run_thread.interrupt()
+        else:
+            self.consumer.interrupt()
+
+    def __enter__(self) -> "DebeziumJsonEngine":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
\ No newline at end of file
@@ -0,0 +1,230 @@
+"""
+JVM Class Data Sharing (AppCDS) archives for fast engine startup.
+
+A training run starts the engine with a connector configuration, and when the JVM exits it writes the loaded
+classes to an archive (`-XX:ArchiveClassesAtExit`). Later JVM starts with the same classpath use the archive
+automatically (`-XX:SharedArchiveFile`), instead of loading and verifying the classes from the jars again.
+
+Archives are used when enabled with the `PYDBZENGINE_CDS=true` environment variable or
+`pydbzengine.jvm.set_cds_enabled(True)`. They are stored in the user cache directory (`$XDG_CACHE_HOME/pydbzengine`,
+`~/.cache/pydbzengine` by default), or in the directory set with the `PYDBZENGINE_CDS_DIR` environment variable,
+and are keyed by the classpath. Training again with the same classpath replaces the archive.
+
+The JVM rejects archives when a non-empty directory is used on the classpath, so when training or when an archive
+is used the directories (e.g. the `config` folders) are put on the classpath as jars built from their content.
+
+Training:
+
+    pydbzengine-cds --properties-file engine.properties --duration 60
+
+Requires Java 13 or newer with a base CDS archive (included in the standard JDK distributions).
+"""
+import argparse
+import hashlib
+import importlib.util
+import os
+import sys
+import threading
+import zipfile
+from contextlib import contextmanager
+from glob import glob
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+CDS_DIR_ENV = "PYDBZENGINE_CDS_DIR"
+
+
+def default_cds_dir() -> Path:
+    """
+    Returns the user cache directory of pydbzengine, `$XDG_CACHE_HOME/pydbzengine` or `~/.cache/pydbzengine`.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home().joinpath(".cache").as_posix()
+    return Path(cache_home).joinpath("pydbzengine")
+
+
+def cds_dir() -> Path:
+    """
+    Returns the directory of the CDS archives and the classpath directory jars.
+    """
+    cds_directory = os.environ.get(CDS_DIR_ENV)
+    return Path(cds_directory) if cds_directory else default_cds_dir()
+
+
+def _jnius_class_dir() -> str:
+    """
+    Returns the directory of the Java classes bundled with jnius, jnius always adds it to the classpath.
+    Found without importing jnius, which would start the JVM.
+    """
+    spec = importlib.util.find_spec("jnius")
+    return Path(spec.submodule_search_locations[0]).joinpath("src").as_posix()
+
+
+def _directory_jar(directory: Path, create: bool = False) -> Path:
+    """
+    Returns the jar with the content of the directory, named by the content hash. With `create` the jar is
+    written when it doesn't exist, the JVM rejects the archive if a jar on the classpath is modified.
+    """
+    files = sorted(p for p in directory.rglob("*") if p.is_file())
+    digest = hashlib.sha1()
+    for f in files:
+        digest.update(f.relative_to(directory).as_posix().encode("utf-8"))
+        digest.update(f.read_bytes())
+    jar = cds_dir().joinpath("classpath", f"{directory.name}-{digest.hexdigest()[:16]}.jar")
+    if create and not jar.exists():
+        jar.parent.mkdir(parents=True, exist_ok=True)
+        tmp = jar.with_suffix(".tmp")
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            for f in files:
+                z.write(f, arcname=f.relative_to(directory).as_posix())
+        tmp.replace(jar)
+    return jar
+
+
+def archivable_class_paths(class_paths: List[str], create_jars: bool = False) -> List[str]:
+    """
+    Returns a classpath accepted by CDS: wildcards are expanded to the sorted list of jars, and directories
+    are replaced by jars of their content. The jar of the jnius classes directory is the last entry.
+
+    Args:
+        class_paths: Classpath entries, as passed to `jnius_config.add_classpath`.
+        create_jars: Write the jars of the directories, otherwise only their paths are returned.
+    """
+    paths = []
+    for path in [*class_paths, _jnius_class_dir()]:
+        if path.endswith("*"):
+            paths.extend(sorted(glob(path + ".[Jj][Aa][Rr]")))
+        elif Path(path).is_dir():
+            paths.append(_directory_jar(Path(path), create=create_jars).as_posix())
+        else:
+            paths.append(path)
+    return paths
+
+
+def archive_file(class_paths: List[str]) -> Path:
+    """
+    Returns the archive file for the classpath, the file name contains the classpath hash.
+
+    Args:
+        class_paths: Classpath, see `archivable_class_paths`.
+    """
+    digest = hashlib.sha1(os.pathsep.join(class_paths).encode("utf-8")).hexdigest()[:16]
+    return cds_dir().joinpath(f"pydbzengine-{digest}.jsa")
+
+
+def configure_jvm(class_paths: List[str], training: bool = False) -> Tuple[List[str], List[str], Optional[Path]]:
+    """
+    Returns the classpath, the JVM options and the archive file to start the JVM with.
+
+    When training, the JVM writes the archive at exit. Otherwise the archive is used if it exists for the
+    classpath, and the classpath is returned unchanged, without options, when there is no archive. The jars of
+    the classpath directories are only written when training or when the archive exists.
+
+    The returned classpath ends with the jar of the jnius classes directory, start the JVM in
+    `without_jnius_class_dir` when an archive is returned.
+
+    Args:
+        class_paths: Classpath entries, as passed to `jnius_config.add_classpath`.
+        training: Write the archive when the JVM exits.
+    """
+    archive = archive_file(archivable_class_paths(class_paths))
+    if training:
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        options = [f"-XX:ArchiveClassesAtExit={archive.as_posix()}"]
+    elif archive.is_file():
+        options = [f"-XX:SharedArchiveFile={archive.as_posix()}", "-Xshare:auto"]
+    else:
+        return class_paths, [], None
+    return archivable_class_paths(class_paths, create_jars=True), options, archive
+
+
+@contextmanager
+def without_jnius_class_dir():
+    """
+    Leaves out the jnius classes directory, which jnius appends to every classpath, while the JVM is started
+    in this context. The JVM rejects the archive when a non-empty directory is on the classpath, the classes are
+    loaded from the jar added by `configure_jvm` instead.
+    """
+    import jnius_config
+    get_classpath = jnius_config.get_classpath
+    class_dir = os.path.realpath(_jnius_class_dir())
+    jnius_config.get_classpath = lambda: [p for p in get_classpath() if os.path.realpath(p) != class_dir]
+    try:
+        yield
+    finally:
+        jnius_config.get_classpath = get_classpath
+
+
+def read_properties_file(properties_file: Path) -> dict:
+    """
+    Reads a Java properties file (`key=value` lines, `#` and `!` comments) to a dict.
+    """
+    properties = {}
+    with open(properties_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(("#", "!")):
+                continue
+            key, _, value = line.partition("=")
+            properties[key.strip()] = value.strip()
+    return properties
+
+
+def train(properties: dict, duration_sec: float = 60, connector_classpath: bool = False) -> Optional[Path]:
+    """
+    Runs the engine with the configuration for `duration_sec` seconds and writes the CDS archive
+    when the JVM exits. Must run in a process where the JVM is not started yet, the process exits at the end
+    (see `main` to run the training in a separate process).
+
+    Args:
+        properties: Debezium configuration. The events are consumed by a handler which discards them,
+            use a separate offset file for the training run.
+        duration_sec: How long the engine runs, it should be long enough to load the classes used while streaming.
+        connector_classpath: Use the connector-scoped classpath, see `pydbzengine.jvm.use_connector_classpath`.
+            Must match the setting of the engine processes using the archive.
+    """
+    from pydbzengine import jvm, DebeziumJsonEngine
+
+    if connector_classpath:
+        jvm.use_connector_classpath(properties)
+    jvm.enable_cds_training()
+    exit_code = 0
+    try:
+        engine = DebeziumJsonEngine(properties=properties, handler=_DiscardingChangeHandler())
+        thread = threading.Thread(target=engine.run, daemon=True)
+        thread.start()
+        thread.join(timeout=duration_sec)
+        engine.engine.close()
+        thread.join(timeout=duration_sec)
+    except Exception as e:
+        print(f"ERROR: CDS training run failed, archiving the classes loaded so far: {e}", file=sys.stderr)
+        exit_code = 1
+    archive = jvm.cds_archive_file()
+    print(f"Writing CDS archive {archive}")
+    # the JVM writes the archive in its exit hook, which isn't called when the Python process exits
+    jvm.java_class("JavaLangSystem").exit(exit_code)
+    return archive
+
+
+class _DiscardingChangeHandler:
+    """
+    Handler of the training run, the events are acknowledged without processing.
+    """
+
+    def handleJsonBatch(self, records):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Creates a JVM Class Data Sharing archive with a training run "
+                                                 "of the engine, used automatically by later engine starts.")
+    parser.add_argument("--properties-file", required=True, type=Path, help="Debezium configuration.")
+    parser.add_argument("--duration", default=60, type=float, help="Seconds to run the engine, default 60.")
+    parser.add_argument("--connector-classpath", action="store_true",
+                        help="Use the connector-scoped classpath, see pydbzengine.jvm.use_connector_classpath.")
+    args = parser.parse_args()
+    train(properties=read_properties_file(args.properties_file), duration_sec=args.duration,
+          connector_classpath=args.connector_classpath)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Connector-scoped classpath.
+
+By default all bundled jars (`debezium/libs/*`) are put on the classpath. When the jar dependency index
+`debezium/libs_index.json` exists, only the jars needed by the configured connector, offset storage and
+schema history storage can be used instead, see `pydbzengine.jvm.use_connector_classpath`.
+
+The index is generated from the Maven dependency tree by `install_libs.sh`:
+
+    mvn dependency:tree -Dverbose -DoutputFile=target/dependency-tree.txt
+    python3 classpath.py --tree-file target/dependency-tree.txt --libs-dir debezium/libs --output debezium/libs_index.json
+
+Without `--tree-file` the index is built from the Maven metadata packaged in the jars (`META-INF/maven/**/pom.xml`)
+and the direct dependencies of `pom.xml`. Jars without Maven metadata are matched to the declared dependencies by
+artifact id, the dependencies of such jars are unknown.
+
+This module uses only the standard library, so it can run without the package being installed.
+"""
+import argparse
+import json
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LIBS_DIR = Path(__file__).parent.joinpath("debezium/libs")
+LIBS_INDEX_FILE = Path(__file__).parent.joinpath("debezium/libs_index.json")
+POM_FILE = Path(__file__).parent.joinpath("pom.xml")
+
+# Maven artifact providing each connector class.
+CONNECTOR_ARTIFACTS: Dict[str, str] = {
+    "io.debezium.connector.postgresql.PostgresConnector": "io.debezium:debezium-connector-postgres",
+    "io.debezium.connector.mysql.MySqlConnector": "io.debezium:debezium-connector-mysql",
+    "io.debezium.connector.sqlserver.SqlServerConnector": "io.debezium:debezium-connector-sqlserver",
+    "io.debezium.connector.oracle.OracleConnector": "io.debezium:debezium-connector-oracle",
+    "io.debezium.connector.db2.Db2Connector": "io.debezium:debezium-connector-db2",
+    "io.debezium.connector.mongodb.MongoDbConnector": "io.debezium:debezium-connector-mongodb",
+    "io.debezium.connector.spanner.SpannerConnector": "io.debezium:debezium-connector-spanner",
+    "io.debezium.connector.vitess.VitessConnector": "io.debezium:debezium-connector-vitess",
+}
+# Maven artifact providing the offset and schema history storage classes, keyed by Java package.
+STORAGE_ARTIFACTS: Dict[str, str] = {
+    "io.debezium.storage.jdbc.": "io.debezium:debezium-storage-jdbc",
+    "io.debezium.storage.redis.": "io.debezium:debezium-storage-redis",
+    "io.debezium.storage.s3.": "io.debezium:debezium-storage-s3",
+    "io.debezium.storage.kafka.": "io.debezium:debezium-storage-kafka",
+    "io.debezium.storage.file.": "io.debezium:debezium-storage-file",
+}
+# Properties holding the storage class names.
+STORAGE_PROPERTIES = ("offset.storage", "schema.history.internal")
+
+_TREE_LINE = re.compile(r"^(?P<prefix>[| +\\-]*)(?P<node>\(?[\w.\-]+:[\w.\-]+:.*)$")
+_JAR_NAME = re.compile(r"^(?P<artifact_id>.+?)-(?P<version>\d[^-]*(?:-.+)?)\.jar$")
+_POM_PROPERTIES = re.compile(r"^META-INF/maven/[^/]+/[^/]+/pom\.properties$")
+_POM_NS = {"m": "http://maven.apache.org/POM/4.0.0"}
+# dependencies which are not copied by `dependency:copy-dependencies`
+_SKIPPED_SCOPES = ("test", "provided", "system", "import")
+
+
+def _artifact_key(coordinates: str) -> str:
+    """
+    Returns `groupId:artifactId` of Maven coordinates `groupId:artifactId:type[:classifier]:version[:scope]`.
+    """
+    group_id, artifact_id = coordinates.split(":")[:2]
+    return f"{group_id}:{artifact_id}"
+
+
+def _jar_file_name(coordinates: str) -> str:
+    """
+    Returns the file name `dependency:copy-dependencies` uses for the Maven coordinates.
+    """
+    parts = coordinates.split(":")
+    artifact_id = parts[1]
+    if len(parts) >= 6:
+        # groupId:artifactId:type:classifier:version:scope
+        return f"{artifact_id}-{parts[4]}-{parts[3]}.jar"
+    return f"{artifact_id}-{parts[3]}.jar"
+
+
+def parse_dependency_tree(lines: Iterable[str]) -> dict:
+    """
+    Parses the output of `mvn dependency:tree -Dverbose` to a jar dependency index.
+
+    Omitted nodes (duplicates and version conflicts) are kept as dependency edges, their jar is taken
+    from the node which won the conflict resolution.
+
+    Args:
+        lines: Lines of the dependency tree file.
+
+    Returns:
+        dict: The index with the keys `roots` (direct dependencies of the pom), `dependencies`
+            (artifact -> direct dependencies) and `jars` (artifact -> jar file name).
+    """
+    roots: List[str] = []
+    dependencies: Dict[str, List[str]] = {}
+    jars: Dict[str, str] = {}
+    stack: List[str] = []
+
+    for line in lines:
+        match = _TREE_LINE.match(line.rstrip())
+        if not match:
+            continue
+        depth = len(match.group("prefix")) // 3
+        node = match.group("node")
+        omitted = node.startswith("(")
+        coordinates = node.lstrip("(").split(" ")[0]
+        key = _artifact_key(coordinates)
+
+        del stack[depth:]
+        if depth == 0:
+            # the project itself
+            stack.append(key)
+            continue
+        parent = stack[-1]
+        if depth == 1 and key not in roots:
+            roots.append(key)
+        if key not in dependencies.setdefault(parent, []):
+            dependencies[parent].append(key)
+        dependencies.setdefault(key, [])
+        if not omitted:
+            jars[key] = _jar_file_name(coordinates)
+        stack.append(key)
+
+    return {"roots": roots, "dependencies": dependencies, "jars": jars}
+
+
+def build_libs_index(tree_file: Path, libs_dir: Path = LIBS_DIR) -> dict:
+    """
+    Builds the jar dependency index from a dependency tree file, keeping only the jars present in `libs_dir`.
+
+    Args:
+        tree_file: Output file of `mvn dependency:tree -Dverbose`.
+        libs_dir: Directory of the jars copied by `mvn dependency:copy-dependencies`.
+    """
+    with open(tree_file, "r", encoding="utf-8") as f:
+        index = parse_dependency_tree(f)
+    available = {p.name for p in libs_dir.glob("*.jar")}
+    index["jars"] = {k: v for k, v in index["jars"].items() if v in available}
+    return index
+
+
+def _jar_artifact_id(jar_name: str) -> str:
+    """
+    Returns the artifact id of a jar file named `artifactId-version.jar`.
+    """
+    match = _JAR_NAME.match(jar_name)
+    return match.group("artifact_id") if match else jar_name[:-len(".jar")]
+
+
+def _pom_dependencies(pom: bytes) -> Tuple[Optional[str], List[str]]:
+    """
+    Returns the `groupId:artifactId` of a pom and of its runtime dependencies, skipping optional dependencies
+    and dependencies with unresolved properties.
+    """
+    root = ET.fromstring(pom)
+    ns = _POM_NS if root.tag.startswith("{") else {}
+    prefix = "m:" if ns else ""
+
+    def text(element, path) -> Optional[str]:
+        found = element.find(path.replace("m:", prefix), ns)
+        return found.text.strip() if found is not None and found.text else None
+
+    group_id = text(root, "m:groupId") or text(root, "m:parent/m:groupId")
+    artifact_id = text(root, "m:artifactId")
+    properties = {"project.groupId": group_id, "pom.groupId": group_id, "groupId": group_id,
+                  "project.parent.groupId": text(root, "m:parent/m:groupId")}
+    props = root.find(f"{prefix}properties", ns)
+    for prop in (props if props is not None else []):
+        properties[prop.tag.split("}")[-1]] = (prop.text or "").strip()
+
+    def resolve(value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        value = re.sub(r"\$\{([^}]+)}", lambda m: properties.get(m.group(1)) or m.group(0), value)
+        return None if "${" in value else value
+
+    dependencies = []
+    for dependency in root.findall(f"{prefix}dependencies/{prefix}dependency", ns):
+        if text(dependency, "m:scope") in _SKIPPED_SCOPES or text(dependency, "m:optional") == "true":
+            continue
+        dependency_group = resolve(text(dependency, "m:groupId"))
+        dependency_artifact = resolve(text(dependency, "m:artifactId"))
+        if dependency_group and dependency_artifact:
+            dependencies.append(f"{dependency_group}:{dependency_artifact}")
+    key = f"{group_id}:{artifact_id}" if group_id and artifact_id else None
+    return key, dependencies
+
+
+def _read_jar_pom(jar: Path) -> Optional[bytes]:
+    """
+    Returns the pom of the artifact packaged in the jar, None when the jar has no Maven metadata. Shaded jars
+    contain the metadata of several artifacts, the one matching the jar file name is used.
+    """
+    with zipfile.ZipFile(jar) as zf:
+        candidates = []
+        for name in zf.namelist():
+            if not _POM_PROPERTIES.match(name):
+                continue
+            properties = dict(line.split("=", 1) for line in zf.read(name).decode("utf-8", "replace").splitlines()
+                              if "=" in line and not line.startswith("#"))
+            candidates.append((name, properties.get("artifactId", "").strip(), properties.get("version", "").strip()))
+        matching = [c for c in candidates if jar.name.startswith(f"{c[1]}-{c[2]}")]
+        if len(candidates) == 1 and not matching:
+            matching = candidates
+        if len(matching) != 1:
+            return None
+        pom = matching[0][0][:-len("pom.properties")] + "pom.xml"
+        return zf.read(pom) if pom in zf.namelist() else None
+
+
+def build_libs_index_from_jars(libs_dir: Path = LIBS_DIR, pom_file: Path = POM_FILE) -> dict:
+    """
+    Builds the jar dependency index from the Maven metadata packaged in the jars, when the dependency tree
+    isn't available.
+
+    Only the dependencies declared in the pom of each jar are known: dependencies inherited from parent poms
+    and the dependencies of jars without Maven metadata are missing. `required_artifacts` keeps every jar which
+    isn't a dependency of an unused connector or storage module, so these jars are kept on the classpath.
+
+    Args:
+        libs_dir: Directory of the jars copied by `mvn dependency:copy-dependencies`.
+        pom_file: The pom of the jars, its direct dependencies are the roots of the index.
+    """
+    _, roots = _pom_dependencies(pom_file.read_bytes())
+    dependencies: Dict[str, List[str]] = {}
+    jars: Dict[str, str] = {}
+    without_metadata: List[str] = []
+    for jar in sorted(libs_dir.glob("*.jar")):
+        pom = _read_jar_pom(jar)
+        key, jar_dependencies = _pom_dependencies(pom) if pom is not None else (None, [])
+        if key is None:
+            without_metadata.append(jar.name)
+        elif key in jars:
+            # another classifier of the artifact, e.g. native libraries, used along with it
+            jars[jar.name] = jar.name
+            dependencies[jar.name] = []
+            dependencies[key].append(jar.name)
+        else:
+            jars[key] = jar.name
+            dependencies[key] = jar_dependencies
+
+    # match the jars without Maven metadata to the declared dependencies by artifact id
+    declared = {}
+    for key in roots + [d for deps in dependencies.values() for d in deps if ":" in d]:
+        declared.setdefault(key.split(":")[1], key)
+    for jar_name in without_metadata:
+        key = declared.get(_jar_artifact_id(jar_name), jar_name)
+        if key in jars:
+            key = jar_name
+        jars[key] = jar_name
+        dependencies.setdefault(key, [])
+
+    dependencies = {k: [d for d in deps if d in jars and d != k] for k, deps in dependencies.items()}
+    return {"roots": [r for r in roots if r in jars], "dependencies": dependencies, "jars": jars}
+
+
+def load_libs_index(index_file: Path = LIBS_INDEX_FILE) -> Optional[dict]:
+    """
+    Loads the jar dependency index, returns None if it doesn't exist.
+    """
+    if not index_file.is_file():
+        return None
+    with open(index_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def required_artifacts(properties: Dict[str, str], index: dict, extra_artifacts: Iterable[str] = ()) -> Optional[List[str]]:
+    """
+    Returns the artifacts needed by the configuration, including their transitive dependencies.
+
+    The engine core (all direct dependencies of the pom which are not connectors or storage modules) is
+    always included. Artifacts which are not dependencies of an unused connector or storage module are
+    included as well, so jars with unknown dependencies aren't dropped. Returns None when the connector class
+    is unknown, then the full classpath must be used.
+
+    Args:
+        properties: Debezium configuration.
+        index: Jar dependency index, see `parse_dependency_tree`.
+        extra_artifacts: Additional `groupId:artifactId` to include, e.g. converters.
+    """
+    connector_artifact = CONNECTOR_ARTIFACTS.get(properties.get("connector.class", ""))
+    if connector_artifact is None:
+        return None
+
+    optional_roots = set(CONNECTOR_ARTIFACTS.values()) | set(STORAGE_ARTIFACTS.values())
+    wanted = [root for root in index["roots"] if root not in optional_roots]
+    wanted.append(connector_artifact)
+    for prop in STORAGE_PROPERTIES:
+        storage_class = properties.get(prop, "")
+        for package, artifact in STORAGE_ARTIFACTS.items():
+            if storage_class.startswith(package):
+                wanted.append(artifact)
+    wanted.extend(extra_artifacts)
+
+    ordered = _closure(wanted, index)
+    included = set(ordered)
+    unused = set(_closure([root for root in optional_roots if root not in included], index))
+    ordered.extend(sorted(a for a in index["jars"] if a not in included and a not in unused))
+    return ordered
+
+
+def _closure(artifacts: List[str], index: dict) -> List[str]:
+    """
+    Returns the artifacts and their transitive dependencies, in breadth-first order.
+    """
+    wanted = list(artifacts)
+    seen = set()
+    ordered = []
+    while wanted:
+        artifact = wanted.pop(0)
+        if artifact in seen:
+            continue
+        seen.add(artifact)
+        ordered.append(artifact)
+        wanted.extend(index["dependencies"].get(artifact, []))
+    return ordered
+
+
+def scoped_class_paths(properties: Dict[str, str], extra_artifacts: Iterable[str] = (),
+                       libs_dir: Path = LIBS_DIR, index_file: Path = LIBS_INDEX_FILE) -> Optional[List[str]]:
+    """
+    Returns the jar paths needed by the configuration, or None when the full classpath must be used
+    (missing index or unknown connector).
+
+    Args:
+        properties: Debezium configuration.
+        extra_artifacts: Additional `groupId:artifactId` to include, e.g. converters.
+        libs_dir: Directory of the bundled jars.
+        index_file: Jar dependency index file.
+    """
+    index = load_libs_index(index_file)
+    if index is None:
+        return None
+    artifacts = required_artifacts(properties=properties, index=index, extra_artifacts=extra_artifacts)
+    if artifacts is None:
+        return None
+    jars = [index["jars"][a] for a in artifacts if a in index["jars"]]
+    return [libs_dir.joinpath(jar).as_posix() for jar in jars]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates the jar dependency index used for connector-scoped classpaths.")
+    parser.add_argument("--tree-file", type=Path,
+                        help="Output of `mvn dependency:tree -Dverbose`, by default the index is built from the "
+                             "Maven metadata of the jars.")
+    parser.add_argument("--libs-dir", default=LIBS_DIR, type=Path, help="Directory of the copied dependencies.")
+    parser.add_argument("--pom-file", default=POM_FILE, type=Path, help="The pom of the copied dependencies.")
+    parser.add_argument("--output", default=LIBS_INDEX_FILE, type=Path, help="Index file to write.")
+    args = parser.parse_args()
+
+    if args.tree_file is not None:
+        index = build_libs_index(tree_file=args.tree_file, libs_dir=args.libs_dir)
+    else:
+        index = build_libs_index_from_jars(libs_dir=args.libs_dir, pom_file=args.pom_file)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    print(f"Wrote jar dependency index with {len(index['jars'])} jars to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
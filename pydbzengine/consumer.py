@@ -0,0 +1,368 @@
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from pydbzengine import BasePythonChangeHandler, ChangeEvent, CommitStrategy, EngineCompletion, RecordCommitter, \
+    to_payload
+from pydbzengine import metrics
+from pydbzengine.errors import ErrorPolicy
+from pydbzengine.jvm import start_jvm, java_class
+
+start_jvm()  # jnius must be imported after the classpath is configured
+
+import jnius
+from jnius import PythonJavaClass, java_method
+
+JavaLangThread = java_class("JavaLangThread")
+
+
+class _BatchStats:
+    """
+    Metrics of a batch collected when it's received, completed when it's processed.
+    """
+
+    def __init__(self, received_at: float, num_records: int, ts_ms: Dict[str, int]):
+        self.received_at = received_at
+        self.num_records = num_records
+        self.ts_ms = ts_ms  # event timestamp of the last record of each destination
+
+
+class PythonCompletionCallback(PythonJavaClass):
+    """
+    Python implementation of the Debezium CompletionCallback interface, called by the engine when it stops.
+    Passes the outcome to the registered Python callbacks.
+    """
+    __javainterfaces__ = ['io/debezium/engine/DebeziumEngine$CompletionCallback']
+
+    def __init__(self):
+        self.completion: Optional[EngineCompletion] = None
+        self.callbacks: List[Callable[[EngineCompletion], None]] = []
+
+    @java_method('(ZLjava/lang/String;Ljava/lang/Throwable;)V')
+    def handle(self, success: bool, message: str, error):
+        self.completion = EngineCompletion(success=bool(success), message=message,
+                                           error=error.toString() if error is not None else None)
+        for callback in self.callbacks:
+            try:
+                callback(self.completion)
+            except Exception as e:
+                print("ERROR: failed to run the engine completion callback")
+                print(str(e))
+                print(traceback.format_exc())
+
+
+class PythonChangeConsumer(PythonJavaClass):
+    """
+    Python implementation of the Debezium ChangeConsumer interface.
+    This class acts as a bridge between Java Debezium Engine and the Python handler.
+    """
+    __javainterfaces__ = ['io/debezium/engine/DebeziumEngine$ChangeConsumer']
+
+    def __init__(self):
+        self.handler: BasePythonChangeHandler = None  # The Python handler instance.
+        self.commit_strategy: CommitStrategy = CommitStrategy.PER_RECORD
+        self.max_queued_batches: int = 0  # Size of the pipeline queue, 0 disables the pipelined execution.
+        self._queue: Optional[queue.Queue] = None
+        self._worker: Optional[threading.Thread] = None
+        self._worker_error: Optional[Exception] = None
+        self._engine_thread = None
+        self._deferred_commits: bool = False  # the handler acknowledges batches with `_batches_durable`
+        self._pending_batches: deque = deque()
+        self._commit_lock = threading.Lock()
+        self._committed_batches: int = 0
+        self.metrics: Optional[metrics.MetricsSink] = None
+        self.error_policy: Optional[ErrorPolicy] = None
+        self._stopping = threading.Event()  # set by `reject_batches`, the engine is stopping
+
+    @java_method('(Ljava/util/List;Lio/debezium/engine/DebeziumEngine$RecordCommitter;)V')
+    def handleBatch(self, records: List[ChangeEvent], committer: RecordCommitter):
+        """
+        Handles a batch of change events received from the Debezium engine.
+
+        This method is called by the Java Debezium engine. It calls the user-defined
+        Python handler to process the events and then acknowledges the batch.
+        In pipelined mode the batch is queued and processed by the sink worker thread,
+        while the engine fetches the next batch.
+        The Java list is copied to a Python list with a single call, the handler doesn't pay a Java call per element.
+
+        Args:
+            records: A list of ChangeEvent objects representing the changes.
+            committer: The RecordCommitter used to acknowledge processed records.
+        """
+        if self._stopping.is_set():
+            return  # not acknowledged, delivered again after a restart
+        try:
+            received_at = time.perf_counter()
+            if self._engine_thread is None:
+                self._engine_thread = JavaLangThread.currentThread()
+            records = records if isinstance(records, list) else list(records.toArray())
+            stats = None
+            if self.metrics is not None:
+                self.metrics.observe(metrics.BATCH_MATERIALIZE_SECONDS, time.perf_counter() - received_at)
+                stats = self._batch_received(records, received_at)
+            if self.max_queued_batches > 0:
+                self._enqueue_batch(records=records, committer=committer, stats=stats)
+            else:
+                self._process_batch(records=records, committer=committer, stats=stats)
+        except Exception as e:
+            print("ERROR: failed to consume events in python")
+            print(str(e))
+            print(traceback.format_exc())
+            JavaLangThread.currentThread().interrupt()  # Interrupt the Debezium engine on error.
+
+    def _batch_received(self, records: List[ChangeEvent], received_at: float) -> _BatchStats:
+        """
+        Reports the received records per destination. Reading the destinations calls Java for every record,
+        this time isn't part of `BATCH_MATERIALIZE_SECONDS`.
+        """
+        counts: Dict[str, int] = {}
+        last_records: Dict[str, ChangeEvent] = {}
+        for record in records:
+            destination = record.destination()
+            counts[destination] = counts.get(destination, 0) + 1
+            last_records[destination] = record
+        ts_ms = {}
+        for destination, record in last_records.items():
+            try:
+                event_ts_ms = metrics.event_ts_ms(to_payload(record.value()))
+            except Exception:  # e.g. binary formats
+                event_ts_ms = None
+            if event_ts_ms is not None:
+                ts_ms[destination] = event_ts_ms
+        self.metrics.increment(metrics.BATCHES)
+        for destination, count in counts.items():
+            self.metrics.increment(metrics.RECORDS, count, labels={"destination": destination})
+        return _BatchStats(received_at=received_at, num_records=len(records), ts_ms=ts_ms)
+
+    def _batch_processed(self, stats: _BatchStats):
+        """
+        Reports the batch time, the records per second and the source lag of each destination.
+        """
+        elapsed = time.perf_counter() - stats.received_at
+        self.metrics.observe(metrics.BATCH_SECONDS, elapsed)
+        if elapsed > 0:
+            self.metrics.set_gauge(metrics.RECORDS_PER_SECOND, stats.num_records / elapsed)
+        now_ms = time.time() * 1000
+        for destination, ts_ms in stats.ts_ms.items():
+            self.metrics.observe(metrics.SOURCE_LAG_SECONDS, max(now_ms - ts_ms, 0) / 1000,
+                                 labels={"destination": destination})
+
+    def _process_batch(self, records: List[ChangeEvent], committer: RecordCommitter,
+                       stats: Optional[_BatchStats] = None):
+        """
+        Processes the batch with the handler and acknowledges it. With deferred commits the batch is
+        acknowledged when the handler reports it durable, see `_batches_durable`.
+        """
+        if self._deferred_commits:
+            with self._commit_lock:
+                self._pending_batches.append((records, committer))
+        handler_start = time.perf_counter()
+        if self.error_policy is not None and not self._deferred_commits:
+            self.error_policy.handle(self.handler, records, self.metrics)
+        else:
+            self.handler.handleJsonBatch(records=records)
+        if stats is not None:
+            self.metrics.observe(metrics.BATCH_HANDLER_SECONDS, time.perf_counter() - handler_start)
+        if not self._deferred_commits:
+            self._commit(records=records, committer=committer)
+        if stats is not None:
+            self._batch_processed(stats)
+
+    def _commit(self, records: List[ChangeEvent], committer: RecordCommitter):
+        commit_start = time.perf_counter()
+        self.commit_strategy.commit(records=records, committer=committer)
+        if self.metrics is not None:
+            self.metrics.observe(metrics.BATCH_COMMIT_SECONDS, time.perf_counter() - commit_start)
+
+    def _batches_durable(self, count: int):
+        """
+        Commit listener of handlers deferring commits, acknowledges the pending batches in order
+        until `count` batches are acknowledged in total. Can be called from any thread.
+
+        Args:
+            count: Number of batches, since the start, whose events the handler has durably written.
+        """
+        with self._commit_lock:
+            while self._pending_batches and self._committed_batches < count:
+                records, committer = self._pending_batches[0]
+                self._commit(records=records, committer=committer)
+                self._pending_batches.popleft()
+                self._committed_batches += 1
+
+    def _enqueue_batch(self, records: List[ChangeEvent], committer: RecordCommitter,
+                       stats: Optional[_BatchStats] = None):
+        """
+        Puts the batch to the pipeline queue, blocks while the queue is full (backpressure).
+        """
+        if self._worker_error is not None:
+            raise RuntimeError("Sink worker failed, stopping the engine") from self._worker_error
+        if self._worker is None:
+            self._queue = queue.Queue(maxsize=self.max_queued_batches)
+            self._worker = threading.Thread(target=self._drain_queue, name="pydbzengine-sink-worker", daemon=True)
+            self._worker.start()
+        self._queue.put((records, committer, stats))
+
+    def _drain_queue(self):
+        """
+        Sink worker loop. Processes the queued batches in order, acknowledges each batch only
+        after the handler finished it. After a failure the remaining batches are discarded
+        without acknowledging them, and the engine thread is interrupted.
+        """
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                try:
+                    if self._worker_error is not None:
+                        continue
+                    records, committer, stats = item
+                    self._process_batch(records=records, committer=committer, stats=stats)
+                except Exception as e:
+                    print("ERROR: failed to consume events in python sink worker")
+                    print(str(e))
+                    print(traceback.format_exc())
+                    self._worker_error = e
+                    self._engine_thread.interrupt()  # Interrupt the Debezium engine on error.
+                finally:
+                    self._queue.task_done()
+        finally:
+            jnius.detach()
+
+    def reject_batches(self):
+        """
+        Drops the batches delivered from now on without handling nor acknowledging them, called when the engine
+        is stopping: the engine keeps polling until it's closed, `drain` wouldn't return otherwise.
+        """
+        self._stopping.set()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the queued batches are processed and acknowledged, does nothing unless the execution is
+        pipelined. Returns False if batches are still queued after the timeout.
+
+        Args:
+            timeout: Maximum seconds to wait, None waits until the queue is drained.
+        """
+        if self._queue is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        """
+        Stops the sink worker after the queued batches are processed, then closes the handler,
+        which writes its buffered events.
+
+        Args:
+            timeout: Maximum seconds to wait for the worker, None waits until the queue is drained.
+        """
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join(timeout=timeout)
+            self._worker = None
+        if self.handler is not None and hasattr(self.handler, "close"):
+            try:
+                self.handler.close()
+            except Exception as e:
+                print("ERROR: failed to close the python handler")
+                print(str(e))
+                print(traceback.format_exc())
+        if self.error_policy is not None and self.error_policy.dead_letter_handler is not None:
+            try:
+                self.error_policy.dead_letter_handler.close()
+            except Exception as e:
+                print("ERROR: failed to close the dead-letter handler")
+                print(str(e))
+                print(traceback.format_exc())
+
+    @java_method('()Z')
+    def supportsTombstoneEvents(self):
+        """
+        Indicates whether the consumer supports tombstone events.
+        """
+        return True
+
+    def set_change_handler(self, handler: BasePythonChangeHandler):
+        """
+        Sets the Python change event handler.
+
+        Args:
+            handler: The Python change event handler instance.
+        """
+        self.handler = handler
+        set_commit_listener = getattr(handler, "set_commit_listener", None)
+        self._deferred_commits = bool(set_commit_listener is not None and set_commit_listener(self._batches_durable))
+        if self.metrics is not None:
+            self.set_metrics_sink(self.metrics)
+
+    def set_metrics_sink(self, sink: Optional[metrics.MetricsSink]):
+        """
+        Reports the pipeline metrics to the sink, and passes it to the handler, see `pydbzengine.metrics`.
+        None disables the metrics.
+
+        Args:
+            sink: The metrics sink, e.g. `pydbzengine.metrics.InMemoryMetricsSink`.
+        """
+        self.metrics = sink
+        set_metrics_sink = getattr(self.handler, "set_metrics_sink", None)
+        if set_metrics_sink is not None:
+            set_metrics_sink(sink)
+
+    def set_error_policy(self, error_policy: Optional[ErrorPolicy]):
+        """
+        Sets how batches failing in the handler are retried and how failing records are isolated, see
+        `pydbzengine.errors.ErrorPolicy`. Not applied to handlers deferring commits. None stops the engine on
+        the first failure.
+
+        Args:
+            error_policy: The error policy.
+        """
+        self.error_policy = error_policy
+        if error_policy is not None and self._deferred_commits:
+            print("WARNING: the error policy isn't applied, the handler defers commits")
+
+    def set_commit_strategy(self, commit_strategy: CommitStrategy):
+        """
+        Sets the strategy used to acknowledge processed batches.
+
+        Args:
+            commit_strategy: The commit strategy, see `CommitStrategy`.
+        """
+        self.commit_strategy = commit_strategy
+
+    def set_pipelined(self, max_queued_batches: int):
+        """
+        Enables pipelined execution. Batches are put to a bounded queue and processed by a sink worker
+        thread, so the Debezium engine can fetch the next batch while the handler processes the previous one.
+        Batches are acknowledged in order, only after the handler finished them.
+
+        Args:
+            max_queued_batches: Maximum number of batches waiting in the queue. When the queue is full the
+                engine thread blocks until the sink catches up. 0 disables the pipelined execution.
+        """
+        if max_queued_batches < 0:
+            raise ValueError("max_queued_batches must be zero or positive!")
+        self.max_queued_batches = max_queued_batches
+
+    def interrupt(self):
+        """
+        Interrupts the thread delivering the batches to the consumer, which stops the Debezium engine.
+        Does nothing before the first batch, see `DebeziumJsonEngine.stop` to stop the engine at any time.
+        """
+        print("Interrupt called in python consumer")
+        if self._engine_thread is not None:
+            self._engine_thread.interrupt()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        print("Python Exit method called! calling interrupt to stop the engine")
+        self.interrupt()
@@ -0,0 +1,246 @@
+"""
+Error policy of the consumer: batches failing in the handler are retried, and records failing permanently are
+isolated by bisecting the batch and passed to a dead-letter handler, instead of stopping the engine.
+
+    policy = ErrorPolicy(max_retries=3, dead_letter_handler=FileDeadLetterHandler("dead-letters.jsonl"))
+    engine = DebeziumJsonEngine(properties=props, handler=handler, error_policy=policy)
+"""
+import base64
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from pydbzengine import BasePythonChangeHandler, ChangeEvent, metrics, to_payload
+from pydbzengine.metrics import MetricsSink
+
+LOGGER_NAME = "pydbzengine.errors"
+
+
+class DeadLetterHandler(ABC):
+    """
+    Receives the records the handler failed to process, see `ErrorPolicy`.
+    """
+
+    @abstractmethod
+    def handle(self, records: List[ChangeEvent], error: Exception):
+        """
+        Stores the failed records, the batch is acknowledged when this method returns.
+
+        Args:
+            records: The failed records, a single record when the batch was bisected.
+            error: The exception raised by the handler for these records.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Called when the engine stops.
+        """
+        pass
+
+
+class DeadLetterEvent(ChangeEvent):
+    """
+    Change event read from a dead-letter file, see `read_dead_letters`.
+    """
+
+    def __init__(self, key: Union[str, bytes, None], value: Union[str, bytes, None], destination: str,
+                 partition: Optional[int] = None):
+        self._key = key
+        self._value = value
+        self._destination = destination
+        self._partition = partition
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def destination(self):
+        return self._destination
+
+    def partition(self):
+        return self._partition
+
+
+@dataclass
+class DeadLetter:
+    """
+    Failed record of a dead-letter file with the error of the handler.
+    """
+    record: DeadLetterEvent
+    error: str
+    failed_at: str
+
+
+class FileDeadLetterHandler(DeadLetterHandler):
+    """
+    Appends the failed records to a JSON lines file: the destination, partition, key and value of the record,
+    the error and the time of the failure. Binary keys and values are base64 encoded and marked with
+    `"binary": true`. Read the file with `read_dead_letters`.
+    """
+
+    def __init__(self, path: Union[str, Path], fsync: bool = False):
+        """
+        Args:
+            path: The dead-letter file, created if it doesn't exist, appended to otherwise.
+            fsync: Sync the file to disk after each write, by default it is only flushed to the OS.
+        """
+        self.path = Path(path)
+        self.fsync = fsync
+        self._file = None  # opened on first use, the handler can be pickled before
+        self._lock = threading.Lock()
+
+    def handle(self, records: List[ChangeEvent], error: Exception):
+        failed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        error_text = f"{type(error).__name__}: {error}"
+        lines = []
+        for record in records:
+            key = to_payload(record.key())
+            value = to_payload(record.value())
+            line = {"failed_at": failed_at, "error": error_text, "destination": record.destination(),
+                    "partition": record.partition()}
+            if isinstance(key, bytes) or isinstance(value, bytes):
+                line["binary"] = True
+                key = base64.b64encode(key).decode("ascii") if key is not None else None
+                value = base64.b64encode(value).decode("ascii") if value is not None else None
+            line["key"] = key
+            line["value"] = value
+            lines.append(json.dumps(line) + "\n")
+        with self._lock:
+            if self._file is None:
+                self._file = self.path.open("a", encoding="utf-8")
+            self._file.write("".join(lines))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_dead_letters(path: Union[str, Path]) -> Iterator[DeadLetter]:
+    """
+    Yields the records of a file written by `FileDeadLetterHandler`, e.g. to process them again once the handler
+    is fixed: `handler.handleJsonBatch([letter.record for letter in read_dead_letters(path)])`.
+    """
+    with Path(path).open(encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            letter = json.loads(line)
+            key, value = letter["key"], letter["value"]
+            if letter.get("binary"):
+                key = base64.b64decode(key) if key is not None else None
+                value = base64.b64decode(value) if value is not None else None
+            yield DeadLetter(record=DeadLetterEvent(key, value, letter["destination"], letter["partition"]),
+                             error=letter["error"], failed_at=letter["failed_at"])
+
+
+@dataclass
+class ErrorPolicy:
+    """
+    How the consumer handles batches failing in the handler, see `PythonChangeConsumer.set_error_policy`.
+
+    A failing batch is retried `max_retries` times with exponential backoff, which covers transient errors like
+    unavailable destinations. Without a dead-letter handler the error is raised then and the engine stops, as
+    without a policy. With a dead-letter handler the batch is bisected: each half is handled once more, failing
+    halves are split again until the failing records are isolated and passed to the dead-letter handler. The
+    other records are handled in their original order, and the whole batch is acknowledged. When every record of
+    the batch fails, the destination is failing rather than the records: the error is raised and the engine
+    stops, the batch is delivered again after a restart.
+
+    Handlers may have written part of a failing batch before raising, these records are written again by the
+    retries. Handlers deferring commits (see `BasePythonChangeHandler.set_commit_listener`) count the batches they
+    receive, the policy isn't applied to them.
+
+    Args:
+        max_retries: Retries of the whole batch before it's bisected.
+        retry_backoff_sec: Delay of the first retry, doubled for each further retry.
+        max_backoff_sec: Maximum delay of a retry.
+        bisect: Bisect the failing batch to isolate the failing records, otherwise the whole batch is passed
+            to the dead-letter handler.
+        dead_letter_handler: Receives the failing records, see `FileDeadLetterHandler`.
+        max_dead_letters: Stops the engine once more records were passed to the dead-letter handler,
+            e.g. when a destination rejects every record of single-record batches. None doesn't limit them.
+    """
+    max_retries: int = 3
+    retry_backoff_sec: float = 1.0
+    max_backoff_sec: float = 30.0
+    bisect: bool = True
+    dead_letter_handler: Optional[DeadLetterHandler] = None
+    max_dead_letters: Optional[int] = 1000
+
+    def __post_init__(self):
+        if self.max_retries < 0:
+            raise ValueError("max_retries must be zero or positive!")
+        if self.retry_backoff_sec < 0 or self.max_backoff_sec < 0:
+            raise ValueError("retry_backoff_sec and max_backoff_sec must be zero or positive!")
+        self.dead_letters = 0
+        self.log = logging.getLogger(LOGGER_NAME)
+
+    def handle(self, handler: BasePythonChangeHandler, records: List[ChangeEvent],
+               sink: Optional[MetricsSink] = None):
+        """
+        Passes the records to the handler according to the policy, raises the error of the handler if the
+        records can't be handled.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                handler.handleJsonBatch(records=records)
+                return
+            except Exception as e:
+                error = e
+            if attempt < self.max_retries:
+                delay = min(self.retry_backoff_sec * 2 ** attempt, self.max_backoff_sec)
+                self.log.warning(f"Handler failed on a batch of {len(records)} records ({error!r}), "
+                                 f"retrying in {delay:.1f}s")
+                if sink is not None:
+                    sink.increment(metrics.HANDLER_BATCH_RETRIES)
+                time.sleep(delay)
+        if self.dead_letter_handler is None:
+            raise error
+        if not self.bisect:
+            self._dead_letter(records, error, sink)
+            return
+        failed: List[Tuple[List[ChangeEvent], Exception]] = []
+        self._isolate(handler, records, error, failed)
+        if len(records) > 1 and sum(len(f) for f, _ in failed) == len(records):
+            raise RuntimeError(f"All {len(records)} records of the batch failed, stopping") from error
+        for failed_records, failed_error in failed:
+            self._dead_letter(failed_records, failed_error, sink)
+
+    def _isolate(self, handler: BasePythonChangeHandler, records: List[ChangeEvent], error: Exception,
+                 failed: List[Tuple[List[ChangeEvent], Exception]]):
+        if len(records) <= 1:
+            failed.append((records, error))
+            return
+        middle = len(records) // 2
+        for half in (records[:middle], records[middle:]):
+            try:
+                handler.handleJsonBatch(records=half)
+            except Exception as e:
+                self._isolate(handler, half, e, failed)
+
+    def _dead_letter(self, records: List[ChangeEvent], error: Exception, sink: Optional[MetricsSink]):
+        if self.max_dead_letters is not None and self.dead_letters + len(records) > self.max_dead_letters:
+            raise RuntimeError(f"More than {self.max_dead_letters} records failed, stopping") from error
+        self.log.error(f"Passing {len(records)} failed records to the dead-letter handler: {error!r}\n"
+                       f"{''.join(traceback.format_exception(type(error), error, error.__traceback__))}")
+        self.dead_letter_handler.handle(records, error)
+        self.dead_letters += len(records)
+        if sink is not None:
+            for record in records:
+                sink.increment(metrics.DEAD_LETTER_RECORDS, labels={"destination": record.destination()})
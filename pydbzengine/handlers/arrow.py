@@ -0,0 +1,116 @@
+import logging
+from abc import abstractmethod
+from typing import List
+
+import pyarrow as pa
+
+from pydbzengine import ChangeEvent, BasePythonChangeHandler, to_payload
+
+CHANGE_EVENT_BATCH_SCHEMA = pa.schema([
+    pa.field("key", pa.string(), nullable=True),
+    pa.field("value", pa.string(), nullable=True),
+    pa.field("destination", pa.string(), nullable=False),
+])
+# Schema used with the binary engine formats, e.g. `EngineFormat.JSON_BYTE_ARRAY`.
+BINARY_CHANGE_EVENT_BATCH_SCHEMA = pa.schema([
+    pa.field("key", pa.binary(), nullable=True),
+    pa.field("value", pa.binary(), nullable=True),
+    pa.field("destination", pa.string(), nullable=False),
+])
+
+
+def java_list_to_python(records) -> list:
+    """
+    Converts the Java list received from the Debezium engine to a Python list.
+
+    Iterating a Java `List` from Python costs one JNI call per element, `toArray()` fetches
+    all elements with a single call. Python lists (e.g. in tests) are returned as they are.
+
+    Args:
+        records: A Java `List` or a Python list of ChangeEvent objects.
+
+    Returns:
+        list: Python list of ChangeEvent objects.
+    """
+    if isinstance(records, list):
+        return records
+    return records.toArray()
+
+
+def change_events_to_record_batch(records: List[ChangeEvent], binary: bool = False) -> pa.RecordBatch:
+    """
+    Packs a batch of change events into Arrow columns.
+
+    The columns are assembled in Python, `key()`, `value()` and `destination()` are called once per event like
+    a handler iterating the events would. The result has the columns `key`, `value` and `destination`, see
+    `CHANGE_EVENT_BATCH_SCHEMA`.
+
+    Args:
+        records: A list of Debezium ChangeEvent objects.
+        binary: Creates binary `key` and `value` columns, see `BINARY_CHANGE_EVENT_BATCH_SCHEMA`.
+            Should be used with the binary engine formats.
+
+    Returns:
+        pa.RecordBatch: Columnar representation of the batch.
+    """
+    records = java_list_to_python(records)
+    keys = []
+    values = []
+    destinations = []
+    for record in records:
+        keys.append(to_payload(record.key()))
+        values.append(to_payload(record.value()))
+        destinations.append(record.destination())
+
+    schema = BINARY_CHANGE_EVENT_BATCH_SCHEMA if binary else CHANGE_EVENT_BATCH_SCHEMA
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(keys, type=schema.field("key").type),
+            pa.array(values, type=schema.field("value").type),
+            pa.array(destinations, type=pa.string()),
+        ],
+        schema=schema,
+    )
+
+
+class ArrowChangeHandler(BasePythonChangeHandler):
+    """
+    Base class for handlers consuming change events as Arrow record batches.
+
+    Instead of working on `ChangeEvent` objects, subclasses implement `handleArrowBatch` and receive the whole
+    batch as a single `pyarrow.RecordBatch`, see `CHANGE_EVENT_BATCH_SCHEMA`. This is a columnar API, not a
+    faster path: the batch is assembled in Python from the events, reading the same fields from Java as
+    `handleJsonBatch`.
+    """
+    LOGGER_NAME = "pydbzengine.arrow.ArrowChangeHandler"
+
+    def __init__(self, binary: bool = False):
+        """
+        Initializes the ArrowChangeHandler.
+
+        Args:
+            binary: Deliver `key` and `value` as binary columns, should be used with the binary engine formats.
+        """
+        self.log = logging.getLogger(self.LOGGER_NAME)
+        self.binary = binary
+
+    def handleJsonBatch(self, records: List[ChangeEvent]):
+        """
+        Converts the received batch to an Arrow record batch and passes it to `handleArrowBatch`.
+
+        Args:
+            records: A list of Debezium ChangeEvent objects.
+        """
+        batch = change_events_to_record_batch(records, binary=self.binary)
+        self.log.debug(f"Converted {batch.num_rows} records to arrow batch")
+        self.handleArrowBatch(batch)
+
+    @abstractmethod
+    def handleArrowBatch(self, batch: pa.RecordBatch):
+        """
+        Handles a batch of change events in columnar form.
+
+        Args:
+            batch: Arrow record batch with the columns `key`, `value` and `destination`.
+        """
+        raise NotImplementedError
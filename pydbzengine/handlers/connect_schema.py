@@ -0,0 +1,200 @@
+"""
+Mapping of the Kafka Connect schemas embedded in Debezium JSON events (`converter.schemas.enable=true`) to Iceberg
+types, and conversion of the JSON values to the Python values of these types.
+
+Primitive types map to the Iceberg type of the same width, semantic types of Debezium and Kafka Connect
+(`io.debezium.time.*`, `org.apache.kafka.connect.data.*`) map to the matching temporal and decimal types.
+All fields are optional in Iceberg, so columns can be added when the source schema changes.
+See https://debezium.io/documentation/reference/stable/connectors/postgresql.html#postgresql-data-types
+"""
+import base64
+import datetime
+import decimal
+import itertools
+import re
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from pyiceberg.types import (
+    BinaryType,
+    BooleanType,
+    DateType,
+    DecimalType,
+    DoubleType,
+    FloatType,
+    IcebergType,
+    IntegerType,
+    ListType,
+    LongType,
+    MapType,
+    NestedField,
+    StringType,
+    StructType,
+    TimestampType,
+    TimestamptzType,
+    TimeType,
+)
+
+Converter = Callable[[Any], Any]
+
+MAX_DECIMAL_PRECISION = 38  # larger decimals are stored as strings
+
+_PRIMITIVE_TYPES: Dict[str, Callable[[], IcebergType]] = {
+    "int8": IntegerType,
+    "int16": IntegerType,
+    "int32": IntegerType,
+    "int64": LongType,
+    "float32": FloatType,
+    "float64": DoubleType,
+    "boolean": BooleanType,
+    "string": StringType,
+    "bytes": BinaryType,
+}
+
+# semantic type -> Iceberg type, and the factor converting the value to the unit of the type (days or microseconds)
+_TEMPORAL_TYPES: Dict[str, tuple] = {
+    "org.apache.kafka.connect.data.Date": (DateType, 1),
+    "io.debezium.time.Date": (DateType, 1),
+    "org.apache.kafka.connect.data.Time": (TimeType, 1000),
+    "io.debezium.time.Time": (TimeType, 1000),
+    "io.debezium.time.MicroTime": (TimeType, 1),
+    "io.debezium.time.NanoTime": (TimeType, 0.001),
+    "org.apache.kafka.connect.data.Timestamp": (TimestampType, 1000),
+    "io.debezium.time.Timestamp": (TimestampType, 1000),
+    "io.debezium.time.MicroTimestamp": (TimestampType, 1),
+    "io.debezium.time.NanoTimestamp": (TimestampType, 0.001),
+}
+DECIMAL = "org.apache.kafka.connect.data.Decimal"
+VARIABLE_SCALE_DECIMAL = "io.debezium.data.VariableScaleDecimal"
+ZONED_TIMESTAMP = "io.debezium.time.ZonedTimestamp"
+
+_ISO_FRACTION = re.compile(r"(\.\d{6})\d+")
+
+
+def _decimal_precision_scale(schema: dict) -> tuple:
+    parameters = schema.get("parameters") or {}
+    scale = int(parameters.get("scale", 0))
+    precision = int(parameters.get("connect.decimal.precision", MAX_DECIMAL_PRECISION))
+    return max(precision, scale), scale
+
+
+def iceberg_type(schema: dict, field_ids: Optional[Iterator[int]] = None) -> IcebergType:
+    """
+    Returns the Iceberg type of a Kafka Connect schema.
+
+    Args:
+        schema: Kafka Connect schema, e.g. `{"type": "int32", "optional": false, "name": "io.debezium.time.Date"}`.
+        field_ids: Ids of the nested fields, the ids are reassigned when the table is created or evolved.
+    """
+    field_ids = field_ids if field_ids is not None else itertools.count(1)
+    name = schema.get("name")
+    schema_type = schema["type"]
+    if name in _TEMPORAL_TYPES:
+        return _TEMPORAL_TYPES[name][0]()
+    if name == ZONED_TIMESTAMP:
+        return TimestamptzType()
+    if name == DECIMAL:
+        precision, scale = _decimal_precision_scale(schema)
+        return DecimalType(precision, scale) if precision <= MAX_DECIMAL_PRECISION else StringType()
+    if name == VARIABLE_SCALE_DECIMAL:
+        return StringType()
+    if schema_type in _PRIMITIVE_TYPES:
+        return _PRIMITIVE_TYPES[schema_type]()
+    if schema_type == "struct":
+        return StructType(*[NestedField(field_id=next(field_ids), name=field["field"],
+                                        field_type=iceberg_type(field, field_ids), required=False)
+                            for field in schema.get("fields", [])])
+    if schema_type == "array":
+        return ListType(element_id=next(field_ids), element_type=iceberg_type(schema["items"], field_ids),
+                        element_required=False)
+    if schema_type == "map":
+        return MapType(key_id=next(field_ids), key_type=iceberg_type(schema["keys"], field_ids),
+                       value_id=next(field_ids), value_type=iceberg_type(schema["values"], field_ids),
+                       value_required=False)
+    raise ValueError(f"Unsupported Kafka Connect schema type: {schema_type}")
+
+
+def _scaled(factor) -> Converter:
+    if factor == 1:
+        return int
+    if factor < 1:
+        divisor = int(round(1 / factor))
+        return lambda value: int(value) // divisor
+    return lambda value: int(value) * factor
+
+
+def _decimal(scale: int, as_string: bool) -> Converter:
+    def convert(value):
+        unscaled = int.from_bytes(base64.b64decode(value), byteorder="big", signed=True)
+        result = decimal.Decimal(unscaled).scaleb(-scale)
+        return str(result) if as_string else result
+
+    return convert
+
+
+def _variable_scale_decimal(value: dict) -> str:
+    unscaled = int.from_bytes(base64.b64decode(value["value"]), byteorder="big", signed=True)
+    return str(decimal.Decimal(unscaled).scaleb(-int(value["scale"])))
+
+
+def _zoned_timestamp(value: str) -> datetime.datetime:
+    # fromisoformat of older Python versions accepts neither `Z` nor more than 6 fractional digits
+    value = _ISO_FRACTION.sub(r"\1", value.replace("Z", "+00:00"))
+    return datetime.datetime.fromisoformat(value)
+
+
+def value_converter(schema: dict) -> Optional[Converter]:
+    """
+    Returns the function converting JSON values of the Kafka Connect schema to the Python values of its
+    Iceberg type (see `iceberg_type`), None if the JSON values can be used as they are.
+    The returned functions don't accept None, the callers skip nulls.
+    """
+    name = schema.get("name")
+    schema_type = schema["type"]
+    if name in _TEMPORAL_TYPES:
+        return _scaled(_TEMPORAL_TYPES[name][1])
+    if name == ZONED_TIMESTAMP:
+        return _zoned_timestamp
+    if name == DECIMAL:
+        precision, scale = _decimal_precision_scale(schema)
+        return _decimal(scale, as_string=precision > MAX_DECIMAL_PRECISION)
+    if name == VARIABLE_SCALE_DECIMAL:
+        return _variable_scale_decimal
+    if schema_type == "bytes":
+        return base64.b64decode
+    if schema_type == "struct":
+        converters = {field["field"]: value_converter(field) for field in schema.get("fields", [])}
+        converters = {field: converter for field, converter in converters.items() if converter is not None}
+        if not converters:
+            return None
+
+        def convert_struct(value: dict) -> dict:
+            value = dict(value)
+            for field, converter in converters.items():
+                field_value = value.get(field)
+                if field_value is not None:
+                    value[field] = converter(field_value)
+            return value
+
+        return convert_struct
+    if schema_type == "array":
+        items = value_converter(schema["items"])
+        if items is None:
+            return None
+        return lambda value: [items(v) if v is not None else None for v in value]
+    if schema_type == "map":
+        keys = value_converter(schema["keys"]) or (lambda k: k)
+        values = value_converter(schema["values"]) or (lambda v: v)
+        # the JSON converter writes maps with string keys as objects, and other maps as arrays of [key, value]
+        return lambda value: [(keys(k), values(v) if v is not None else None)
+                              for k, v in (value.items() if isinstance(value, dict) else value)]
+    return None
+
+
+def envelope_field_schema(envelope_schema: dict, field: str) -> Optional[dict]:
+    """
+    Returns the schema of a field of the Debezium envelope schema, e.g. the row schema of `after`.
+    """
+    for field_schema in envelope_schema.get("fields", []):
+        if field_schema.get("field") == field:
+            return field_schema
+    return None
@@ -1,10 +1,25 @@
+import io
 import json
 import logging
-from typing import List, Dict
+import threading
+import time
+from typing import Any, List, Dict, Callable, Optional, Tuple, Union
 
 import dlt
+import pyarrow as pa
+import pyarrow.json as pa_json
 
-from pydbzengine import ChangeEvent, BasePythonChangeHandler
+from pydbzengine import ChangeEvent, BasePythonChangeHandler, to_payload, metrics
+from pydbzengine.jvm import detach_thread
+
+
+DELETED_COLUMN = "_dbz_deleted"
+OP_COLUMN = "_dbz_op"
+TS_MS_COLUMN = "_dbz_ts_ms"
+
+
+def destination_to_table_name(destination: str) -> str:
+    return destination.replace(".", "_")
 
 
 @dlt.source
@@ -25,8 +40,8 @@ def debezium_source_events(records: List[ChangeEvent]):
     # group the events per table
     table_events: Dict[str, List[str]] = {}
     for e in records:
-        table = e.destination().replace(".", "_")
-        val = json.loads(e.value())
+        table = destination_to_table_name(e.destination())
+        val = json.loads(to_payload(e.value()))
         if table in table_events:
             table_events[table].append(val)
         else:
@@ -36,6 +51,145 @@ def debezium_source_events(records: List[ChangeEvent]):
         yield dlt.resource(events, name=table_name)
 
 
+@dlt.source
+def debezium_arrow_tables(tables: Dict[str, Union[pa.Table, List[dict]]]):
+    """
+    A DLT source yielding Arrow tables of change events, dlt loads Arrow tables without normalizing them row by row.
+
+    Args:
+        tables: Arrow table of the events of each destination table name, see `json_values_to_arrow`, or the
+            list of parsed events of tables which can't be converted to Arrow, normalized by dlt.
+
+    Yields:
+        dlt.Resource: A DLT resource for each table.
+    """
+    for table_name, table in tables.items():
+        yield dlt.resource(table, name=table_name)
+
+
+@dlt.source
+def debezium_source_events_values(table_values: Dict[str, List[Union[str, bytes]]]):
+    """
+    A DLT source yielding the buffered event values of each destination table name, parsed with `json.loads`.
+    """
+    for table_name, values in table_values.items():
+        yield dlt.resource([json.loads(value) for value in values], name=table_name)
+
+
+@dlt.source
+def debezium_merge_tables(tables: Dict[str, Tuple[Optional[List[str]], Union[pa.Table, List[dict]]]]):
+    """
+    A DLT source yielding the current row states of each destination table name, with the `merge` write
+    disposition and the primary key of the Debezium event keys. Rows with `_dbz_deleted` set are hard deletes.
+
+    Args:
+        tables: The primary key columns (None for tables without key) and the rows, see `collapse_changes`.
+    """
+    for table_name, (primary_key, rows) in tables.items():
+        if primary_key:
+            yield dlt.resource(rows, name=table_name, write_disposition="merge", primary_key=primary_key,
+                               columns={DELETED_COLUMN: {"data_type": "bool", "hard_delete": True}})
+        else:
+            yield dlt.resource(rows, name=table_name, write_disposition="append")
+
+
+def _json_payload(value: Union[str, bytes, None]) -> Any:
+    """
+    Parses a JSON key or value, without the schema of `converter.schemas.enable=true`.
+    """
+    if value is None:
+        return None
+    document = json.loads(value)
+    if isinstance(document, dict) and "schema" in document and "payload" in document:
+        return document["payload"]
+    return document
+
+
+def collapse_changes(keys: List[Union[str, bytes, None]],
+                     values: List[Union[str, bytes, None]]) -> Tuple[Optional[List[str]], List[dict]]:
+    """
+    Collapses the change events of a table to the last row state of each event key, in the order of the events.
+
+    The primary key columns are the fields of the event key. A row is the `after` state with the columns
+    `_dbz_op` and `_dbz_ts_ms`, deletes and tombstones give a row with the key columns and `_dbz_deleted` set.
+    Values without the Debezium envelope (e.g. of the `ExtractNewRecordState` transformation) are used as rows,
+    and are deletes when `__deleted` is true.
+    Events without key (tables without primary key) are all kept, and their deletes are dropped.
+
+    Returns:
+        tuple: The primary key columns, None if the events have no keys, and the rows.
+    """
+    rows: Dict[Any, dict] = {}
+    unkeyed: List[dict] = []
+    primary_key: Optional[List[str]] = None
+    for key, value in zip(keys, values):
+        key = _json_payload(key)
+        payload = _json_payload(value)
+        if payload is None or payload.get("op") == "d" or payload.get("__deleted") in ("true", True):
+            row = {DELETED_COLUMN: True}
+        elif "op" in payload:
+            row = {**(payload.get("after") or {}), DELETED_COLUMN: False}
+        else:
+            row = {**payload, DELETED_COLUMN: False}
+        if payload is not None and "op" in payload:
+            row[OP_COLUMN] = payload["op"]
+            row[TS_MS_COLUMN] = payload.get("ts_ms")
+        if not isinstance(key, dict) or not key:
+            if not row[DELETED_COLUMN]:
+                unkeyed.append(row)
+            continue
+        primary_key = primary_key or list(key)
+        row.update(key)
+        row_key = tuple(key.get(column) for column in primary_key)
+        rows.pop(row_key, None)  # keeps the order of the last change
+        rows[row_key] = row
+    return primary_key, list(rows.values()) + unkeyed
+
+
+def _flatten(table: pa.Table) -> pa.Table:
+    """
+    Flattens the struct columns to columns named like the nested fields normalized by dlt (`after__id`),
+    and drops the columns without any value, which have no type.
+    """
+    while any(pa.types.is_struct(column.type) for column in table.columns):
+        table = table.flatten()
+    table = table.rename_columns([name.replace(".", "__") for name in table.column_names])
+    return table.select([i for i, column in enumerate(table.columns) if not pa.types.is_null(column.type)])
+
+
+def json_values_to_arrow(values: List[Union[str, bytes]]) -> pa.Table:
+    """
+    Parses JSON event values to an Arrow table with the Arrow JSON reader, without creating Python objects
+    per event. Nested objects are flattened to columns (`after__id`), arrays are kept as list columns.
+    Raises `pa.ArrowInvalid` when a field has incompatible types in different events, e.g. an integer
+    and a string.
+    """
+    data = [value.encode("utf-8") if isinstance(value, str) else bytes(value) for value in values]
+    # one block, the types are inferred from all events
+    block_size = max(1 << 20, sum(len(value) + 1 for value in data))
+    table = pa_json.read_json(io.BytesIO(b"\n".join(data)), read_options=pa_json.ReadOptions(block_size=block_size))
+    return _flatten(table)
+
+
+class _EventBuffer:
+    """
+    Event values of the destination tables waiting to be loaded.
+    """
+
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self.keys: Dict[str, List[Union[str, bytes, None]]] = {}
+        self.values: Dict[str, List[Union[str, bytes, None]]] = {}
+        self.num_rows = 0
+        self.nbytes = 0
+
+    def add(self, table_name: str, key: Union[str, bytes, None], value: Union[str, bytes, None]):
+        self.keys.setdefault(table_name, []).append(key)
+        self.values.setdefault(table_name, []).append(value)
+        self.num_rows += 1
+        self.nbytes += len(value) if value is not None else 0
+
+
 class DltChangeHandler(BasePythonChangeHandler):
     """
     A change handler that uses the dlt library to process Debezium change events.
@@ -45,15 +199,63 @@ class DltChangeHandler(BasePythonChangeHandler):
     """
     LOGGER_NAME = "debeziumdlt.DltChangeHandler"
 
-    def __init__(self, dlt_pipeline):
+    def __init__(self, dlt_pipeline, arrow: bool = False, flush_max_rows: int = 0, flush_max_bytes: int = 0,
+                 flush_max_age_sec: float = 0, write_disposition: str = "append"):
         """
         Initializes the DltChangeHandler.
 
         Args:
             dlt_pipeline: The dlt pipeline instance to use for loading data.
+            arrow: Convert the events to an Arrow table per destination table with the Arrow JSON reader, dlt loads
+                Arrow tables without the extract and normalize steps for every row, see `json_values_to_arrow`.
+                When False the events are parsed with `json.loads` and normalized by dlt.
+            flush_max_rows: Buffer the events across batches, and run the pipeline when this many events are
+                buffered. 0 disables the threshold.
+            flush_max_bytes: Run the pipeline when the buffered event values reach this size. 0 disables the threshold.
+            flush_max_age_sec: Run the pipeline when the oldest buffered events are this old, checked by a
+                background thread. 0 disables the threshold.
+                When any threshold is set, the batches are acknowledged to the engine only after the pipeline
+                loaded their events (deferred commits), and the buffered events are loaded when the engine stops.
+            write_disposition: "append" loads every event as it is. "merge" maintains current-state tables, the
+                changes of a batch (or of the buffered batches) are collapsed to the last row state of each event key,
+                which is merged into the table with the event key fields as primary key, and deletes are hard
+                deletes, see `collapse_changes`.
         """
+        if write_disposition not in ("append", "merge"):
+            raise ValueError(f"write_disposition must be append or merge, got {write_disposition}!")
+        if flush_max_rows < 0 or flush_max_bytes < 0 or flush_max_age_sec < 0:
+            raise ValueError("flush_max_rows, flush_max_bytes and flush_max_age_sec must be greater than or equal to 0!")
         self.dlt_pipeline = dlt_pipeline
+        self.arrow = arrow
+        self.write_disposition = write_disposition
+        self.flush_max_rows = flush_max_rows
+        self.flush_max_bytes = flush_max_bytes
+        self.flush_max_age_sec = flush_max_age_sec
         self.log = logging.getLogger(self.LOGGER_NAME)
+        self._buffer: Optional[_EventBuffer] = None
+        self._buffer_lock = threading.RLock()
+        self._batches_received = 0
+        self._batches_durable = 0
+        self._commit_listener: Optional[Callable[[int], None]] = None
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_error: Optional[Exception] = None
+        self._closed = threading.Event()
+
+    @property
+    def buffering(self) -> bool:
+        """
+        True if events are buffered across batches, see the `flush_max_*` arguments.
+        """
+        return self.flush_max_rows > 0 or self.flush_max_bytes > 0 or self.flush_max_age_sec > 0
+
+    def set_commit_listener(self, listener: Callable[[int], None]) -> bool:
+        """
+        Enables deferred commits when events are buffered across batches.
+        """
+        if not self.buffering:
+            return False
+        self._commit_listener = listener
+        return True
 
     def handleJsonBatch(self, records: List[ChangeEvent]):
         """
@@ -67,5 +269,133 @@ class DltChangeHandler(BasePythonChangeHandler):
             records: A list of Debezium ChangeEvent objects representing database changes.
         """
         self.log.info(f"Received {len(records)} records")
-        self.dlt_pipeline.run(debezium_source_events(records))
-        self.log.info(f"Consumed {len(records)} records")
+        if not self.buffering:
+            if self.arrow or self.write_disposition == "merge":
+                buffer = _EventBuffer()
+                self._add_records(buffer, records)
+                self._load(buffer)
+            else:
+                self._run(debezium_source_events(records), num_records=len(records))
+            self.log.info(f"Consumed {len(records)} records")
+            return
+
+        with self._buffer_lock:
+            if self._flush_error is not None:
+                raise RuntimeError("Loading the buffered events failed") from self._flush_error
+            if self._buffer is None:
+                self._buffer = _EventBuffer()
+            self._add_records(self._buffer, records)
+            self._batches_received += 1
+            if (0 < self.flush_max_rows <= self._buffer.num_rows) \
+                    or (0 < self.flush_max_bytes <= self._buffer.nbytes) or self._expired():
+                self.flush()
+        if self.flush_max_age_sec > 0 and self._flush_thread is None:
+            self._flush_thread = threading.Thread(target=self._flush_expired_buffer, daemon=True,
+                                                  name="pydbzengine-dlt-flush")
+            self._flush_thread.start()
+
+    def _add_records(self, buffer: _EventBuffer, records: List[ChangeEvent]):
+        merge = self.write_disposition == "merge"
+        for record in records:
+            value = to_payload(record.value())
+            if value is not None or merge:  # tombstones delete the key when merging
+                buffer.add(destination_to_table_name(record.destination()),
+                           to_payload(record.key()) if merge else None, value)
+
+    def _load(self, buffer: _EventBuffer):
+        """
+        Loads the events of the buffer with a single pipeline run.
+        """
+        if not buffer.num_rows:
+            return
+        start = time.perf_counter()
+        if self.write_disposition == "merge":
+            tables = {}
+            for table_name, values in buffer.values.items():
+                primary_key, rows = collapse_changes(buffer.keys[table_name], values)
+                tables[table_name] = (primary_key, self._rows_to_arrow(table_name, rows) if self.arrow else rows)
+            source = debezium_merge_tables(tables)
+        elif self.arrow:
+            source = debezium_arrow_tables(
+                {table_name: self._to_arrow(table_name, values) for table_name, values in buffer.values.items()})
+        else:
+            source = debezium_source_events_values(buffer.values)
+        if self.metrics is not None:
+            self.metrics.observe(metrics.HANDLER_CONVERT_SECONDS, time.perf_counter() - start,
+                                 labels={"handler": type(self).__name__})
+        self._run(source, num_records=buffer.num_rows)
+
+    def _run(self, source, num_records: int):
+        """
+        Runs the pipeline with the source, and reports the run time and the records to the metrics sink.
+        """
+        start = time.perf_counter()
+        self.dlt_pipeline.run(source)
+        if self.metrics is not None:
+            labels = {"handler": type(self).__name__}
+            self.metrics.observe(metrics.HANDLER_WRITE_SECONDS, time.perf_counter() - start, labels=labels)
+            self.metrics.increment(metrics.HANDLER_WRITTEN_RECORDS, num_records, labels=labels)
+
+    def _to_arrow(self, table_name: str, values: List[Union[str, bytes]]) -> Union[pa.Table, List[dict]]:
+        """
+        Converts the events of a table to Arrow, or parses them for the dlt normalizer when a field has
+        incompatible types, dlt stores these in variant columns.
+        """
+        try:
+            return json_values_to_arrow(values)
+        except pa.ArrowInvalid as e:
+            self.log.warning(f"Events of {table_name} can't be converted to Arrow, loading them without: {e}")
+            return [json.loads(value) for value in values]
+
+    def _rows_to_arrow(self, table_name: str, rows: List[dict]) -> Union[pa.Table, List[dict]]:
+        try:
+            return _flatten(pa.Table.from_pylist(rows))
+        except pa.ArrowInvalid as e:
+            self.log.warning(f"Rows of {table_name} can't be converted to Arrow, loading them without: {e}")
+            return rows
+
+    def _expired(self) -> bool:
+        return self._buffer is not None and 0 < self.flush_max_age_sec <= time.monotonic() - self._buffer.created_at
+
+    def flush(self):
+        """
+        Loads the buffered events with a single pipeline run, then reports the batches to the commit listener.
+        The buffer is kept when the run fails.
+        """
+        with self._buffer_lock:
+            if self._buffer is not None:
+                self._load(self._buffer)
+                self.log.info(f"Consumed {self._buffer.num_rows} records")
+                self._buffer = None
+            if self._batches_received > self._batches_durable:
+                self._batches_durable = self._batches_received
+                if self._commit_listener is not None:
+                    self._commit_listener(self._batches_durable)
+
+    def _flush_expired_buffer(self):
+        """
+        Background loop loading the buffered events older than `flush_max_age_sec`.
+        """
+        interval = min(max(self.flush_max_age_sec / 4, 0.05), 1.0)
+        try:
+            while not self._closed.wait(interval):
+                with self._buffer_lock:
+                    if self._expired():
+                        self.flush()
+        except Exception as e:
+            self.log.error(f"Loading the buffered events failed: {e}", exc_info=True)
+            self._flush_error = e
+        finally:
+            detach_thread()
+
+    def close(self):
+        """
+        Loads the buffered events and stops the background flush thread.
+        """
+        self._closed.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        if self.buffering:
+            self.flush()
+
@@ -0,0 +1,224 @@
+"""
+Batch extraction of Debezium JSON envelopes into Arrow columns.
+
+Instead of parsing each event value with `json.loads` and serializing the nested `source`, `before` and `after`
+documents back with `json.dumps`, the envelope fields are extracted as the raw JSON slices of the original values.
+
+The Debezium JSON converter writes compact JSON with the envelope fields in a fixed order, which is matched for
+the whole batch at once with Arrow's regular expression kernels (RE2, running in C++). Values which don't have this
+layout (e.g. with whitespace, a different field order, or rows nested deeper than `MAX_NESTING_DEPTH`) are split one
+by one with `split_envelope`.
+"""
+import hashlib
+import json
+import re
+import uuid
+from typing import Dict, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Envelope fields and their Arrow types, nested documents are kept as JSON strings.
+ENVELOPE_FIELDS: Dict[str, pa.DataType] = {
+    "op": pa.string(),
+    "ts_ms": pa.int64(),
+    "ts_us": pa.int64(),
+    "ts_ns": pa.int64(),
+    "source": pa.string(),
+    "before": pa.string(),
+    "after": pa.string(),
+}
+MAX_NESTING_DEPTH = 3
+
+_JSON_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+
+
+def _json_object_pattern(depth: int) -> str:
+    """
+    Returns a regular expression matching a JSON object with nested objects up to the given depth.
+    """
+    content = r'[^{}"]|' + _JSON_STRING
+    pattern = r"\{(?:" + content + r")*\}"
+    for _ in range(depth - 1):
+        pattern = r"\{(?:" + content + "|" + pattern + r")*\}"
+    return pattern
+
+
+_ROW = _json_object_pattern(MAX_NESTING_DEPTH)
+_FLAT_OBJECT = _json_object_pattern(1)
+# `{"before":...,"after":...`, anchored at the start of the value
+_PREFIX_PATTERN = r'^\{"before":(?P<before>null|' + _ROW + r'),"after":(?P<after>null|' + _ROW + ")"
+# `,"source":...,"op":...,"ts_ms":...}`, anchored at the end of the value, source and transaction are flat
+_SUFFIX_PATTERN = (r'(?P<suffix>,"source":(?P<source>' + _FLAT_OBJECT + r'),(?:"transaction":(?:null|'
+                   + _FLAT_OBJECT + r'),)?"op":"(?P<op>[a-z])","ts_ms":(?P<ts_ms>-?\d+)'
+                   r'(?:,"ts_us":(?P<ts_us>-?\d+))?(?:,"ts_ns":(?P<ts_ns>-?\d+))?\}$)')
+_PREFIX_LENGTH = len('{"before":,"after":')
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_KEY = re.compile(r'[ \t\n\r]*"([^"\\]*(?:\\.[^"\\]*)*)"[ \t\n\r]*:[ \t\n\r]*', re.DOTALL)
+_STRING = re.compile(_JSON_STRING, re.DOTALL)
+_SCALAR = re.compile(r"[^,}\] \t\n\r]+")
+# content of a nested document up to the next bracket, strings containing brackets are skipped as a whole
+_NON_BRACKETS = re.compile(r'[^"{}\[\]]*(?:' + _JSON_STRING + r'[^"{}\[\]]*)*', re.DOTALL)
+
+
+def _container_end(value: str, pos: int) -> int:
+    """
+    Returns the end position of the JSON object or array starting at `pos`.
+    """
+    depth = 0
+    while True:
+        if value[pos] in "{[":
+            depth += 1
+        else:
+            depth -= 1
+        pos += 1
+        if depth == 0:
+            return pos
+        pos = _NON_BRACKETS.match(value, pos).end()
+        if pos >= len(value):
+            raise ValueError("Invalid JSON, unterminated object or array")
+
+
+def split_envelope(value: str) -> Dict[str, str]:
+    """
+    Splits a JSON object into its top-level fields, without parsing the field values.
+
+    Args:
+        value: JSON object, e.g. the value of a Debezium change event.
+
+    Returns:
+        dict: Field name -> raw JSON text of the field value, e.g. `{"op": '"c"', "after": '{"id":1}'}`.
+    """
+    pos = _WHITESPACE.match(value).end()
+    if value[pos:pos + 1] != "{":
+        raise ValueError(f"Invalid JSON object: {value[:100]}")
+    pos = _WHITESPACE.match(value, pos + 1).end()
+    fields = {}
+    if value[pos:pos + 1] == "}":
+        return fields
+    while True:
+        key_match = _KEY.match(value, pos)
+        if key_match is None:
+            raise ValueError(f"Invalid JSON object, expected a field name at {pos}: {value[:100]}")
+        key = key_match.group(1)
+        if "\\" in key:
+            key = json.loads(f'"{key}"')
+        start = key_match.end()
+        first = value[start:start + 1]
+        if first in ("{", "["):
+            end = _container_end(value, start)
+        elif first == '"':
+            end = _STRING.match(value, start).end()
+        else:
+            scalar = _SCALAR.match(value, start)
+            if scalar is None:
+                raise ValueError(f"Invalid JSON object, expected a value at {start}: {value[:100]}")
+            end = scalar.end()
+        fields[key] = value[start:end]
+        pos = _WHITESPACE.match(value, end).end()
+        separator = value[pos:pos + 1]
+        pos += 1
+        if separator == "}":
+            return fields
+        if separator != ",":
+            raise ValueError(f"Invalid JSON object, expected ',' or '}}' at {pos - 1}: {value[:100]}")
+
+
+def _json_field_value(raw: Optional[str], type: pa.DataType):
+    """
+    Converts the raw JSON text of an envelope field to the value of its column, None for a missing value or `null`.
+    """
+    if raw is None or raw == "null":
+        return None
+    if pa.types.is_integer(type):
+        return int(raw)
+    if raw[:1] == '"':
+        return raw[1:-1] if "\\" not in raw else json.loads(raw)
+    return raw
+
+
+def _null_if(array: pa.Array, value: str) -> pa.Array:
+    return pc.if_else(pc.equal(array, value), pa.scalar(None, array.type), array)
+
+
+def envelope_columns(values: pa.Array) -> Dict[str, pa.Array]:
+    """
+    Extracts the envelope fields of a batch of Debezium JSON event values as Arrow columns, see `ENVELOPE_FIELDS`.
+    Nested documents are returned as their original JSON text. Null values (e.g. tombstones) give nulls.
+
+    Args:
+        values: String array of event values.
+    """
+    values = values.cast(pa.string()) if values.type != pa.string() else values
+    prefix = pc.extract_regex(values, _PREFIX_PATTERN)
+    suffix = pc.extract_regex(values, _SUFFIX_PATTERN)
+    before, after = pc.struct_field(prefix, "before"), pc.struct_field(prefix, "after")
+    columns = {
+        "before": _null_if(before, "null"),
+        "after": _null_if(after, "null"),
+        "source": pc.struct_field(suffix, "source"),
+        "op": pc.struct_field(suffix, "op"),
+        "ts_ms": pc.struct_field(suffix, "ts_ms").cast(pa.int64()),
+        "ts_us": _null_if(pc.struct_field(suffix, "ts_us"), "").cast(pa.int64()),
+        "ts_ns": _null_if(pc.struct_field(suffix, "ts_ns"), "").cast(pa.int64()),
+    }
+    # the prefix and the suffix must cover the whole value, otherwise the value is split one by one
+    matched_length = pc.add(pc.add(pc.binary_length(before), pc.binary_length(after)),
+                            pc.binary_length(pc.struct_field(suffix, "suffix")))
+    matched = pc.equal(pc.add(matched_length, _PREFIX_LENGTH), pc.binary_length(values))
+    unmatched = pc.indices_nonzero(pc.invert(pc.fill_null(matched, False))).to_pylist()
+    if not unmatched:
+        return columns
+
+    patched = {name: column.to_pylist() for name, column in columns.items()}
+    for i in unmatched:
+        value = values[i].as_py()
+        envelope = split_envelope(value) if value is not None else {}
+        for name, type in ENVELOPE_FIELDS.items():
+            patched[name][i] = _json_field_value(envelope.get(name), type)
+    return {name: pa.array(patched[name], type=type) for name, type in ENVELOPE_FIELDS.items()}
+
+
+def uuid5_array(keys: Sequence[Optional[str]], namespace: uuid.UUID = uuid.NAMESPACE_DNS,
+                type: pa.DataType = pa.binary(16)) -> pa.Array:
+    """
+    Hashes the keys to name-based UUIDs (`uuid.uuid5`) and returns them as a 16 byte binary Arrow array,
+    null and empty keys give null hashes. The digests are written to a single buffer, without creating `UUID` objects.
+
+    Args:
+        keys: Keys to hash.
+        namespace: UUID namespace, the same as `uuid.uuid5(namespace, key)`.
+        type: Arrow type of the result, `pa.binary(16)` or an extension type stored as it, e.g. `pa.uuid()`.
+    """
+    namespace_hash = hashlib.sha1(namespace.bytes)
+    digests = bytearray()
+    validity = bytearray((len(keys) + 7) // 8)
+    null_count = 0
+    empty = bytes(16)
+    for i, key in enumerate(keys):
+        if key:
+            h = namespace_hash.copy()
+            h.update(key.encode("utf-8"))
+            digests += h.digest()[:16]
+            validity[i >> 3] |= 1 << (i & 7)
+        else:
+            digests += empty
+            null_count += 1
+    # set the version (5) and the variant (RFC 4122) bits, as uuid.uuid5 does
+    digests[6::16] = bytes((b & 0x0F) | 0x50 for b in digests[6::16])
+    digests[8::16] = bytes((b & 0x3F) | 0x80 for b in digests[8::16])
+    storage_type = type.storage_type if isinstance(type, pa.ExtensionType) else type
+    storage = pa.Array.from_buffers(storage_type, len(keys),
+                                    [pa.py_buffer(validity) if null_count else None, pa.py_buffer(digests)],
+                                    null_count=null_count)
+    if isinstance(type, pa.ExtensionType):
+        return pa.ExtensionArray.from_storage(type, storage)
+    return storage
+
+
+def decode_payloads(payloads: List) -> List[Optional[str]]:
+    """
+    Decodes the bytes payloads of the binary engine formats to strings, strings and None are kept.
+    """
+    return [p.decode("utf-8") if isinstance(p, bytes) else p for p in payloads]
@@ -1,17 +1,28 @@
 import datetime
+import itertools
 import json
 import logging
+import threading
+import time
 import uuid
 from abc import abstractmethod
-from typing import List, Dict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import List, Dict, Callable, Optional, Tuple, Set, Union
 
 import pyarrow as pa
+import pyarrow.compute as pc
 from pyiceberg.catalog import Catalog
-from pyiceberg.exceptions import NoSuchTableError
+from pyiceberg.exceptions import NoSuchTableError, CommitFailedException, ValidationException
+from pyiceberg.expressions import In
+from pyiceberg.io.pyarrow import schema_to_pyarrow
 from pyiceberg.partitioning import PartitionSpec, PartitionField
 from pyiceberg.schema import Schema
 from pyiceberg.table import Table
-from pyiceberg.transforms import DayTransform
+from pyiceberg.table.sorting import SortOrder, SortField, SortDirection, NullOrder, UNSORTED_SORT_ORDER
+from pyiceberg.transforms import BucketTransform, DayTransform, IdentityTransform, Transform
 from pyiceberg.types import (
     StringType,
     NestedField,
@@ -20,7 +31,101 @@ from pyiceberg.types import (
     TimestampType,
 )
 
-from pydbzengine import ChangeEvent, BasePythonChangeHandler
+from pydbzengine import ChangeEvent, BasePythonChangeHandler, to_payload, metrics
+from pydbzengine.handlers.connect_schema import envelope_field_schema, iceberg_type, value_converter
+from pydbzengine.handlers.envelope import envelope_columns, uuid5_array, decode_payloads
+from pydbzengine.jvm import detach_thread
+
+
+class _TableBuffer:
+    """
+    Converted events of a destination table waiting to be written.
+    """
+
+    def __init__(self, first_batch: int):
+        self.first_batch = first_batch  # sequence number of the oldest batch with events in the buffer
+        self.created_at = time.monotonic()
+        self.tables: List[pa.Table] = []
+        self.num_rows = 0
+        self.nbytes = 0
+
+    def add(self, data: pa.Table):
+        self.tables.append(data)
+        self.num_rows += data.num_rows
+        self.nbytes += data.nbytes
+
+
+@dataclass
+class IcebergTableOptions:
+    """
+    Layout of the Iceberg tables created by the handlers, applied when a table doesn't exist yet.
+
+    Example, point lookups by key read one bucket of a day, and within the data files the rows of a key
+    are next to each other, so the column statistics skip most files and row groups:
+        IcebergTableOptions(partition_by=[("_dbz_event_key_hash", BucketTransform(16)),
+                                          ("_consumed_at", DayTransform())],
+                            sort_by=["_dbz_event_key_hash"],
+                            properties={"write.parquet.compression-codec": "zstd",
+                                        "write.parquet.row-group-limit": "500000"})
+
+    Attributes:
+        partition_by: Partition fields as (column, transform) pairs, None keeps the partitioning of the handler
+            (daily on `_consumed_at`), an empty list creates unpartitioned tables.
+        sort_by: Sort order as column names or (column, "ascending" | "descending") pairs. The handlers sort
+            the rows of each write by the sort order of the table, nulls last, see `BaseIcebergChangeHandler.sort_rows`.
+        properties: Table properties, e.g. the Parquet writer properties of pyiceberg `write.parquet.compression-codec`,
+            `write.parquet.compression-level` and `write.parquet.row-group-limit` (rows per row group).
+    """
+    partition_by: Optional[List[Tuple[str, Transform]]] = None
+    sort_by: List[Union[str, Tuple[str, str]]] = field(default_factory=list)
+    properties: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def bucketed_by_key(cls, num_buckets: int, **kwargs) -> "IcebergTableOptions":
+        """
+        Options partitioning by `bucket(num_buckets, _dbz_event_key_hash)` and `day(_consumed_at)`, and sorting by
+        `_dbz_event_key_hash`. The other attributes are passed as keyword arguments.
+        """
+        return cls(partition_by=[("_dbz_event_key_hash", BucketTransform(num_buckets)),
+                                 ("_consumed_at", DayTransform())],
+                   sort_by=kwargs.pop("sort_by", ["_dbz_event_key_hash"]), **kwargs)
+
+    def partition_spec(self, schema: Schema, default: PartitionSpec) -> PartitionSpec:
+        """
+        Returns the partition spec for the table schema, `default` when `partition_by` is None.
+        """
+        if self.partition_by is None:
+            return default
+        fields = []
+        for position, (column, transform) in enumerate(self.partition_by):
+            name = column if isinstance(transform, IdentityTransform) else f"{column}_{str(transform).split('[')[0]}"
+            fields.append(PartitionField(source_id=self._field_id(schema, column), field_id=1000 + position,
+                                         transform=transform, name=name))
+        return PartitionSpec(*fields)
+
+    def sort_order(self, schema: Schema) -> SortOrder:
+        """
+        Returns the sort order for the table schema.
+        """
+        if not self.sort_by:
+            return UNSORTED_SORT_ORDER
+        fields = []
+        for sort_key in self.sort_by:
+            column, direction = (sort_key, "ascending") if isinstance(sort_key, str) else sort_key
+            if direction not in ("ascending", "descending"):
+                raise ValueError(f"Sort direction of {column} must be ascending or descending, got {direction}")
+            fields.append(SortField(source_id=self._field_id(schema, column), transform=IdentityTransform(),
+                                    direction=SortDirection.ASC if direction == "ascending" else SortDirection.DESC,
+                                    null_order=NullOrder.NULLS_LAST))
+        return SortOrder(*fields)
+
+    @staticmethod
+    def _field_id(schema: Schema, column: str) -> int:
+        try:
+            return schema.find_field(column).field_id
+        except ValueError:
+            raise ValueError(f"Column {column} not found in the table schema, "
+                             f"columns: {', '.join(f.name for f in schema.fields)}") from None
 
 
 class BaseIcebergChangeHandler(BasePythonChangeHandler):
@@ -29,14 +134,83 @@ class BaseIcebergChangeHandler(BasePythonChangeHandler):
     )
     LOGGER_NAME = "pydbzengine.iceberg.IcebergChangeHandler"
 
-    def __init__(self, catalog: "Catalog", destination_namespace: tuple, supports_variant: bool = False):
+    def __init__(self, catalog: "Catalog", destination_namespace: tuple, supports_variant: bool = False,
+                 table_cache_size: int = 128, flush_max_rows: int = 0, flush_max_bytes: int = 0,
+                 flush_max_age_sec: float = 0, max_parallel_writes: int = 1,
+                 table_options: Optional[IcebergTableOptions] = None,
+                 destination_table_options: Optional[Dict[str, IcebergTableOptions]] = None):
         """
         Initializes the IcebergChangeHandler.
+
+        Args:
+            catalog: Iceberg catalog of the destination tables.
+            destination_namespace: Namespace of the destination tables.
+            supports_variant: Whether the catalog supports the variant type. Reserved until pyiceberg supports
+                the Variant type, the `source`, `before` and `after` documents are stored as JSON strings.
+            table_cache_size: Maximum number of table objects kept to avoid loading the table from the catalog
+                for every batch, the least recently used table is evicted. 0 disables the cache.
+            flush_max_rows: Buffer the events of each table across batches, and write them when the buffer has
+                this many rows. 0 disables the threshold.
+            flush_max_bytes: Write the buffer of a table when its Arrow data reaches this size. 0 disables the threshold.
+            flush_max_age_sec: Write the buffer of a table when its oldest events are this old, checked by a
+                background thread. 0 disables the threshold.
+                When any threshold is set, the batches are acknowledged to the engine only after all their
+                events are written (deferred commits), and the buffers are written when the engine stops.
+            max_parallel_writes: Number of tables written and committed concurrently when a batch (or a flush)
+                has events of several tables. The events are converted to Arrow in the calling thread, the
+                Parquet encoding, upload and catalog commit run in a thread pool. When any table fails, the error
+                is raised after all writes finished and the batch isn't acknowledged. 1 writes the tables one by one.
+            table_options: Partitioning, sort order and properties of the tables created by the handler,
+                see `IcebergTableOptions`. None creates the tables partitioned daily on `_consumed_at`.
+            destination_table_options: Options of the tables of specific destinations (e.g.
+                `"testc.inventory.orders"`), overriding `table_options`.
         """
+        if table_cache_size < 0:
+            raise ValueError("table_cache_size must be greater than or equal to 0!")
+        if flush_max_rows < 0 or flush_max_bytes < 0 or flush_max_age_sec < 0:
+            raise ValueError("flush_max_rows, flush_max_bytes and flush_max_age_sec must be greater than or equal to 0!")
+        if max_parallel_writes < 1:
+            raise ValueError("max_parallel_writes must be greater than or equal to 1!")
         self.log = logging.getLogger(self.LOGGER_NAME)
         self.destination_namespace: tuple = destination_namespace
         self.catalog = catalog
         self.supports_variant = supports_variant
+        self.table_cache_size = table_cache_size
+        self._table_cache: "OrderedDict[tuple, Table]" = OrderedDict()
+        self._table_cache_lock = threading.Lock()
+        self.max_parallel_writes = max_parallel_writes
+        self.table_options = table_options or IcebergTableOptions()
+        self._destination_table_options: Dict[tuple, IcebergTableOptions] = {
+            self.destination_to_table_identifier(destination): options
+            for destination, options in (destination_table_options or {}).items()}
+        self._write_executor: Optional[ThreadPoolExecutor] = None
+        self.flush_max_rows = flush_max_rows
+        self.flush_max_bytes = flush_max_bytes
+        self.flush_max_age_sec = flush_max_age_sec
+        self._buffers: Dict[str, _TableBuffer] = {}
+        self._buffer_lock = threading.RLock()
+        self._batches_received = 0
+        self._batches_durable = 0
+        self._commit_listener: Optional[Callable[[int], None]] = None
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_error: Optional[Exception] = None
+        self._closed = threading.Event()
+
+    @property
+    def buffering(self) -> bool:
+        """
+        True if events are buffered across batches, see the `flush_max_*` arguments.
+        """
+        return self.flush_max_rows > 0 or self.flush_max_bytes > 0 or self.flush_max_age_sec > 0
+
+    def set_commit_listener(self, listener: Callable[[int], None]) -> bool:
+        """
+        Enables deferred commits when events are buffered across batches.
+        """
+        if not self.buffering:
+            return False
+        self._commit_listener = listener
+        return True
 
     def handleJsonBatch(self, records: List[ChangeEvent]):
         """
@@ -56,8 +230,17 @@ class BaseIcebergChangeHandler(BasePythonChangeHandler):
                 table_events[destination] = []
             table_events[destination].append(record)
 
-        for destination, event_records in table_events.items():
-            self._handle_table_changes(destination, event_records)
+        if self.buffering:
+            self._buffer_changes(table_events)
+            return
+
+        if self._parallel_writes(len(table_events)):
+            tables = {destination: self._convert(event_records)
+                      for destination, event_records in table_events.items()}
+            self._raise_write_errors(self._write_tables_parallel(tables), len(tables))
+        else:
+            for destination, event_records in table_events.items():
+                self._handle_table_changes(destination, event_records)
 
         self.log.info(f"Consumed {len(records)} records")
 
@@ -65,14 +248,265 @@ class BaseIcebergChangeHandler(BasePythonChangeHandler):
     def _handle_table_changes(self, destination: str, records: List[ChangeEvent]):
         raise NotImplementedError
 
+    def _convert_records(self, records: List[ChangeEvent]) -> pa.Table:
+        """
+        Converts the events of a table to Arrow, required to buffer events across batches.
+        """
+        raise NotImplementedError
+
+    def _write_changes(self, destination: str, data: pa.Table):
+        """
+        Writes the converted events of a table, required to buffer events across batches.
+        """
+        raise NotImplementedError
+
+    def _convert(self, records: List[ChangeEvent]) -> pa.Table:
+        """
+        Converts the events with `_convert_records`, and reports the conversion time to the metrics sink.
+        """
+        start = time.perf_counter()
+        data = self._convert_records(records)
+        if self.metrics is not None:
+            self.metrics.observe(metrics.HANDLER_CONVERT_SECONDS, time.perf_counter() - start,
+                                 labels={"handler": type(self).__name__})
+        return data
+
+    def _write(self, destination: str, data: pa.Table):
+        """
+        Writes the converted events with `_write_changes`, and reports the write time and the records
+        to the metrics sink.
+        """
+        start = time.perf_counter()
+        self._write_changes(destination, data)
+        if self.metrics is not None:
+            labels = {"handler": type(self).__name__, "destination": destination}
+            self.metrics.observe(metrics.HANDLER_WRITE_SECONDS, time.perf_counter() - start, labels=labels)
+            self.metrics.increment(metrics.HANDLER_WRITTEN_RECORDS, data.num_rows, labels=labels)
+
+    def _parallel_writes(self, num_tables: int) -> bool:
+        return self.max_parallel_writes > 1 and num_tables > 1
+
+    def _write_tables_parallel(self, tables: Dict[str, pa.Table]) -> Dict[str, Exception]:
+        """
+        Writes the converted events of several tables concurrently, and waits for all writes.
+
+        Returns:
+            dict: The failed destinations and their errors, the other tables are written.
+        """
+        if self._write_executor is None:
+            self._write_executor = ThreadPoolExecutor(max_workers=self.max_parallel_writes,
+                                                      thread_name_prefix="pydbzengine-iceberg-write")
+        futures = {destination: self._write_executor.submit(self._write, destination, data)
+                   for destination, data in tables.items()}
+        errors = {}
+        for destination, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                errors[destination] = error
+        return errors
+
+    def _raise_write_errors(self, errors: Dict[str, Exception], num_tables: int):
+        if not errors:
+            return
+        for destination, error in errors.items():
+            self.log.error(f"Writing the events of {destination} failed: {error}")
+        raise RuntimeError(f"Writing {len(errors)} of {num_tables} tables failed: {', '.join(errors)}") \
+            from next(iter(errors.values()))
+
+    def _buffer_changes(self, table_events: Dict[str, List[ChangeEvent]]):
+        """
+        Adds the events of a batch to the table buffers, and writes the buffers reaching a threshold.
+        """
+        with self._buffer_lock:
+            if self._flush_error is not None:
+                raise RuntimeError("Writing the buffered events failed") from self._flush_error
+            for destination, event_records in table_events.items():
+                buffer = self._buffers.get(destination)
+                if buffer is None:
+                    buffer = self._buffers[destination] = _TableBuffer(first_batch=self._batches_received)
+                buffer.add(self._convert(event_records))
+            self._batches_received += 1
+            self._flush_buffers(lambda b: (0 < self.flush_max_rows <= b.num_rows)
+                                          or (0 < self.flush_max_bytes <= b.nbytes)
+                                          or self._expired(b))
+        if self.flush_max_age_sec > 0 and self._flush_thread is None:
+            self._flush_thread = threading.Thread(target=self._flush_expired_buffers, daemon=True,
+                                                  name="pydbzengine-iceberg-flush")
+            self._flush_thread.start()
+
+    def _expired(self, buffer: _TableBuffer) -> bool:
+        return 0 < self.flush_max_age_sec <= time.monotonic() - buffer.created_at
+
+    def _flush_buffers(self, should_flush: Callable[[_TableBuffer], bool]):
+        """
+        Writes the buffers matching the condition, then reports the batches whose events are all written
+        to the commit listener.
+        """
+        with self._buffer_lock:
+            destinations = [d for d, b in self._buffers.items() if should_flush(b)]
+            if self._parallel_writes(len(destinations)):
+                errors = self._write_tables_parallel(
+                    {d: self._concat_buffer(self._buffers[d]) for d in destinations})
+                for destination in destinations:
+                    if destination not in errors:
+                        self.log.info(f"Flushed {self._buffers.pop(destination).num_rows} buffered records "
+                                      f"of {destination}")
+                self._raise_write_errors(errors, len(destinations))
+            else:
+                for destination in destinations:
+                    buffer = self._buffers[destination]
+                    self._write(destination, self._concat_buffer(buffer))
+                    del self._buffers[destination]
+                    self.log.info(f"Flushed {buffer.num_rows} buffered records of {destination}")
+            durable = min((b.first_batch for b in self._buffers.values()), default=self._batches_received)
+            if durable > self._batches_durable:
+                self._batches_durable = durable
+                if self._commit_listener is not None:
+                    self._commit_listener(durable)
+
+    @staticmethod
+    def _concat_buffer(buffer: _TableBuffer) -> pa.Table:
+        # the batches of handlers deriving the schema from the events may have different columns
+        return pa.concat_tables(buffer.tables, promote_options="permissive")
+
+    def _flush_expired_buffers(self):
+        """
+        Background loop writing the buffers older than `flush_max_age_sec`.
+        """
+        interval = min(max(self.flush_max_age_sec / 4, 0.05), 1.0)
+        try:
+            while not self._closed.wait(interval):
+                self._flush_buffers(self._expired)
+        except Exception as e:
+            self.log.error(f"Writing the buffered events failed: {e}", exc_info=True)
+            self._flush_error = e
+        finally:
+            detach_thread()
+
+    def flush(self):
+        """
+        Writes all buffered events.
+        """
+        self._flush_buffers(lambda b: True)
+
+    def close(self):
+        """
+        Writes all buffered events and stops the background flush thread and the write thread pool.
+        """
+        self._closed.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        try:
+            if self.buffering:
+                self.flush()
+        finally:
+            if self._write_executor is not None:
+                self._write_executor.shutdown()
+                self._write_executor = None
+
     def get_table(self, destination: str) -> "Table":
-        # TODO keep table object in map to avoid calling catalog
+        """
+        Returns the table of the destination, from the table cache when possible.
+
+        Cached tables stay current after commits made by this handler, pyiceberg updates the table metadata
+        from the commit response. Tables changed by other writers are reloaded when a commit fails,
+        see `commit_with_retry`.
+        """
         table_identifier: tuple = self.destination_to_table_identifier(destination)
-        return self.load_table(table_identifier=table_identifier)
+        with self._table_cache_lock:
+            table = self._table_cache.get(table_identifier)
+            if table is not None:
+                self._table_cache.move_to_end(table_identifier)
+                return table
+        table = self.load_table(table_identifier=table_identifier)
+        if self.table_cache_size > 0:
+            with self._table_cache_lock:
+                self._table_cache[table_identifier] = table
+                while len(self._table_cache) > self.table_cache_size:
+                    self._table_cache.popitem(last=False)
+        return table
+
+    def invalidate_table(self, destination: str):
+        """
+        Removes the table of the destination from the table cache, the next `get_table` loads it from the catalog.
+        """
+        with self._table_cache_lock:
+            self._table_cache.pop(self.destination_to_table_identifier(destination), None)
+
+    def commit_with_retry(self, destination: str, commit: Callable[["Table"], None]):
+        """
+        Runs the commit function with the table of the destination. When the commit fails because the table was
+        changed concurrently, the cached table is invalidated and the commit is retried once with the reloaded table.
+        This includes the snapshot of the cached table being expired meanwhile (`ValidationException`, or
+        `FileNotFoundError` when its files were deleted), e.g. by
+        `pydbzengine.handlers.iceberg_maintenance.IcebergTableMaintenance`.
+
+        Args:
+            destination: Destination of the change events.
+            commit: Function writing to the table, e.g. `lambda table: table.append(data)`.
+        """
+        try:
+            commit(self.get_table(destination))
+        except (CommitFailedException, ValidationException, FileNotFoundError) as e:
+            self.log.warning(f"Commit to {destination} failed, reloading the table and retrying: {e}")
+            if self.metrics is not None:
+                self.metrics.increment(metrics.HANDLER_COMMIT_RETRIES,
+                                       labels={"handler": type(self).__name__, "destination": destination})
+            self.invalidate_table(destination)
+            commit(self.get_table(destination))
 
     def load_table(self, table_identifier):
         return self.catalog.load_table(identifier=table_identifier)
 
+    def table_options_for(self, table_identifier: tuple) -> IcebergTableOptions:
+        """
+        Returns the options of the table, from `destination_table_options` or the global `table_options`.
+        """
+        return self._destination_table_options.get(table_identifier, self.table_options)
+
+    def create_table(self, table_identifier: tuple) -> "Table":
+        """
+        Creates the table with the target schema, and the partition spec, sort order and properties
+        of its `IcebergTableOptions`.
+        """
+        options = self.table_options_for(table_identifier)
+        partition_spec = options.partition_spec(self._target_schema, default=self.DEBEZIUM_TABLE_PARTITION_SPEC)
+        sort_order = options.sort_order(self._target_schema)
+        table = self.catalog.create_table(identifier=table_identifier,
+                                          schema=self._target_schema,
+                                          partition_spec=partition_spec,
+                                          sort_order=sort_order,
+                                          properties=options.properties)
+        self.log.info(f"Created iceberg table {'.'.join(table_identifier)} with partitioning {table.spec()} "
+                      f"and sort order {table.sort_order()}.")
+        return table
+
+    @staticmethod
+    def sort_rows(table: "Table", data: pa.Table) -> pa.Table:
+        """
+        Sorts the rows by the sort order of the table, pyiceberg writes the rows in the given order. Only the
+        leading identity sort fields of top level columns are used, nulls are sorted last.
+        """
+        sort_order = table.sort_order()
+        if sort_order.is_unsorted or data.num_rows < 2:
+            return data
+        schema = table.schema()
+        keys, sort_keys = {}, []
+        for sort_field in sort_order.fields:
+            name = schema.find_column_name(sort_field.source_id)
+            if not isinstance(sort_field.transform, IdentityTransform) or name not in data.column_names:
+                break
+            column = data[name]
+            if isinstance(column.type, pa.BaseExtensionType):  # e.g. UUID, sorted by the storage bytes
+                column = pa.chunked_array([chunk.storage for chunk in column.chunks], type=column.type.storage_type)
+            keys[name] = column
+            sort_keys.append((name, "ascending" if sort_field.direction == SortDirection.ASC else "descending"))
+        if not sort_keys:
+            return data
+        indices = pc.sort_indices(pa.table(keys), sort_keys=sort_keys)
+        return data.take(indices)
+
     def destination_to_table_identifier(self, destination: str) -> tuple:
         table_name = destination.replace('.', '_').replace(' ', '_').replace('-', '_')
         return self.destination_namespace + (table_name,)
@@ -84,6 +518,26 @@ class IcebergChangeHandler(BaseIcebergChangeHandler):
     This class receives batches of Debezium ChangeEvent objects and applies the changes
     to the corresponding Iceberg tables.
     """
+    def __init__(self, catalog: "Catalog", destination_namespace: tuple, supports_variant: bool = False,
+                 table_cache_size: int = 128, vectorized: bool = True, flush_max_rows: int = 0,
+                 flush_max_bytes: int = 0, flush_max_age_sec: float = 0, max_parallel_writes: int = 1,
+                 table_options: Optional[IcebergTableOptions] = None,
+                 destination_table_options: Optional[Dict[str, IcebergTableOptions]] = None):
+        """
+        Initializes the IcebergChangeHandler.
+
+        Args:
+            vectorized: Build the Arrow columns of a batch directly from the raw event values, the `source`,
+                `before` and `after` documents are stored as they are received, without parsing and serializing
+                them again. When False every event is converted with `_transform_event_to_row_dict`.
+            See `BaseIcebergChangeHandler` for the other arguments.
+        """
+        super().__init__(catalog=catalog, destination_namespace=destination_namespace,
+                         supports_variant=supports_variant, table_cache_size=table_cache_size,
+                         flush_max_rows=flush_max_rows, flush_max_bytes=flush_max_bytes,
+                         flush_max_age_sec=flush_max_age_sec, max_parallel_writes=max_parallel_writes,
+                         table_options=table_options, destination_table_options=destination_table_options)
+        self.vectorized = vectorized
 
     def _handle_table_changes(self, destination: str, records: List[ChangeEvent]):
         """
@@ -92,22 +546,53 @@ class IcebergChangeHandler(BaseIcebergChangeHandler):
             destination: The name of the table to apply the changes to.
             records: A list of ChangeEvent objects for the specified table.
         """
-        table = self.get_table(destination)
+        self._write(destination, self._convert(records))
+
+    def _write_changes(self, destination: str, data: pa.Table):
+        """
+        Appends the converted events to the table of the destination.
+        """
+        if data.num_rows:
+            self.commit_with_retry(destination, lambda table: table.append(self.sort_rows(table, data)))
+            self.log.info(f"Appended {data.num_rows} records to table "
+                          f"{'.'.join(self.destination_to_table_identifier(destination))}")
+
+    def _convert_records(self, records: List[ChangeEvent]) -> pa.Table:
+        """
+        Converts the events to an Arrow table of the target schema.
+        """
         consumed_at = datetime.datetime.now(datetime.timezone.utc)
+        if self.vectorized:
+            return self._records_to_arrow_table(records=records, consumed_at=consumed_at)
         arrow_data = []
         for record in records:
             # Create a dictionary matching the schema
             avro_record = self._transform_event_to_row_dict(record=record, consumed_at=consumed_at)
             arrow_data.append(avro_record)
+        return pa.Table.from_pylist(mapping=arrow_data, schema=self._target_arrow_schema)
 
-        if arrow_data:
-            pa_table = pa.Table.from_pylist(mapping=arrow_data, schema=self._target_schema.as_arrow())
-            table.append(pa_table)
-            self.log.info(f"Appended {len(arrow_data)} records to table {'.'.join(table.name())}")
+    def _records_to_arrow_table(self, records: List[ChangeEvent], consumed_at: datetime) -> pa.Table:
+        """
+        Converts the events to an Arrow table of the target schema, column by column.
+        """
+        keys = decode_payloads([to_payload(record.key()) for record in records])
+        values = decode_payloads([to_payload(record.value()) for record in records])
+        columns = envelope_columns(pa.array(values, type=pa.string()))
+        columns["_dbz_event_key"] = pa.array(keys, type=pa.string())
+        columns["_consumed_at"] = pa.array([consumed_at] * len(records), type=pa.timestamp("us"))
+
+        schema = self._target_arrow_schema
+        arrays = []
+        for field in schema:
+            if field.name == "_dbz_event_key_hash":
+                arrays.append(uuid5_array(keys, type=field.type))
+            else:
+                arrays.append(columns[field.name].cast(field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
 
     def _transform_event_to_row_dict(self, record: ChangeEvent, consumed_at: datetime) -> dict:
         # Parse the JSON payload
-        payload = json.loads(record.value())
+        payload = json.loads(to_payload(record.value()))
 
         # Extract relevant fields based on schema
         op = payload.get("op")
@@ -117,7 +602,9 @@ class IcebergChangeHandler(BaseIcebergChangeHandler):
         source = payload.get("source")
         before = payload.get("before")
         after = payload.get("after")
-        dbz_event_key = record.key()  # its string by default
+        dbz_event_key = to_payload(record.key())  # its string by default, bytes with the JSON_BYTE_ARRAY format
+        if isinstance(dbz_event_key, bytes):
+            dbz_event_key = dbz_event_key.decode("utf-8")
         dbz_event_key_hash = uuid.uuid5(uuid.NAMESPACE_DNS, dbz_event_key) if dbz_event_key else None
 
         return {
@@ -129,7 +616,7 @@ class IcebergChangeHandler(BaseIcebergChangeHandler):
             "before": json.dumps(before) if before is not None else None,
             "after": json.dumps(after) if after is not None else None,
             "_dbz_event_key": dbz_event_key,
-            "_dbz_event_key_hash": dbz_event_key_hash.bytes,
+            "_dbz_event_key_hash": dbz_event_key_hash.bytes if dbz_event_key_hash else None,
             "_consumed_at": consumed_at,
         }
 
@@ -138,15 +625,16 @@ class IcebergChangeHandler(BaseIcebergChangeHandler):
             return super().load_table(table_identifier=table_identifier)
         except NoSuchTableError:
             self.log.warning(f"Iceberg table {'.'.join(table_identifier)} not found, creating it.")
-            table = self.catalog.create_table(identifier=table_identifier,
-                                              schema=self._target_schema,
-                                              partition_spec=self.DEBEZIUM_TABLE_PARTITION_SPEC)
-            self.log.info(f"Created iceberg table {'.'.join(table_identifier)} with daily partitioning on _consumed_at.")
-            return table
+            return self.create_table(table_identifier)
 
-    @property
+    @cached_property
+    def _target_arrow_schema(self) -> pa.Schema:
+        return self._target_schema.as_arrow()
+
+    @cached_property
     def _target_schema(self) -> Schema:
-        # @TODO according to self.supports_variant we can return different schemas!
+        # the documents are stored as JSON strings with or without `supports_variant`, until pyiceberg supports the
+        # Variant type
         return Schema(
             NestedField(field_id=1, name="op", field_type=StringType(), required=True,
                         doc="The operation type: c, u, d, r"),
@@ -200,3 +688,223 @@ class IcebergChangeHandler(BaseIcebergChangeHandler):
             ),
         )
 
+
+class IcebergUpsertChangeHandler(IcebergChangeHandler):
+    """
+    A change handler maintaining current-state Iceberg tables, with one row per Debezium event key.
+
+    The changes of a batch are collapsed per key, the last change wins, ordered by the event timestamp
+    (`ts_ns`, `ts_us` or `ts_ms`) and then by the position in the batch. The rows of all keys changed in the batch
+    are replaced with a single overwrite filtered on the key, and keys whose last change is a delete are removed.
+    The filter uses `_dbz_event_key`, which maps one to one to `_dbz_event_key_hash`, because pyarrow can't
+    evaluate filters on UUID columns when the data files are rewritten. Events without key (tables without primary key) can't be merged and are appended,
+    tombstones are ignored. When none of the changed keys exists in the table yet, pyiceberg warns that the delete
+    operation of the overwrite didn't match any records, the warning is harmless.
+
+    The tables have the same schema as the tables of `IcebergChangeHandler`, the row state is in `after`.
+    """
+
+    def _write_changes(self, destination: str, changes: pa.Table):
+        """
+        Applies the converted changes to the current-state table of the destination.
+        """
+        upserts, changed_keys = self._collapse_changes(changes)
+        if not changed_keys:
+            if upserts.num_rows:
+                self.commit_with_retry(destination, lambda table: table.append(self.sort_rows(table, upserts)))
+            return
+
+        overwrite_filter = In("_dbz_event_key", changed_keys)
+        self.commit_with_retry(destination, lambda table: table.overwrite(self.sort_rows(table, upserts),
+                                                                          overwrite_filter=overwrite_filter))
+        self.log.info(f"Upserted {upserts.num_rows} rows and deleted "
+                      f"{len(changed_keys) - pc.count(upserts['_dbz_event_key']).as_py()} keys in table "
+                      f"{'.'.join(self.destination_to_table_identifier(destination))}")
+
+    @staticmethod
+    def _collapse_changes(changes: pa.Table) -> Tuple[pa.Table, Set[str]]:
+        """
+        Collapses the changes per key.
+
+        Returns:
+            tuple: The rows to write (the last change of each key if it's not a delete, and the events without key),
+                and all changed keys.
+        """
+        # tombstones have no operation
+        changes = changes.filter(pc.is_valid(changes["op"]))
+        keyed = changes.filter(pc.is_valid(changes["_dbz_event_key_hash"]))
+        unkeyed = changes.filter(pc.is_null(changes["_dbz_event_key_hash"]))
+        if keyed.num_rows == 0:
+            return unkeyed, set()
+
+        event_ts = pc.coalesce(keyed["ts_ns"], pc.multiply(keyed["ts_us"], 1000),
+                               pc.multiply(keyed["ts_ms"], 1000000), pa.scalar(0, pa.int64()))
+        ordered = keyed.append_column("__event_ts", event_ts) \
+            .append_column("__position", pa.array(range(keyed.num_rows), type=pa.int64())) \
+            .sort_by([("__event_ts", "ascending"), ("__position", "ascending")])
+        ordered = ordered.append_column("__rank", pa.array(range(ordered.num_rows), type=pa.int64()))
+        last = ordered.group_by("_dbz_event_key").aggregate([("__rank", "max")])["__rank_max"]
+        latest = ordered.take(last).select(changes.column_names)
+
+        changed_keys = set(latest["_dbz_event_key"].to_pylist())
+        upserts = latest.filter(pc.not_equal(latest["op"], "d"))
+        return pa.concat_tables([upserts, unkeyed]), changed_keys
+
+
+class IcebergTypedChangeHandler(BaseIcebergChangeHandler):
+    """
+    A change handler appending Debezium change events to Iceberg tables with typed row columns.
+
+    The `before` and `after` row states are written as struct columns with the types of the source table columns,
+    instead of JSON strings, so queries read single columns with column pruning and file skipping on the column
+    statistics. The types are read from the Kafka Connect schema embedded in every event, which requires
+    `converter.schemas.enable=true`; semantic types (e.g. Decimal, MicroTimestamp, Date) are mapped to the matching
+    Iceberg types, see `pydbzengine.handlers.connect_schema`.
+
+    The other columns are the same as in `IcebergChangeHandler`. Tables are created with the columns of the first
+    batch, and columns added to a source table are added to the Iceberg table before the events using them are
+    written. Mapped schemas are cached by the schema text of the events. Tombstones are skipped.
+    """
+
+    def __init__(self, catalog: "Catalog", destination_namespace: tuple, supports_variant: bool = False,
+                 table_cache_size: int = 128, flush_max_rows: int = 0, flush_max_bytes: int = 0,
+                 flush_max_age_sec: float = 0, max_parallel_writes: int = 1,
+                 table_options: Optional[IcebergTableOptions] = None,
+                 destination_table_options: Optional[Dict[str, IcebergTableOptions]] = None):
+        """
+        Initializes the IcebergTypedChangeHandler, see `BaseIcebergChangeHandler` for the arguments.
+        """
+        super().__init__(catalog=catalog, destination_namespace=destination_namespace,
+                         supports_variant=supports_variant, table_cache_size=table_cache_size,
+                         flush_max_rows=flush_max_rows, flush_max_bytes=flush_max_bytes,
+                         flush_max_age_sec=flush_max_age_sec, max_parallel_writes=max_parallel_writes,
+                         table_options=table_options, destination_table_options=destination_table_options)
+        self._row_schemas: Dict[str, Tuple[pa.Schema, Optional[Callable]]] = {}
+        self._table_schemas: Dict[str, pa.Schema] = {}  # last schema merged into the table of each destination
+
+    def _handle_table_changes(self, destination: str, records: List[ChangeEvent]):
+        self._write(destination, self._convert(records))
+
+    def _write_changes(self, destination: str, data: pa.Table):
+        """
+        Adds the new columns of the converted events to the table of the destination, and appends the events.
+        """
+        if not data.num_rows:
+            return
+        self._evolve_schema(destination, data.schema)
+        self.commit_with_retry(destination, lambda table: table.append(self.sort_rows(table, data)))
+        self.log.info(f"Appended {data.num_rows} records to table "
+                      f"{'.'.join(self.destination_to_table_identifier(destination))}")
+
+    def _evolve_schema(self, destination: str, schema: pa.Schema):
+        """
+        Merges the schema into the table schema by name, adding the missing columns and promoting types.
+        """
+        if self._table_schemas.get(destination) == schema:
+            return
+        table = self.get_table(destination)
+        with table.update_schema() as update:
+            update.union_by_name(schema)
+        self._table_schemas[destination] = schema
+
+    def invalidate_table(self, destination: str):
+        super().invalidate_table(destination)
+        self._table_schemas.pop(destination, None)
+
+    def _convert_records(self, records: List[ChangeEvent]) -> pa.Table:
+        """
+        Converts the events to an Arrow table, events with different schemas are merged into one table.
+        """
+        consumed_at = datetime.datetime.now(datetime.timezone.utc)
+        rows_by_schema: Dict[str, list] = {}
+        for record in records:
+            value = to_payload(record.value())
+            if value is None:
+                continue
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+            event = json.loads(value)
+            if not isinstance(event, dict) or event.get("schema") is None or "payload" not in event:
+                raise ValueError(f"{self.__class__.__name__} requires the schema in the events, "
+                                 f"set converter.schemas.enable=true")
+            schema_key = self._schema_key(value, event["schema"])
+            _, convert_row = self._row_schema(schema_key, event["schema"])
+            payload = event["payload"]
+            before, after = payload.get("before"), payload.get("after")
+            dbz_event_key = to_payload(record.key())
+            if isinstance(dbz_event_key, bytes):
+                dbz_event_key = dbz_event_key.decode("utf-8")
+            rows_by_schema.setdefault(schema_key, []).append({
+                "op": payload.get("op"),
+                "ts_ms": payload.get("ts_ms"),
+                "ts_us": payload.get("ts_us"),
+                "ts_ns": payload.get("ts_ns"),
+                "source": json.dumps(payload.get("source")),
+                "before": convert_row(before) if convert_row and before is not None else before,
+                "after": convert_row(after) if convert_row and after is not None else after,
+                "_dbz_event_key": dbz_event_key,
+                "_dbz_event_key_hash": uuid.uuid5(uuid.NAMESPACE_DNS, dbz_event_key).bytes if dbz_event_key else None,
+                "_consumed_at": consumed_at,
+            })
+
+        tables = [pa.Table.from_pylist(rows, schema=self._row_schemas[schema_key][0])
+                  for schema_key, rows in rows_by_schema.items()]
+        if not tables:
+            return self._target_arrow_schema.empty_table()
+        return pa.concat_tables(tables, promote_options="permissive")
+
+    @staticmethod
+    def _schema_key(value: str, schema: dict) -> str:
+        """
+        Returns the cache key of the event schema. The JSON converter writes the schema before the payload,
+        its text identifies the schema without serializing it again.
+        """
+        end = value.find(',"payload":') if value.startswith('{"schema":') else -1
+        return value[:end] if end > 0 else json.dumps(schema, sort_keys=True)
+
+    def _row_schema(self, schema_key: str, envelope_schema: dict) -> Tuple[pa.Schema, Optional[Callable]]:
+        """
+        Returns the Arrow schema of the events with the envelope schema, and the function converting their
+        row states, None if the row states are used as they are.
+        """
+        cached = self._row_schemas.get(schema_key)
+        if cached is not None:
+            return cached
+        row_schema = envelope_field_schema(envelope_schema, "after") or envelope_field_schema(envelope_schema, "before")
+        if row_schema is None:
+            raise ValueError(f"The event schema {envelope_schema.get('name')} has no before or after field")
+        last_field_id = self._target_schema.highest_field_id
+        field_ids = itertools.count(last_field_id + 3)
+        schema = Schema(
+            *self._target_schema.fields,
+            NestedField(field_id=last_field_id + 1, name="before",
+                        field_type=iceberg_type(row_schema, field_ids), required=False,
+                        doc="Row state before the change"),
+            NestedField(field_id=last_field_id + 2, name="after",
+                        field_type=iceberg_type(row_schema, field_ids), required=False,
+                        doc="Row state after the change"),
+        )
+        # without field ids, the ids of the table are assigned by name when the data is written
+        arrow_schema = schema_to_pyarrow(schema, include_field_ids=False)
+        cached = self._row_schemas[schema_key] = (arrow_schema, value_converter(row_schema))
+        return cached
+
+    def load_table(self, table_identifier):
+        try:
+            return super().load_table(table_identifier=table_identifier)
+        except NoSuchTableError:
+            self.log.warning(f"Iceberg table {'.'.join(table_identifier)} not found, creating it, "
+                             f"the row columns are added with the first events.")
+            return self.create_table(table_identifier)
+
+    @cached_property
+    def _target_arrow_schema(self) -> pa.Schema:
+        return schema_to_pyarrow(self._target_schema, include_field_ids=False)
+
+    @cached_property
+    def _target_schema(self) -> Schema:
+        """
+        The columns of `IcebergChangeHandler` without `before` and `after`, which are added from the event schemas.
+        """
+        changelog_schema: Schema = IcebergChangeHandler._target_schema.func(self)
+        return Schema(*[field for field in changelog_schema.fields if field.name not in ("before", "after")])
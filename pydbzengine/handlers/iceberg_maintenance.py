@@ -0,0 +1,305 @@
+"""
+Maintenance of the Iceberg tables written by the Iceberg handlers.
+
+Every batch appends a snapshot with small data files and a new manifest, so scan planning of busy tables gets slower
+over time. `IcebergTableMaintenance` periodically:
+
+* compacts the small data files of each partition (e.g. a `_consumed_at` day) into files of the target size,
+* merges the manifests of the current snapshot when there are too many of them,
+* expires old snapshots and deletes the files referenced only by them.
+
+Commits use the optimistic concurrency of Iceberg, the maintenance runs next to the ingestion without blocking it.
+A maintenance commit conflicting with an ingestion commit fails and is done again at the next run, the handlers
+reload the table and retry their commit (see `BaseIcebergChangeHandler.commit_with_retry`).
+
+It runs in a background thread (`start`) or as a standalone process:
+
+    pydbzengine-iceberg-maintenance --catalog default --namespace iceberg.debezium_cdc_data --interval-sec 3600
+"""
+import argparse
+import datetime
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+import pyiceberg
+from pyiceberg.catalog import Catalog, load_catalog
+from pyiceberg.expressions import AlwaysTrue
+from pyiceberg.table import Table, TableProperties
+
+# pyiceberg has no public API to rewrite selected data files, these internals are used by its own `delete` and may
+# change between versions, `compact` fails when they are missing
+try:
+    from pyiceberg.io.pyarrow import ArrowScan, _dataframe_to_data_files
+except ImportError:
+    ArrowScan = _dataframe_to_data_files = None
+
+LOGGER_NAME = "pydbzengine.iceberg.IcebergTableMaintenance"
+SNAPSHOT_PROPERTY = "pydbzengine.maintenance"
+
+
+@dataclass
+class MaintenanceResult:
+    """
+    Summary of the maintenance of a table.
+    """
+    table: str
+    compacted_partitions: int = 0
+    rewritten_files: int = 0
+    added_files: int = 0
+    manifests_before: int = 0
+    manifests_after: int = 0
+    expired_snapshots: int = 0
+    deleted_files: int = 0
+    error: Optional[str] = None
+
+
+class IcebergTableMaintenance:
+    """
+    Compacts data files, merges manifests and expires snapshots of the tables of a namespace.
+    """
+
+    def __init__(self, catalog: Catalog, namespace: tuple, tables: Optional[List[str]] = None,
+                 target_file_size_bytes: int = 128 * 1024 * 1024, min_file_size_bytes: Optional[int] = None,
+                 min_input_files: int = 5, max_manifests: int = 100,
+                 snapshot_max_age: datetime.timedelta = datetime.timedelta(days=5), min_snapshots_to_keep: int = 1,
+                 delete_expired_files: bool = True):
+        """
+        Args:
+            catalog: Iceberg catalog of the tables.
+            namespace: Namespace of the tables, e.g. the `destination_namespace` of the handler.
+            tables: Names of the tables to maintain, by default all tables of the namespace.
+            target_file_size_bytes: Size of the compacted data files.
+            min_file_size_bytes: Data files smaller than this are compacted, by default 75% of the target size.
+            min_input_files: Minimum number of small files of a partition to compact it.
+            max_manifests: Merge the manifests of the current snapshot when it has more manifests.
+            snapshot_max_age: Expire snapshots older than this. The current snapshot is never expired.
+            min_snapshots_to_keep: Number of most recent snapshots kept regardless of their age.
+            delete_expired_files: Delete the data files, manifests and manifest lists referenced only by the
+                expired snapshots.
+        """
+        if target_file_size_bytes <= 0:
+            raise ValueError("target_file_size_bytes must be positive!")
+        if min_input_files < 2:
+            raise ValueError("min_input_files must be at least 2!")
+        if min_snapshots_to_keep < 1:
+            raise ValueError("min_snapshots_to_keep must be at least 1!")
+        self.log = logging.getLogger(LOGGER_NAME)
+        self.catalog = catalog
+        self.namespace = namespace
+        self.tables = tables
+        self.target_file_size_bytes = target_file_size_bytes
+        self.min_file_size_bytes = (min_file_size_bytes if min_file_size_bytes is not None
+                                    else int(target_file_size_bytes * 0.75))
+        self.min_input_files = min_input_files
+        self.max_manifests = max_manifests
+        self.snapshot_max_age = snapshot_max_age
+        self.min_snapshots_to_keep = min_snapshots_to_keep
+        self.delete_expired_files = delete_expired_files
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def table_identifiers(self) -> List[tuple]:
+        if self.tables is not None:
+            return [self.namespace + (table,) for table in self.tables]
+        return [tuple(identifier) for identifier in self.catalog.list_tables(self.namespace)]
+
+    def compact(self, table: Table, result: MaintenanceResult):
+        """
+        Rewrites the small data files of the partitions with at least `min_input_files` small files into files of
+        the target size, in a single commit.
+        """
+        if ArrowScan is None or _dataframe_to_data_files is None:
+            raise RuntimeError(f"Compaction isn't supported with pyiceberg {pyiceberg.__version__}, it uses the "
+                               f"pyiceberg.io.pyarrow internals ArrowScan and _dataframe_to_data_files, "
+                               f"install a pyiceberg version from 0.10 to 0.12")
+        small_files: Dict[tuple, list] = {}
+        for task in table.scan().plan_files():
+            if task.file.file_size_in_bytes < self.min_file_size_bytes and not task.delete_files:
+                small_files.setdefault((task.file.spec_id, tuple(task.file.partition)), []).append(task)
+        partitions = [tasks for tasks in small_files.values() if len(tasks) >= self.min_input_files]
+        if not partitions:
+            return
+
+        metadata = table.metadata.model_copy(update={"properties": {
+            **table.metadata.properties,
+            TableProperties.WRITE_TARGET_FILE_SIZE_BYTES: str(self.target_file_size_bytes),
+        }})
+        commit_uuid = uuid.uuid4()
+        added_files, rewritten_files = [], []
+        for tasks in partitions:
+            data = ArrowScan(table_metadata=table.metadata, io=table.io, projected_schema=table.schema(),
+                             row_filter=AlwaysTrue()).to_table(tasks=tasks)
+            added_files.extend(_dataframe_to_data_files(table_metadata=metadata, df=data, io=table.io,
+                                                        write_uuid=commit_uuid))
+            rewritten_files.extend(task.file for task in tasks)
+
+        with table.transaction() as transaction:
+            with transaction.update_snapshot(snapshot_properties={SNAPSHOT_PROPERTY: "compaction"}).overwrite() \
+                    as overwrite:
+                overwrite.commit_uuid = commit_uuid
+                for data_file in rewritten_files:
+                    overwrite.delete_data_file(data_file)
+                for data_file in added_files:
+                    overwrite.append_data_file(data_file)
+        result.compacted_partitions = len(partitions)
+        result.rewritten_files = len(rewritten_files)
+        result.added_files = len(added_files)
+
+    def merge_manifests(self, table: Table, result: MaintenanceResult):
+        """
+        Merges the manifests of the current snapshot when it has more than `max_manifests`.
+        """
+        snapshot = table.current_snapshot()
+        if snapshot is None:
+            return
+        result.manifests_before = result.manifests_after = len(snapshot.manifests(table.io))
+        if result.manifests_before <= self.max_manifests:
+            return
+        # merge all manifests smaller than the target size, the table properties are restored in the same commit
+        merge_properties = {TableProperties.MANIFEST_MERGE_ENABLED: "true", TableProperties.MANIFEST_MIN_MERGE_COUNT: "2"}
+        previous = {name: table.metadata.properties.get(name) for name in merge_properties}
+        with table.transaction() as transaction:
+            transaction.set_properties(merge_properties)
+            with transaction.update_snapshot(snapshot_properties={SNAPSHOT_PROPERTY: "merge-manifests"}) \
+                    .merge_append():
+                pass  # a merge append without new files only rewrites the manifests
+            if any(value is None for value in previous.values()):
+                transaction.remove_properties(*[name for name, value in previous.items() if value is None])
+            if any(value is not None for value in previous.values()):
+                transaction.set_properties({name: value for name, value in previous.items() if value is not None})
+        result.manifests_after = len(table.current_snapshot().manifests(table.io))
+
+    def expire_snapshots(self, table: Table, result: MaintenanceResult):
+        """
+        Expires the snapshots older than `snapshot_max_age`, except the `min_snapshots_to_keep` most recent
+        snapshots and the snapshots of branches and tags.
+        """
+        cutoff_ms = (time.time() - self.snapshot_max_age.total_seconds()) * 1000
+        snapshots = sorted(table.metadata.snapshots, key=lambda s: s.timestamp_ms, reverse=True)
+        kept = {s.snapshot_id for s in snapshots[:self.min_snapshots_to_keep]}
+        kept.update(ref.snapshot_id for ref in table.metadata.refs.values())
+        expired = [s for s in snapshots if s.timestamp_ms < cutoff_ms and s.snapshot_id not in kept]
+        if not expired:
+            return
+        candidates = self._referenced_files(table, expired, live_only=False) if self.delete_expired_files else set()
+        table.maintenance.expire_snapshots().by_ids([s.snapshot_id for s in expired]).commit()
+        result.expired_snapshots = len(expired)
+        if candidates:
+            for path in candidates - self._referenced_files(table, table.metadata.snapshots, live_only=True):
+                table.io.delete(path)
+                result.deleted_files += 1
+
+    @staticmethod
+    def _referenced_files(table: Table, snapshots, live_only: bool) -> Set[str]:
+        """
+        Returns the manifest lists, manifests and data files referenced by the snapshots. With `live_only` the
+        files removed by a snapshot are not included.
+        """
+        paths: Set[str] = set()
+        manifests = {}
+        for snapshot in snapshots:
+            paths.add(snapshot.manifest_list)
+            for manifest in snapshot.manifests(table.io):
+                manifests[manifest.manifest_path] = manifest
+        paths.update(manifests)
+        for manifest in manifests.values():
+            for entry in manifest.fetch_manifest_entry(table.io, discard_deleted=live_only):
+                paths.add(entry.data_file.file_path)
+        return paths
+
+    def maintain_table(self, table_identifier: tuple) -> MaintenanceResult:
+        """
+        Runs all maintenance tasks on a table. Errors are logged and returned in the result.
+        """
+        result = MaintenanceResult(table=".".join(table_identifier))
+        try:
+            table = self.catalog.load_table(table_identifier)
+            self.compact(table, result)
+            self.merge_manifests(table, result)
+            self.expire_snapshots(table, result)
+            self.log.info(f"Maintained table {result.table}: {result}")
+        except Exception as e:
+            self.log.error(f"Maintenance of table {result.table} failed, retrying at the next run: {e}",
+                           exc_info=True)
+            result.error = str(e)
+        return result
+
+    def run_once(self) -> List[MaintenanceResult]:
+        """
+        Maintains all tables one after another.
+        """
+        return [self.maintain_table(identifier) for identifier in self.table_identifiers()
+                if not self._stopped.is_set()]
+
+    def start(self, interval_sec: float):
+        """
+        Runs the maintenance in a background thread, first immediately then every `interval_sec` seconds.
+        """
+        if self._thread is not None:
+            raise RuntimeError("The maintenance is already running!")
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run_periodically, args=(interval_sec,), daemon=True,
+                                        name="pydbzengine-iceberg-maintenance")
+        self._thread.start()
+
+    def _run_periodically(self, interval_sec: float):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.log.error(f"Iceberg table maintenance failed: {e}", exc_info=True)
+            self._stopped.wait(interval_sec)
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stops the background thread after the table being maintained is finished.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacts data files, merges manifests and expires snapshots of "
+                                                 "the Iceberg tables written by pydbzengine.")
+    parser.add_argument("--catalog", default="default", help="Catalog name, configured in .pyiceberg.yaml or with "
+                                                             "PYICEBERG_CATALOG__* environment variables.")
+    parser.add_argument("--property", action="append", default=[], metavar="KEY=VALUE",
+                        help="Catalog property, e.g. uri=http://localhost:8181, repeatable.")
+    parser.add_argument("--namespace", required=True, help="Namespace of the tables, e.g. iceberg.debezium_cdc_data.")
+    parser.add_argument("--table", action="append", dest="tables", help="Table name, repeatable, default all.")
+    parser.add_argument("--interval-sec", type=float, default=0, help="Run every N seconds, default 0 runs once.")
+    parser.add_argument("--target-file-size-mb", type=int, default=128)
+    parser.add_argument("--min-input-files", type=int, default=5)
+    parser.add_argument("--max-manifests", type=int, default=100)
+    parser.add_argument("--snapshot-max-age-hours", type=float, default=120)
+    parser.add_argument("--min-snapshots-to-keep", type=int, default=1)
+    parser.add_argument("--keep-expired-files", action="store_true",
+                        help="Don't delete the files referenced only by expired snapshots.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    catalog = load_catalog(args.catalog, **dict(p.split("=", 1) for p in args.property))
+    maintenance = IcebergTableMaintenance(
+        catalog=catalog, namespace=tuple(args.namespace.split(".")), tables=args.tables,
+        target_file_size_bytes=args.target_file_size_mb * 1024 * 1024, min_input_files=args.min_input_files,
+        max_manifests=args.max_manifests, snapshot_max_age=datetime.timedelta(hours=args.snapshot_max_age_hours),
+        min_snapshots_to_keep=args.min_snapshots_to_keep, delete_expired_files=not args.keep_expired_files)
+    if args.interval_sec <= 0:
+        results = maintenance.run_once()
+        raise SystemExit(1 if any(r.error for r in results) else 0)
+    try:
+        while True:
+            maintenance.run_once()
+            time.sleep(args.interval_sec)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+import zstandard
+
+from pydbzengine import ChangeEvent, BasePythonChangeHandler, to_payload
+from pydbzengine.metrics import MetricsSink
+
+FILE_MAGIC = b"PYDBZREC\x01"
+# compressed size and number of records of a frame, followed by the zstd compressed records
+FRAME_HEADER = struct.Struct("<II")
+# flags, partition, key, value and destination lengths, followed by the key, value and destination
+RECORD_HEADER = struct.Struct("<BiIIH")
+_KEY = 1
+_KEY_BYTES = 2
+_VALUE = 4
+_VALUE_BYTES = 8
+_PARTITION = 16
+
+LOGGER_NAME = "pydbzengine.recording"
+
+
+class RecordedChangeEvent(ChangeEvent):
+    """
+    Change event read from a recording, see `read_batches`.
+    """
+    __slots__ = ("_key", "_value", "_destination", "_partition")
+
+    def __init__(self, key: Union[str, bytes, None], value: Union[str, bytes, None], destination: str,
+                 partition: Optional[int] = None):
+        self._key = key
+        self._value = value
+        self._destination = destination
+        self._partition = partition
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def destination(self):
+        return self._destination
+
+    def partition(self):
+        return self._partition
+
+
+def _encode_payload(payload: Union[str, bytes, None], present: int, binary: int):
+    if payload is None:
+        return 0, b""
+    if isinstance(payload, str):
+        return present, payload.encode("utf-8")
+    return present | binary, payload
+
+
+def encode_records(records: List[ChangeEvent]) -> bytes:
+    """
+    Serializes the key, value, destination and partition of the records, str and bytes payloads keep their type.
+    """
+    parts = []
+    for record in records:
+        key_flags, key = _encode_payload(to_payload(record.key()), _KEY, _KEY_BYTES)
+        value_flags, value = _encode_payload(to_payload(record.value()), _VALUE, _VALUE_BYTES)
+        destination = record.destination().encode("utf-8")
+        partition = record.partition()
+        flags = key_flags | value_flags | (_PARTITION if partition is not None else 0)
+        parts.append(RECORD_HEADER.pack(flags, int(partition) if partition is not None else 0,
+                                        len(key), len(value), len(destination)))
+        parts.append(key)
+        parts.append(value)
+        parts.append(destination)
+    return b"".join(parts)
+
+
+def decode_records(data: bytes, num_records: int) -> List[RecordedChangeEvent]:
+    """
+    Reverse of `encode_records`.
+    """
+    records = []
+    view = memoryview(data)
+    offset = 0
+    for _ in range(num_records):
+        flags, partition, key_len, value_len, destination_len = RECORD_HEADER.unpack_from(view, offset)
+        offset += RECORD_HEADER.size
+        key = value = None
+        if flags & _KEY:
+            key = bytes(view[offset:offset + key_len])
+            if not flags & _KEY_BYTES:
+                key = key.decode("utf-8")
+        offset += key_len
+        if flags & _VALUE:
+            value = bytes(view[offset:offset + value_len])
+            if not flags & _VALUE_BYTES:
+                value = value.decode("utf-8")
+        offset += value_len
+        destination = str(view[offset:offset + destination_len], "utf-8")
+        offset += destination_len
+        records.append(RecordedChangeEvent(key, value, destination, partition if flags & _PARTITION else None))
+    return records
+
+
+def _valid_length(path: Path) -> int:
+    """
+    Returns the length of the complete frames of the recording, a write interrupted by a crash leaves a partial
+    frame at the end.
+    """
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a change event recording")
+        offset = len(FILE_MAGIC)
+        while offset + FRAME_HEADER.size <= size:
+            f.seek(offset)
+            compressed_size, _ = FRAME_HEADER.unpack(f.read(FRAME_HEADER.size))
+            if offset + FRAME_HEADER.size + compressed_size > size:
+                break
+            offset += FRAME_HEADER.size + compressed_size
+    return offset
+
+
+class RecordingChangeHandler(BasePythonChangeHandler):
+    """
+    Handler wrapper writing every batch it receives to an append-only recording file before passing it to the
+    wrapped handler. Each batch is one frame, the records are compressed with zstd. See `replay` to feed the
+    recording to a handler.
+
+    The batch is recorded before the wrapped handler runs: batches failing in the handler are recorded, and
+    batches delivered again by the engine after a failure are recorded again.
+    """
+
+    def __init__(self, path: Union[str, Path], handler: Optional[BasePythonChangeHandler] = None,
+                 compression_level: int = 3, fsync: bool = False):
+        """
+        Initializes the RecordingChangeHandler.
+
+        Args:
+            path: Recording file, created if it doesn't exist, appended to otherwise. A partial frame left at the
+                end of the file by a crash is truncated.
+            handler: Handler receiving the batches after they are recorded, None only records them.
+            compression_level: zstd compression level.
+            fsync: Sync the file to disk after each batch, by default it is only flushed to the OS.
+        """
+        self.log = logging.getLogger(LOGGER_NAME)
+        self.path = Path(path)
+        self.handler = handler
+        self.fsync = fsync
+        self._compressor = zstandard.ZstdCompressor(level=compression_level, write_checksum=True)
+        self.recorded_batches = 0
+        self.recorded_records = 0
+        if self.path.exists() and self.path.stat().st_size > 0:
+            valid_length = _valid_length(self.path)
+            if valid_length < self.path.stat().st_size:
+                self.log.warning(f"Truncating the partial frame at the end of {self.path} at {valid_length} bytes")
+                os.truncate(self.path, valid_length)
+            self._file = self.path.open("ab")
+        else:
+            self._file = self.path.open("wb")
+            self._file.write(FILE_MAGIC)
+            self._file.flush()
+
+    def handleJsonBatch(self, records: List[ChangeEvent]):
+        self.record(records)
+        if self.handler is not None:
+            self.handler.handleJsonBatch(records)
+
+    def record(self, records: List[ChangeEvent]):
+        """
+        Appends the records to the recording as one frame.
+        """
+        if not records:
+            return
+        compressed = self._compressor.compress(encode_records(records))
+        self._file.write(FRAME_HEADER.pack(len(compressed), len(records)) + compressed)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.recorded_batches += 1
+        self.recorded_records += len(records)
+
+    def set_commit_listener(self, listener: Callable[[int], None]) -> bool:
+        return self.handler is not None and self.handler.set_commit_listener(listener)
+
+    def set_metrics_sink(self, sink: Optional[MetricsSink]):
+        super().set_metrics_sink(sink)
+        if self.handler is not None:
+            self.handler.set_metrics_sink(sink)
+
+    def close(self):
+        try:
+            if self.handler is not None:
+                self.handler.close()
+        finally:
+            self._file.close()
+            self.log.info(f"Recorded {self.recorded_records} records in {self.recorded_batches} batches "
+                          f"to {self.path}")
+
+
+def read_batches(path: Union[str, Path]) -> Iterator[List[RecordedChangeEvent]]:
+    """
+    Yields the recorded batches of the file, in the recorded order. A partial frame at the end of the file is
+    skipped with a warning.
+    """
+    path = Path(path)
+    decompressor = zstandard.ZstdDecompressor()
+    with path.open("rb") as f:
+        if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a change event recording")
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if not header:
+                return
+            compressed = b""
+            if len(header) == FRAME_HEADER.size:
+                compressed_size, num_records = FRAME_HEADER.unpack(header)
+                compressed = f.read(compressed_size)
+            if len(header) < FRAME_HEADER.size or len(compressed) < compressed_size:
+                logging.getLogger(LOGGER_NAME).warning(f"Skipping the partial frame at the end of {path}")
+                return
+            yield decode_records(decompressor.decompress(compressed), num_records)
+
+
+def rebatch(batches: Iterable[List[ChangeEvent]], batch_size: int) -> Iterator[List[ChangeEvent]]:
+    """
+    Regroups the records of the batches into batches of `batch_size` records, the last batch may be smaller.
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be greater than 0!")
+    pending: List[ChangeEvent] = []
+    for batch in batches:
+        pending.extend(batch)
+        while len(pending) >= batch_size:
+            yield pending[:batch_size]
+            del pending[:batch_size]
+    if pending:
+        yield pending
+
+
+def replay(handler: BasePythonChangeHandler, paths: Union[str, Path, Iterable[Union[str, Path]]],
+           batch_size: int = 0) -> int:
+    """
+    Feeds the recorded batches of the files to the handler as fast as it consumes them.
+
+    The handler isn't closed, handlers buffering events across batches write the remaining events on `close()`.
+
+    Args:
+        handler: Handler receiving the batches.
+        paths: Recording file or files, replayed in the given order.
+        batch_size: Regroups the records into batches of this size, by default the recorded batches are kept.
+
+    Returns:
+        int: Number of replayed records.
+    """
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    batches = (batch for path in paths for batch in read_batches(path))
+    if batch_size > 0:
+        batches = rebatch(batches, batch_size)
+    num_records = 0
+    for batch in batches:
+        handler.handleJsonBatch(batch)
+        num_records += len(batch)
+    return num_records
@@ -1,21 +1,6 @@
-import signal
+import concurrent.futures
 import threading
 
-def timeout_handler(signum, frame):
-    """
-    Signal handler for timeouts.
-
-    Raises a TimeoutError when the specified timeout is reached.
-
-    Args:
-        signum: The signal number (unused).
-        frame: The current stack frame (unused).
-
-    Raises:
-        TimeoutError: If the timeout is reached.
-    """
-    raise TimeoutError("Engine run timed out!")
-
 
 class Utils:
 
@@ -24,35 +9,33 @@ class Utils:
         """
         Runs an engine asynchronously with a timeout.
 
-        This method runs the given engine's `run` method in a separate thread
-        and applies a timeout.  If the engine's `run` method doesn't complete
-        within the specified timeout, a TimeoutError is raised, and the thread
-        is interrupted.
+        This method starts the given engine in a separate thread and waits for it. If the engine
+        doesn't stop within the specified timeout, it is stopped and the method returns once it stopped.
+        Works in any thread, unlike timeouts based on signals.
 
         Args:
-            engine: The engine object to run.  It is expected to have a `run` method.
+            engine: The engine object to run. `DebeziumJsonEngine` or an object with `start` and `stop` methods,
+                other objects are expected to have a `run` method and are only waited for.
             timeout_sec: The timeout duration in seconds.  Defaults to 22 seconds.
-        """
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(timeout_sec)
 
-        try:
-            thread = threading.Thread(target=engine.run)
+        Raises:
+            RuntimeError: If the engine failed.
+        """
+        if not hasattr(engine, "start"):
+            thread = threading.Thread(target=engine.run, daemon=True)
             thread.start()
-
-            # Wait for the thread to complete (or the timeout to occur).
-            thread.join()  # This will block until the thread finishes or the signal is received.
-
-        except TimeoutError:
-            # Handle the timeout exception.
-            print("Engine run timed out!") # use logger here for better logging
-            return  # Or potentially handle the timeout differently (e.g., attempt to stop the engine).
-
-        finally:
-            # **Crucially important:** Cancel the alarm.  This prevents the timeout
-            # from triggering again later if the main thread continues to run.
-            signal.alarm(0)  # 0 means cancel the alarm.
-
-        # If the engine.run() finishes within the timeout, this point will be reached.
-        # No explicit return is needed as the function doesn't return anything.
-        print("Engine run completed successfully.") # Add a log message to signal success
\ No newline at end of file
+            thread.join(timeout_sec)
+            if thread.is_alive():
+                print("Engine run timed out!")
+                return
+            print("Engine run completed successfully.")
+            return
+
+        future = engine.start()
+        try:
+            future.result(timeout=timeout_sec)
+        except concurrent.futures.TimeoutError:
+            print("Engine run timed out! stopping the engine")
+            engine.stop()
+            return
+        print("Engine run completed successfully.")
@@ -4,4 +4,9 @@ CURRENT_DIR=$( cd -- "$( dirname -- "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )
 
 cd ${CURRENT_DIR}
 find "${CURRENT_DIR}/debezium/libs" -type f -delete
-mvn dependency:copy-dependencies -DoutputDirectory="${CURRENT_DIR}/debezium/libs"
\ No newline at end of file
+mvn dependency:copy-dependencies -DoutputDirectory="${CURRENT_DIR}/debezium/libs"
+
+# generate the jar dependency index used for connector-scoped classpaths, see classpath.py
+mvn dependency:tree -Dverbose -DoutputFile="${CURRENT_DIR}/target/dependency-tree.txt"
+python3 "${CURRENT_DIR}/classpath.py" --tree-file "${CURRENT_DIR}/target/dependency-tree.txt" \
+  --libs-dir "${CURRENT_DIR}/debezium/libs" --output "${CURRENT_DIR}/debezium/libs_index.json"
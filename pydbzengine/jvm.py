@@ -0,0 +1,415 @@
+"""
+JVM bootstrap and lazy Java class resolution.
+
+The JVM is started on first use, e.g. when a `DebeziumJsonEngine` is built or a Java class like
+`pydbzengine.Properties` is accessed, not when `pydbzengine` is imported. The classpath can't be
+changed after the JVM is started.
+
+When Class Data Sharing is enabled and an archive was trained for the classpath, it's used, see `pydbzengine.cds`.
+JVM options like the heap size and the garbage collector are set with `use_jvm_options`, and the JVM runtime
+metrics are read with `jvm_metrics`.
+"""
+import contextlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Iterable, Optional
+
+import jnius_config
+
+from pydbzengine.classpath import scoped_class_paths
+
+# Define paths to Debezium Java libraries and configuration directory.
+DEBEZIUM_JAVA_LIBS_DIR = Path(__file__).parent.joinpath("debezium/libs/*").as_posix()
+DEBEZIUM_CONF_DIR = Path(__file__).parent.joinpath("config").as_posix()
+
+# Java classes resolved lazily, see `java_class`.
+JAVA_CLASSES: Dict[str, str] = {
+    "Properties": "java.util.Properties",
+    "DebeziumEngine": "io.debezium.engine.DebeziumEngine",
+    "DebeziumEngineBuilder": "io.debezium.engine.DebeziumEngine$Builder",
+    "StopEngineException": "io.debezium.engine.StopEngineException",
+    "JavaLangSystem": "java.lang.System",
+    "JavaLangThread": "java.lang.Thread",
+    "ManagementFactory": "java.lang.management.ManagementFactory",
+    "BufferPoolMXBean": "java.lang.management.BufferPoolMXBean",
+}
+
+_LOCK = threading.RLock()
+_JAVA_CLASSES_CACHE: Dict[str, type] = {}
+_OVERLOAD_CLASSES: Dict[tuple, type] = {}
+_LIBS_CLASS_PATHS: Optional[List[str]] = None  # connector-scoped jars, None uses all bundled jars
+_CDS_ENABLED = os.environ.get("PYDBZENGINE_CDS", "false").lower() == "true"
+_CDS_TRAINING = False
+_CDS_ARCHIVE_FILE: Optional[Path] = None
+_JVM_OPTIONS: Optional["JvmOptions"] = None
+
+_MEMORY_SIZE = re.compile(r"^[1-9][0-9]*[kKmMgG]?$")
+
+
+class GarbageCollector(Enum):
+    """
+    Garbage collectors of the HotSpot JVM, the value is the option selecting it.
+    """
+    G1 = "-XX:+UseG1GC"
+    ZGC = "-XX:+UseZGC"
+    SHENANDOAH = "-XX:+UseShenandoahGC"
+    PARALLEL = "-XX:+UseParallelGC"
+    SERIAL = "-XX:+UseSerialGC"
+
+
+@dataclass
+class JvmOptions:
+    """
+    Typed JVM options, applied with `use_jvm_options` before the JVM is started.
+
+    Memory sizes use the JVM notation, e.g. `512m` or `4g`. Fields left as None keep the JVM default.
+    `extra_options` are appended as they are, e.g. `["-XX:+ExitOnOutOfMemoryError"]`.
+
+    Presets: `JvmOptions.low_latency()`, `JvmOptions.high_throughput()` and `JvmOptions.small_footprint()`,
+    their fields can be changed with `dataclasses.replace`.
+    """
+    initial_heap: Optional[str] = None
+    max_heap: Optional[str] = None
+    max_direct_memory: Optional[str] = None
+    max_metaspace: Optional[str] = None
+    thread_stack_size: Optional[str] = None
+    gc: Optional[GarbageCollector] = None
+    max_gc_pause_millis: Optional[int] = None
+    always_pre_touch: bool = False
+    extra_options: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        for name in ["initial_heap", "max_heap", "max_direct_memory", "max_metaspace", "thread_stack_size"]:
+            value = getattr(self, name)
+            if value is not None and not _MEMORY_SIZE.match(str(value)):
+                raise ValueError(f"Invalid {name} '{value}', expected a size like 512m or 4g!")
+        if self.gc is not None and not isinstance(self.gc, GarbageCollector):
+            raise ValueError(f"Invalid gc '{self.gc}', expected a GarbageCollector!")
+        if self.max_gc_pause_millis is not None and self.max_gc_pause_millis <= 0:
+            raise ValueError("max_gc_pause_millis must be greater than 0!")
+
+    @classmethod
+    def low_latency(cls, max_heap: str = "4g") -> "JvmOptions":
+        """
+        Short GC pauses with the concurrent ZGC collector, the heap is committed and touched at startup.
+        """
+        return cls(initial_heap=max_heap, max_heap=max_heap, gc=GarbageCollector.ZGC, always_pre_touch=True)
+
+    @classmethod
+    def high_throughput(cls, max_heap: str = "4g") -> "JvmOptions":
+        """
+        Highest throughput with the parallel collector, at the cost of longer GC pauses.
+        """
+        return cls(initial_heap=max_heap, max_heap=max_heap, gc=GarbageCollector.PARALLEL)
+
+    @classmethod
+    def small_footprint(cls, max_heap: str = "256m") -> "JvmOptions":
+        """
+        Low memory usage with the serial collector and a small heap, direct memory and thread stacks.
+        """
+        return cls(initial_heap="32m", max_heap=max_heap, max_direct_memory="64m", thread_stack_size="512k",
+                   gc=GarbageCollector.SERIAL, extra_options=["-XX:TieredStopAtLevel=1"])
+
+    def to_options(self) -> List[str]:
+        """
+        Returns the JVM command line options.
+        """
+        options = []
+        if self.initial_heap is not None:
+            options.append(f"-Xms{self.initial_heap}")
+        if self.max_heap is not None:
+            options.append(f"-Xmx{self.max_heap}")
+        if self.max_direct_memory is not None:
+            options.append(f"-XX:MaxDirectMemorySize={self.max_direct_memory}")
+        if self.max_metaspace is not None:
+            options.append(f"-XX:MaxMetaspaceSize={self.max_metaspace}")
+        if self.thread_stack_size is not None:
+            options.append(f"-Xss{self.thread_stack_size}")
+        if self.gc is not None:
+            options.append(self.gc.value)
+        if self.max_gc_pause_millis is not None:
+            options.append(f"-XX:MaxGCPauseMillis={self.max_gc_pause_millis}")
+        if self.always_pre_touch:
+            options.append("-XX:+AlwaysPreTouch")
+        options.extend(self.extra_options)
+        return options
+
+
+@dataclass
+class GcMetrics:
+    """
+    Cumulative collection count and time of a garbage collector.
+    """
+    name: str
+    collection_count: int
+    collection_time_ms: int
+
+
+@dataclass
+class JvmMetrics:
+    """
+    Snapshot of the JVM runtime metrics, see `jvm_metrics`. Memory values are in bytes, `heap_max` is -1 when undefined.
+    GC counts and times are cumulative since the JVM start, the difference of two snapshots gives the GC activity
+    between them.
+    """
+    timestamp: float
+    uptime_ms: int
+    heap_used: int
+    heap_committed: int
+    heap_max: int
+    non_heap_used: int
+    non_heap_committed: int
+    direct_memory_used: int
+    gc: List[GcMetrics]
+    loaded_classes: int
+    total_loaded_classes: int
+    unloaded_classes: int
+    thread_count: int
+    daemon_thread_count: int
+    peak_thread_count: int
+
+    @property
+    def gc_collection_count(self) -> int:
+        return sum(g.collection_count for g in self.gc)
+
+    @property
+    def gc_collection_time_ms(self) -> int:
+        return sum(g.collection_time_ms for g in self.gc)
+
+
+def use_connector_classpath(properties: Dict[str, str], extra_artifacts: Iterable[str] = ()) -> bool:
+    """
+    Puts only the jars needed by the configured connector, offset storage and schema history storage on the
+    classpath, instead of all bundled jars. Must be called before the JVM is started.
+
+    Requires the jar dependency index generated by `install_libs.sh`, see `pydbzengine.classpath`.
+    When the index is missing or the connector is unknown, all bundled jars are used.
+
+    Args:
+        properties: Debezium configuration, the `connector.class`, `offset.storage` and
+            `schema.history.internal` properties are used.
+        extra_artifacts: Additional Maven artifacts (`groupId:artifactId`) to put on the classpath with their
+            dependencies, e.g. `io.confluent:kafka-connect-avro-converter`.
+
+    Returns:
+        bool: True if the classpath is scoped, False if all bundled jars are used.
+    """
+    global _LIBS_CLASS_PATHS
+    with _LOCK:
+        if jnius_config.vm_running:
+            raise RuntimeError("JVM is already running, the classpath can't be changed!")
+        _LIBS_CLASS_PATHS = scoped_class_paths(properties=properties, extra_artifacts=extra_artifacts)
+        return _LIBS_CLASS_PATHS is not None
+
+
+def class_paths() -> List[str]:
+    """
+    Returns the classpath entries used to start the JVM.
+
+    Contains the bundled Debezium libraries (or the connector-scoped subset, see `use_connector_classpath`)
+    and configuration, and the `config` folder of the current working directory if it exists.
+    """
+    libs = _LIBS_CLASS_PATHS if _LIBS_CLASS_PATHS is not None else [DEBEZIUM_JAVA_LIBS_DIR]
+    paths = [*libs, DEBEZIUM_CONF_DIR]
+    # Add current working directory's config folder to classpath if exists
+    config_dir = Path().cwd().joinpath('config')
+    if config_dir.is_dir() and config_dir.exists():
+        print(f"Adding classpath: {config_dir.as_posix()}")
+        paths.append(config_dir.as_posix())
+    return paths
+
+
+def is_jvm_started() -> bool:
+    """
+    Returns True if the JVM is already running in this process.
+    """
+    return jnius_config.vm_running
+
+
+def set_cds_enabled(enabled: bool):
+    """
+    Enables or disables the use of Class Data Sharing archives, disabled by default.
+    Can also be enabled with the environment variable `PYDBZENGINE_CDS=true`. Must be called before the JVM is started.
+    """
+    global _CDS_ENABLED
+    with _LOCK:
+        if jnius_config.vm_running:
+            raise RuntimeError("JVM is already running, the JVM options can't be changed!")
+        _CDS_ENABLED = enabled
+
+
+def enable_cds_training():
+    """
+    Starts the JVM in training mode, the loaded classes are written to the Class Data Sharing archive of the
+    classpath when the JVM exits, see `pydbzengine.cds.train`. Must be called before the JVM is started.
+    """
+    global _CDS_TRAINING
+    with _LOCK:
+        if jnius_config.vm_running:
+            raise RuntimeError("JVM is already running, the JVM options can't be changed!")
+        _CDS_TRAINING = True
+
+
+def use_jvm_options(options: JvmOptions):
+    """
+    Sets the options the JVM is started with, e.g. `use_jvm_options(JvmOptions.low_latency(max_heap="8g"))`.
+    Must be called before the JVM is started.
+    """
+    global _JVM_OPTIONS
+    with _LOCK:
+        if jnius_config.vm_running:
+            raise RuntimeError("JVM is already running, the JVM options can't be changed!")
+        _JVM_OPTIONS = options
+
+
+def cds_archive_file() -> Optional[Path]:
+    """
+    Returns the Class Data Sharing archive used (or written, in training mode) by the running JVM,
+    None when no archive is used.
+    """
+    return _CDS_ARCHIVE_FILE
+
+
+def start_jvm():
+    """
+    Configures the classpath and starts the JVM, does nothing if the JVM is already running.
+
+    If the JVM was started outside pydbzengine (e.g. by importing `jnius` directly), the Debezium
+    libraries must already be on its classpath.
+    """
+    global _CDS_ARCHIVE_FILE
+    with _LOCK:
+        if jnius_config.vm_running:
+            return
+        paths = class_paths()
+        if _CDS_ENABLED or _CDS_TRAINING:
+            from pydbzengine import cds
+            paths, options, _CDS_ARCHIVE_FILE = cds.configure_jvm(paths, training=_CDS_TRAINING)
+            jnius_config.add_options(*options)
+        if _JVM_OPTIONS is not None:
+            jnius_config.add_options(*_JVM_OPTIONS.to_options())
+        # Add the necessary classpaths for JNI interaction with Java.
+        jnius_config.add_classpath(*paths)
+        # importing jnius starts the JVM, with an archive the jnius classes are loaded from their jar
+        with cds.without_jnius_class_dir() if _CDS_ARCHIVE_FILE is not None else contextlib.nullcontext():
+            import jnius  # noqa: F401
+
+
+def detach_thread():
+    """
+    Detaches the current thread from the JVM, must be called at the end of Python threads which called Java methods.
+    Does nothing if the JVM is not running.
+    """
+    if jnius_config.vm_running:
+        import jnius
+        jnius.detach()
+
+
+def java_class(name: str):
+    """
+    Returns the Java class for the given alias in `JAVA_CLASSES`, starts the JVM on first use.
+
+    Args:
+        name: Alias of the Java class, e.g. `Properties`.
+    """
+    if name in _JAVA_CLASSES_CACHE:
+        return _JAVA_CLASSES_CACHE[name]
+
+    with _LOCK:
+        if name not in _JAVA_CLASSES_CACHE:
+            start_jvm()
+            if name == "DebeziumEngine":
+                # the builder returned by DebeziumEngine.create must use the patched builder class
+                java_class("DebeziumEngineBuilder")
+            from jnius import autoclass, JavaMethod
+            # Import Java classes using jnius's autoclass for reflection.
+            clazz = autoclass(JAVA_CLASSES[name])
+            if name == "DebeziumEngineBuilder":
+                # Override the notifying method of DebeziumEngineBuilder to use the correct JavaMethod signature.
+                # This is a workaround for a potential jnius issue where the wrong Java method is called.
+                clazz.notifying = JavaMethod(
+                    '(Lio/debezium/engine/DebeziumEngine$ChangeConsumer;)Lio/debezium/engine/DebeziumEngine$Builder;')
+            _JAVA_CLASSES_CACHE[name] = clazz
+        return _JAVA_CLASSES_CACHE[name]
+
+
+def call_overload(obj, method: str, signature: str, *args):
+    """
+    Calls the overload of a Java method with the given JNI signature.
+
+    jnius can't tell which overload to call when the argument is implemented in Python (`PythonJavaClass`) and
+    several overloads take an interface, e.g. `DebeziumEngine.Builder.using`. The object is cast to a wrapper of its
+    runtime class declaring only this overload. The runtime class is wrapped instead of the declared type, the
+    wrapper would replace the class jnius uses for objects of the declared type.
+
+    Args:
+        obj: Java object.
+        method: Name of the method.
+        signature: JNI signature of the overload, e.g. `(Ljava/lang/Runnable;)V`.
+        args: Arguments of the method.
+    """
+    from jnius import JavaClass, JavaMethod, MetaJavaClass, cast
+    class_name = obj.getClass().getName().replace(".", "/")
+    key = (class_name, method, signature)
+    with _LOCK:
+        if key not in _OVERLOAD_CLASSES:
+            _OVERLOAD_CLASSES[key] = MetaJavaClass(f"_Overload{len(_OVERLOAD_CLASSES)}", (JavaClass,),
+                                                   {"__javaclass__": class_name, method: JavaMethod(signature)})
+    return getattr(cast(_OVERLOAD_CLASSES[key], obj), method)(*args)
+
+
+def to_java_properties(properties) -> "Properties":
+    """
+    Converts a dict to a Java `Properties` object, Java `Properties` are returned as they are.
+
+    Args:
+        properties: Debezium configuration as dict or Java `Properties`.
+    """
+    if not isinstance(properties, dict):
+        return properties
+    java_properties = java_class("Properties")()
+    for key, value in properties.items():
+        java_properties.setProperty(str(key), str(value))
+    return java_properties
+
+
+def jvm_metrics() -> JvmMetrics:
+    """
+    Reads the heap, garbage collection, class loading and thread metrics of the JVM from the
+    `java.lang.management` MXBeans. Starts the JVM if it's not running.
+    """
+    management_factory = java_class("ManagementFactory")
+    memory = management_factory.getMemoryMXBean()
+    heap = memory.getHeapMemoryUsage()
+    non_heap = memory.getNonHeapMemoryUsage()
+    direct_memory_used = 0
+    for pool in management_factory.getPlatformMXBeans(java_class("BufferPoolMXBean")).toArray():
+        if pool.getName() == "direct":
+            direct_memory_used = pool.getMemoryUsed()
+    gc = [GcMetrics(name=bean.getName(), collection_count=bean.getCollectionCount(),
+                    collection_time_ms=bean.getCollectionTime())
+          for bean in management_factory.getGarbageCollectorMXBeans().toArray()]
+    class_loading = management_factory.getClassLoadingMXBean()
+    threads = management_factory.getThreadMXBean()
+    return JvmMetrics(
+        timestamp=time.time(),
+        uptime_ms=management_factory.getRuntimeMXBean().getUptime(),
+        heap_used=heap.getUsed(),
+        heap_committed=heap.getCommitted(),
+        heap_max=heap.getMax(),
+        non_heap_used=non_heap.getUsed(),
+        non_heap_committed=non_heap.getCommitted(),
+        direct_memory_used=direct_memory_used,
+        gc=gc,
+        loaded_classes=class_loading.getLoadedClassCount(),
+        total_loaded_classes=class_loading.getTotalLoadedClassCount(),
+        unloaded_classes=class_loading.getUnloadedClassCount(),
+        thread_count=threads.getThreadCount(),
+        daemon_thread_count=threads.getDaemonThreadCount(),
+        peak_thread_count=threads.getPeakThreadCount(),
+    )
@@ -0,0 +1,318 @@
+"""
+Pipeline metrics of `PythonChangeConsumer` and the built-in handlers.
+
+Metrics are reported to a `MetricsSink`, e.g. `InMemoryMetricsSink`, which can be exported in the Prometheus text
+format with `PrometheusExporter`. Metrics are disabled unless a sink is passed to the engine:
+
+    metrics = InMemoryMetricsSink()
+    engine = DebeziumJsonEngine(properties=props, handler=handler, metrics=metrics)
+    PrometheusExporter(metrics, port=9464).start()
+
+Timings are in seconds. The consumer reports the time of each batch split into the materialization of the Java
+records (`BATCH_MATERIALIZE_SECONDS`), the handler (`BATCH_HANDLER_SECONDS`) and the commit of the offsets
+(`BATCH_COMMIT_SECONDS`), the records per destination, and the source lag, the time between the change in the
+source database (`ts_ms` of the event) and the end of its batch.
+"""
+import bisect
+import http.server
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+BATCHES = "pydbzengine_batches_total"
+RECORDS = "pydbzengine_records_total"
+BATCH_SECONDS = "pydbzengine_batch_seconds"
+BATCH_MATERIALIZE_SECONDS = "pydbzengine_batch_materialize_seconds"
+BATCH_HANDLER_SECONDS = "pydbzengine_batch_handler_seconds"
+BATCH_COMMIT_SECONDS = "pydbzengine_batch_commit_seconds"
+RECORDS_PER_SECOND = "pydbzengine_records_per_second"
+SOURCE_LAG_SECONDS = "pydbzengine_source_lag_seconds"
+HANDLER_CONVERT_SECONDS = "pydbzengine_handler_convert_seconds"
+HANDLER_WRITE_SECONDS = "pydbzengine_handler_write_seconds"
+HANDLER_WRITTEN_RECORDS = "pydbzengine_handler_written_records_total"
+HANDLER_COMMIT_RETRIES = "pydbzengine_handler_commit_retries_total"
+HANDLER_BATCH_RETRIES = "pydbzengine_handler_batch_retries_total"
+DEAD_LETTER_RECORDS = "pydbzengine_dead_letter_records_total"
+
+DESCRIPTIONS = {
+    BATCHES: "Batches received from the Debezium engine",
+    RECORDS: "Records received from the Debezium engine, per destination",
+    BATCH_SECONDS: "Time from receiving a batch until it is committed",
+    BATCH_MATERIALIZE_SECONDS: "Time reading the records of a batch from Java",
+    BATCH_HANDLER_SECONDS: "Time of the handler processing a batch",
+    BATCH_COMMIT_SECONDS: "Time committing the offsets of a batch",
+    RECORDS_PER_SECOND: "Records per second of the last batch",
+    SOURCE_LAG_SECONDS: "Time from the change in the source database until its batch is processed",
+    HANDLER_CONVERT_SECONDS: "Time of a handler converting events",
+    HANDLER_WRITE_SECONDS: "Time of a handler writing converted events to the destination",
+    HANDLER_WRITTEN_RECORDS: "Records written by a handler, per destination",
+    HANDLER_COMMIT_RETRIES: "Commits of a handler retried after a conflict",
+    HANDLER_BATCH_RETRIES: "Batches retried after the handler failed, see `pydbzengine.errors.ErrorPolicy`",
+    DEAD_LETTER_RECORDS: "Records passed to the dead-letter handler, per destination",
+}
+
+Labels = Optional[Mapping[str, str]]
+LabelKey = Tuple[Tuple[str, str], ...]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 4 * 3600.0, 24 * 3600.0)
+
+_TS_MS = re.compile(rb'"ts_ms"\s*:\s*(\d+)')
+
+
+class MetricsSink(ABC):
+    """
+    Receiver of the pipeline metrics. Implementations must be thread safe, metrics are reported by the engine thread,
+    the sink worker thread of the pipelined execution and the write threads of the handlers.
+    """
+
+    @abstractmethod
+    def increment(self, name: str, value: float = 1, labels: Labels = None):
+        """
+        Adds the value to a counter.
+        """
+
+    @abstractmethod
+    def set_gauge(self, name: str, value: float, labels: Labels = None):
+        """
+        Sets a gauge to the value.
+        """
+
+    @abstractmethod
+    def observe(self, name: str, value: float, labels: Labels = None):
+        """
+        Adds an observation, e.g. a duration in seconds, to a histogram.
+        """
+
+
+class Histogram:
+    """
+    Histogram with fixed bucket upper bounds, like the Prometheus histograms.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> List[int]:
+        result, total = [], 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the quantile by linear interpolation within the bucket, like `histogram_quantile` of Prometheus.
+        Values in the +Inf bucket are estimated as the largest bucket bound. NaN without observations.
+        """
+        if self.count == 0:
+            return float("nan")
+        rank = q * self.count
+        lower_count, lower_bound = 0, 0.0
+        for bound, count in zip(self.buckets, self.cumulative_counts()):
+            if count >= rank:
+                if count == lower_count:
+                    return bound
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+            lower_count, lower_bound = count, bound
+        return self.buckets[-1] if self.buckets else float("nan")
+
+
+def _label_key(labels: Labels) -> LabelKey:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+class InMemoryMetricsSink(MetricsSink):
+    """
+    Keeps the metrics in memory, read them with `counter`, `gauge` and `histogram`, or export them with
+    `PrometheusExporter`.
+    """
+
+    def __init__(self, buckets: Optional[Dict[str, Sequence[float]]] = None):
+        """
+        Args:
+            buckets: Bucket upper bounds of histograms by name, the default is `LATENCY_BUCKETS`,
+                and `LAG_BUCKETS` for `SOURCE_LAG_SECONDS`.
+        """
+        self.buckets: Dict[str, Sequence[float]] = {SOURCE_LAG_SECONDS: LAG_BUCKETS, **(buckets or {})}
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Labels = None):
+        with self._lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, labels: Labels = None):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets.get(name, LATENCY_BUCKETS))
+            histogram.observe(value)
+
+    def counter(self, name: str, **labels) -> float:
+        """
+        Returns the value of a counter, the sum of all its label values when no labels are given.
+        """
+        with self._lock:
+            series = self.counters.get(name, {})
+            if labels:
+                return series.get(_label_key(labels), 0)
+            return sum(series.values())
+
+    def gauge(self, name: str, **labels) -> Optional[float]:
+        with self._lock:
+            return self.gauges.get(name, {}).get(_label_key(labels))
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        with self._lock:
+            return self.histograms.get(name, {}).get(_label_key(labels))
+
+    def snapshot(self) -> Tuple[dict, dict, dict]:
+        """
+        Returns copies of the counters, gauges and histograms.
+        """
+        with self._lock:
+            histograms = {}
+            for name, series in self.histograms.items():
+                histograms[name] = {}
+                for key, histogram in series.items():
+                    copy = Histogram(histogram.buckets)
+                    copy.counts, copy.count, copy.sum = list(histogram.counts), histogram.count, histogram.sum
+                    histograms[name][key] = copy
+            return ({name: dict(series) for name, series in self.counters.items()},
+                    {name: dict(series) for name, series in self.gauges.items()},
+                    histograms)
+
+
+def event_ts_ms(value: Union[str, bytes, None]) -> Optional[int]:
+    """
+    Returns the `ts_ms` of a Debezium JSON event value without parsing it, the last `ts_ms` field of the value
+    is the one of the envelope (the `source` block comes before it). None if the value has no `ts_ms`,
+    e.g. tombstones and the binary formats.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    position = value.rfind(b'"ts_ms"')
+    if position < 0:
+        return None
+    match = _TS_MS.match(value, position)
+    return int(match.group(1)) if match else None
+
+
+def _format_labels(key: Iterable[Tuple[str, str]]) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    labels = ",".join(f'{name}="{escape(value)}"' for name, value in key)
+    return f"{{{labels}}}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def prometheus_text(sink: InMemoryMetricsSink) -> str:
+    """
+    Renders the metrics of the sink in the Prometheus text exposition format.
+    """
+    counters, gauges, histograms = sink.snapshot()
+    lines = []
+
+    def header(name: str, metric_type: str):
+        if name in DESCRIPTIONS:
+            lines.append(f"# HELP {name} {DESCRIPTIONS[name]}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    for metric_type, metrics in (("counter", counters), ("gauge", gauges)):
+        for name in sorted(metrics):
+            header(name, metric_type)
+            for key, value in sorted(metrics[name].items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+    for name in sorted(histograms):
+        header(name, "histogram")
+        for key, histogram in sorted(histograms[name].items()):
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.cumulative_counts()):
+                lines.append(f"{name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+            lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusExporter:
+    """
+    Serves the metrics of an `InMemoryMetricsSink` in the Prometheus text format over HTTP, at `/metrics`.
+    """
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, sink: InMemoryMetricsSink, port: int = 9464, address: str = ""):
+        self.sink = sink
+        self.port = port
+        self.address = address
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def render(self) -> str:
+        return prometheus_text(self.sink)
+
+    def start(self) -> "PrometheusExporter":
+        """
+        Starts the HTTP server in a daemon thread, port 0 binds a free port, see `server_port`.
+        """
+        exporter = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", exporter.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((self.address, self.port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True,
+                                        name="pydbzengine-prometheus-exporter")
+        self._thread.start()
+        return self
+
+    @property
+    def server_port(self) -> int:
+        return self._server.server_address[1]
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
@@ -0,0 +1,493 @@
+"""
+Runs many Debezium engines with one API, as threads sharing the JVM of the process or as worker processes.
+
+    specs = shard_tables("inventory", properties, shards=4, handler_factory=make_handler)
+    with EngineSupervisor(specs, mode="process") as supervisor:
+        supervisor.wait()
+
+A member whose engine stops on its own, e.g. because the connector or the handler failed, is restarted with
+exponential backoff. The supervisor reports the state, the records and the throughput of each member, see `health`.
+
+In process mode the specs are pickled, the handler factory must be a module level function or class.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from pydbzengine import BasePythonChangeHandler, metrics
+from pydbzengine.jvm import detach_thread
+from pydbzengine.metrics import MetricsSink
+
+LOGGER_NAME = "pydbzengine.supervisor"
+
+# file based stores of the engine, each shard needs its own file
+SHARD_FILE_PROPERTIES = ("offset.storage.file.filename", "schema.history.internal.file.filename")
+
+
+@dataclass
+class EngineSpec:
+    """
+    Configuration of one supervised engine.
+
+    Args:
+        name: Name of the member, used in the health report and the logs.
+        properties: Debezium configuration properties.
+        handler_factory: Creates the handler of the engine, called again when the engine is restarted.
+        engine_args: Further arguments of `DebeziumJsonEngine`, e.g. `commit_strategy` or `max_queued_batches`.
+    """
+    name: str
+    properties: Dict[str, str]
+    handler_factory: Callable[[], BasePythonChangeHandler]
+    engine_args: Dict[str, Any] = field(default_factory=dict)
+
+    def build(self, metrics_sink: MetricsSink):
+        """
+        Creates the engine, reporting its metrics to `metrics_sink`.
+        """
+        from pydbzengine import DebeziumJsonEngine
+        return DebeziumJsonEngine(properties=self.properties, handler=self.handler_factory(),
+                                  **{**self.engine_args, "metrics": metrics_sink})
+
+
+def _shard_file_name(file_name: str, index: int) -> str:
+    path = Path(file_name)
+    return path.with_name(f"{path.stem}-{index}{path.suffix}").as_posix()
+
+
+def shard_properties(properties: Dict[str, str], index: int, tables: List[str]) -> Dict[str, str]:
+    """
+    Returns the properties of one shard of a source database capturing `tables`.
+
+    Each shard gets its own engine name, offset and schema history files, and replication slot and publication
+    for PostgreSQL. The publication of a shard is created for its tables only (`publication.autocreate.mode`
+    `filtered`), unless publications aren't created by Debezium. A configured MySQL `database.server.id` is
+    incremented by the shard index.
+    """
+    shard = dict(properties)
+    shard["table.include.list"] = ",".join(tables)
+    shard["name"] = f"{properties.get('name', 'engine')}-{index}"
+    for key in SHARD_FILE_PROPERTIES:
+        if key in properties:
+            shard[key] = _shard_file_name(properties[key], index)
+    if "PostgresConnector" in properties.get("connector.class", ""):
+        shard["slot.name"] = f"{properties.get('slot.name', 'debezium')}_{index}"
+        shard["publication.name"] = f"{properties.get('publication.name', 'dbz_publication')}_{index}"
+        if properties.get("publication.autocreate.mode") != "disabled":
+            shard["publication.autocreate.mode"] = "filtered"
+    if "database.server.id" in properties:
+        shard["database.server.id"] = str(int(properties["database.server.id"]) + index)
+    return shard
+
+
+def shard_tables(name: str, properties: Dict[str, str], shards: int,
+                 handler_factory: Callable[[], BasePythonChangeHandler], tables: Optional[List[str]] = None,
+                 **engine_args) -> List[EngineSpec]:
+    """
+    Splits the captured tables of one source database into `shards` engines, see `shard_properties`.
+
+    Args:
+        name: Prefix of the member names, the shards are named `{name}-{index}`.
+        properties: Debezium configuration properties of the source database.
+        shards: Number of engines.
+        handler_factory: Creates the handler of each engine.
+        tables: Fully qualified tables to capture, defaults to the `table.include.list` property.
+            The tables are assigned round robin.
+        engine_args: Further arguments of `DebeziumJsonEngine`.
+    """
+    if shards < 1:
+        raise ValueError("shards must be greater than 0!")
+    if tables is None:
+        tables = [table.strip() for table in properties.get("table.include.list", "").split(",") if table.strip()]
+    if len(tables) < shards:
+        raise ValueError(f"Can't split {len(tables)} tables into {shards} shards, "
+                         f"set `tables` or the `table.include.list` property")
+    return [EngineSpec(name=f"{name}-{index}",
+                       properties=shard_properties(properties, index, tables[index::shards]),
+                       handler_factory=handler_factory, engine_args=dict(engine_args))
+            for index in range(shards)]
+
+
+class MemberState(Enum):
+    """
+    State of a supervised engine.
+    """
+    STARTING = "starting"
+    RUNNING = "running"
+    BACKOFF = "backoff"  # failed, waiting to be restarted
+    FAILED = "failed"  # failed more often than `max_restarts`
+    STOPPED = "stopped"
+
+
+@dataclass
+class MemberHealth:
+    """
+    Health of a supervised engine, see `EngineSupervisor.health`.
+    """
+    name: str
+    state: MemberState
+    restarts: int
+    records: int
+    batches: int
+    records_per_second: float  # over the last report interval
+    seconds_since_last_batch: Optional[float]
+    last_error: Optional[str]
+
+
+class _MemberStats:
+    """
+    Counters of a member, in shared memory to be updated by worker processes.
+    """
+
+    def __init__(self, context):
+        self.records = context.Value("q", 0)
+        self.batches = context.Value("q", 0)
+        self.last_batch_at = context.Value("d", 0.0)
+
+
+class _MemberMetricsSink(MetricsSink):
+    """
+    Counts the records and batches of the member, and passes the metrics to the sink of the spec.
+    """
+
+    def __init__(self, stats: _MemberStats, sink: Optional[MetricsSink] = None):
+        self.stats = stats
+        self.sink = sink
+
+    def increment(self, name: str, value: float = 1, labels=None):
+        if name == metrics.RECORDS:
+            with self.stats.records.get_lock():
+                self.stats.records.value += int(value)
+        elif name == metrics.BATCHES:
+            with self.stats.batches.get_lock():
+                self.stats.batches.value += int(value)
+            self.stats.last_batch_at.value = time.time()
+        if self.sink is not None:
+            self.sink.increment(name, value, labels)
+
+    def set_gauge(self, name: str, value: float, labels=None):
+        if self.sink is not None:
+            self.sink.set_gauge(name, value, labels)
+
+    def observe(self, name: str, value: float, labels=None):
+        if self.sink is not None:
+            self.sink.observe(name, value, labels)
+
+
+def _run_engine_process(spec: EngineSpec, stats: _MemberStats, stop_event, poll_sec: float):
+    """
+    Runs the engine in a worker process until it stops on its own or `stop_event` is set, the exit code is 0 only
+    when the engine was stopped.
+    """
+    log = logging.getLogger(LOGGER_NAME)
+    engine = spec.build(_MemberMetricsSink(stats, spec.engine_args.get("metrics")))
+
+    def run():
+        try:
+            engine.run()
+        except Exception:
+            log.exception(f"Engine {spec.name} failed")
+        finally:
+            detach_thread()
+
+    thread = threading.Thread(target=run, name=f"pydbzengine-{spec.name}")
+    thread.start()
+    try:
+        while thread.is_alive() and not stop_event.wait(poll_sec):
+            pass
+    except KeyboardInterrupt:
+        stop_event.set()
+    if stop_event.is_set():
+        engine.close()
+        thread.join()
+        raise SystemExit(0)
+    thread.join()
+    raise SystemExit(1)
+
+
+class _Member:
+
+    def __init__(self, spec: EngineSpec, context):
+        self.spec = spec
+        self.stats = _MemberStats(context)
+        self.state = MemberState.STARTING
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.started_at = 0.0
+        self.next_start_at = 0.0
+        self.last_error: Optional[str] = None
+        self.run_error: Optional[str] = None  # thread mode only, error of the current run
+        self.worker = None  # thread or process
+        self.engine = None  # thread mode only
+        self.stop_event = None  # process mode only
+        self.stop_requested = False
+        self.rate = 0.0
+        self.rate_records = 0
+        self.rate_at = time.monotonic()
+
+
+class EngineSupervisor:
+    """
+    Runs the engines of the specs as threads in this process or as worker processes, restarts failed engines
+    with exponential backoff, and reports their health.
+
+    Thread mode shares one JVM, the handlers run in the threads of this process and share the GIL. Process mode
+    starts one JVM per engine, the handlers run in parallel.
+    """
+
+    def __init__(self, specs: List[EngineSpec], mode: str = "thread", max_restarts: Optional[int] = 5,
+                 restart_backoff_sec: float = 1.0, max_backoff_sec: float = 60.0, backoff_reset_sec: float = 300.0,
+                 report_interval_sec: float = 60.0, check_interval_sec: float = 0.5):
+        """
+        Initializes the EngineSupervisor.
+
+        Args:
+            specs: Engines to run, the names must be unique.
+            mode: `thread` or `process`.
+            max_restarts: Consecutive restarts of a failing engine before it is given up, None restarts forever.
+            restart_backoff_sec: Delay of the first restart, doubled for each further consecutive failure.
+            max_backoff_sec: Maximum delay of a restart.
+            backoff_reset_sec: An engine running at least this long before failing is restarted with the first
+                delay again.
+            report_interval_sec: Interval of the throughput calculation and of the health summary in the log.
+            check_interval_sec: Interval of checking the engines.
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unsupported mode {mode}, use `thread` or `process`")
+        names = [spec.name for spec in specs]
+        if not specs or len(set(names)) != len(names):
+            raise ValueError("Please provide engine specs with unique names!")
+        self.log = logging.getLogger(LOGGER_NAME)
+        self.mode = mode
+        self.max_restarts = max_restarts
+        self.restart_backoff_sec = restart_backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.backoff_reset_sec = backoff_reset_sec
+        self.report_interval_sec = report_interval_sec
+        self.check_interval_sec = check_interval_sec
+        self._context = multiprocessing.get_context("spawn")  # forking a process with a running JVM is unsafe
+        self._members = [_Member(spec, self._context) for spec in specs]
+        self._lock = threading.RLock()
+        self._stopping = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+        self._last_report = time.monotonic()
+
+    def start(self) -> "EngineSupervisor":
+        """
+        Starts all engines and the monitor thread.
+        """
+        if self._monitor is not None:
+            raise RuntimeError("Supervisor is already started")
+        with self._lock:
+            for member in self._members:
+                self._start_member(member)
+        self._monitor = threading.Thread(target=self._monitor_members, daemon=True, name="pydbzengine-supervisor")
+        self._monitor.start()
+        return self
+
+    def _start_member(self, member: _Member):
+        member.state = MemberState.STARTING
+        member.started_at = time.monotonic()
+        member.engine = None
+        member.run_error = None
+        member.stop_requested = False
+        if self.mode == "thread":
+            member.worker = threading.Thread(target=self._run_engine_thread, args=(member,),
+                                             name=f"pydbzengine-{member.spec.name}")
+        else:
+            member.stop_event = self._context.Event()
+            member.worker = self._context.Process(target=_run_engine_process,
+                                                  args=(member.spec, member.stats, member.stop_event,
+                                                        self.check_interval_sec),
+                                                  name=f"pydbzengine-{member.spec.name}")
+        member.worker.start()
+        if self.mode == "process":
+            member.state = MemberState.RUNNING
+        self.log.info(f"Started engine {member.spec.name}")
+
+    def _run_engine_thread(self, member: _Member):
+        try:
+            engine = member.spec.build(_MemberMetricsSink(member.stats, member.spec.engine_args.get("metrics")))
+            with self._lock:
+                member.engine = engine
+                if member.stop_requested:
+                    return
+                member.state = MemberState.RUNNING
+            engine.run()
+            completion = getattr(engine, "completion", None)
+            if completion is not None and not completion.success:
+                member.run_error = completion.error or completion.message
+        except Exception as e:
+            member.run_error = repr(e)
+            self.log.exception(f"Engine {member.spec.name} failed")
+        finally:
+            detach_thread()
+
+    def _monitor_members(self):
+        try:
+            while not self._stopping.wait(self.check_interval_sec):
+                self._check_members()
+        except Exception:
+            self.log.exception("Supervisor monitor failed")
+        finally:
+            detach_thread()
+
+    def _check_members(self):
+        now = time.monotonic()
+        with self._lock:
+            for member in self._members:
+                if member.state in (MemberState.STARTING, MemberState.RUNNING) and not member.worker.is_alive():
+                    self._member_exited(member, now)
+                elif member.state == MemberState.BACKOFF and now >= member.next_start_at:
+                    member.restarts += 1
+                    self._start_member(member)
+            if now - self._last_report >= self.report_interval_sec:
+                self._update_rates(now)
+                self._last_report = now
+                self.log.info(self.summary())
+
+    def _member_exited(self, member: _Member, now: float):
+        if self._stopping.is_set() or member.stop_requested:
+            member.state = MemberState.STOPPED
+            return
+        if member.run_error is not None:
+            member.last_error = member.run_error
+        elif self.mode == "process" and member.worker.exitcode:
+            member.last_error = f"Engine process exited with code {member.worker.exitcode}"
+        else:
+            member.last_error = "Engine stopped"
+        if now - member.started_at >= self.backoff_reset_sec:
+            member.consecutive_failures = 0
+        member.consecutive_failures += 1
+        if self.max_restarts is not None and member.consecutive_failures > self.max_restarts:
+            member.state = MemberState.FAILED
+            self.log.error(f"Engine {member.spec.name} failed {member.consecutive_failures} times, giving up: "
+                           f"{member.last_error}")
+            return
+        delay = min(self.restart_backoff_sec * 2 ** (member.consecutive_failures - 1), self.max_backoff_sec)
+        member.state = MemberState.BACKOFF
+        member.next_start_at = now + delay
+        self.log.warning(f"Engine {member.spec.name} stopped unexpectedly ({member.last_error}), "
+                         f"restarting in {delay:.1f}s")
+
+    def _update_rates(self, now: float):
+        for member in self._members:
+            records = member.stats.records.value
+            elapsed = now - member.rate_at
+            if elapsed > 0:
+                member.rate = (records - member.rate_records) / elapsed
+            member.rate_records = records
+            member.rate_at = now
+
+    def health(self) -> Dict[str, MemberHealth]:
+        """
+        Returns the health of each engine by name. The records and batches are counted since the supervisor
+        started, across restarts.
+        """
+        now = time.time()
+        with self._lock:
+            result = {}
+            for member in self._members:
+                last_batch_at = member.stats.last_batch_at.value
+                result[member.spec.name] = MemberHealth(
+                    name=member.spec.name, state=member.state, restarts=member.restarts,
+                    records=member.stats.records.value, batches=member.stats.batches.value,
+                    records_per_second=member.rate,
+                    seconds_since_last_batch=now - last_batch_at if last_batch_at else None,
+                    last_error=member.last_error)
+            return result
+
+    @property
+    def healthy(self) -> bool:
+        """
+        True if no engine was given up.
+        """
+        return all(health.state != MemberState.FAILED for health in self.health().values())
+
+    def summary(self) -> str:
+        """
+        One line summary of the health of the engines.
+        """
+        health = self.health().values()
+        states = {}
+        for member in health:
+            states[member.state.value] = states.get(member.state.value, 0) + 1
+        return (f"{len(health)} engines ({', '.join(f'{n} {s}' for s, n in states.items())}), "
+                f"{sum(m.records for m in health)} records, "
+                f"{sum(m.records_per_second for m in health):.1f} records/s")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until all engines are stopped or given up. Returns False when the timeout elapsed before.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                done = all(member.state in (MemberState.STOPPED, MemberState.FAILED) for member in self._members)
+            if done:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.check_interval_sec)
+
+    def run(self):
+        """
+        Starts the engines and blocks until they are stopped or given up, stops them on KeyboardInterrupt.
+        """
+        self.start()
+        try:
+            self.wait()
+        except KeyboardInterrupt:
+            self.log.info("Interrupted, stopping the engines")
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 60.0):
+        """
+        Stops all engines and waits for them, worker processes still running after the timeout are terminated.
+
+        Args:
+            timeout: Seconds to wait for all engines together.
+        """
+        self._stopping.set()
+        if self._monitor is not None:
+            self._monitor.join()
+        with self._lock:
+            for member in self._members:
+                member.stop_requested = True
+                if self.mode == "process":
+                    if member.stop_event is not None:
+                        member.stop_event.set()
+                elif member.engine is not None:
+                    try:
+                        member.engine.close()
+                    except Exception:
+                        self.log.exception(f"Failed to stop engine {member.spec.name}")
+        deadline = time.monotonic() + timeout
+        for member in self._members:
+            if member.worker is None:
+                continue
+            member.worker.join(max(0.0, deadline - time.monotonic()))
+            if member.worker.is_alive():
+                if self.mode == "process":
+                    self.log.warning(f"Engine {member.spec.name} didn't stop in time, terminating it")
+                    member.worker.terminate()
+                    member.worker.join()
+                else:
+                    self.log.warning(f"Engine {member.spec.name} didn't stop in time")
+                    continue
+            if member.state != MemberState.FAILED:
+                member.state = MemberState.STOPPED
+        self._update_rates(time.monotonic())
+        detach_thread()
+        self.log.info(self.summary())
+
+    def __enter__(self) -> "EngineSupervisor":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,25 @@
+import tempfile
+from pathlib import Path
+
+from pyiceberg.catalog.sql import SqlCatalog
+
+
+class LocalSqlCatalog:
+    """
+    Iceberg SQLite catalog with a local warehouse directory, used for testing the Iceberg handlers without containers.
+    """
+    NAMESPACE = ("my_warehouse", "dbz_cdc_data")
+
+    def __init__(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        warehouse = Path(self.tmp_dir.name)
+        self.catalog = SqlCatalog(
+            "default",
+            uri=f"sqlite:///{warehouse.joinpath('catalog.db').as_posix()}",
+            warehouse=warehouse.as_uri(),
+        )
+        self.catalog.create_namespace(self.NAMESPACE)
+
+    def cleanup(self):
+        self.catalog.engine.dispose()
+        self.tmp_dir.cleanup()
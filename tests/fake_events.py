@@ -0,0 +1,57 @@
+import json
+
+from pydbzengine import ChangeEvent, RecordCommitter
+
+
+class FakeChangeEvent(ChangeEvent):
+    """
+    Python implementation of the ChangeEvent, used for testing handlers without running the Debezium engine.
+    """
+
+    def __init__(self, key, value, destination, partition=None):
+        self._key = key
+        self._value = value
+        self._destination = destination
+        self._partition = partition
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def destination(self):
+        return self._destination
+
+    def partition(self):
+        return self._partition
+
+
+class FakeRecordCommitter(RecordCommitter):
+    """
+    Python implementation of the RecordCommitter, collects the acknowledged records for assertions.
+    """
+
+    def __init__(self):
+        self.processed = []
+        self.finished_batches = 0
+
+    def markProcessed(self, record):
+        self.processed.append(record)
+
+    def markBatchFinished(self):
+        self.finished_batches += 1
+
+
+def debezium_event(op: str, before=None, after=None, ts_ms: int = 1700000000000, table: str = "customers") -> str:
+    """
+    Returns the JSON value of a Debezium change event (without schema) for the given operation and row states.
+    """
+    return json.dumps({
+        "before": before,
+        "after": after,
+        "source": {"connector": "postgresql", "db": "postgres", "schema": "inventory", "table": table,
+                   "ts_ms": ts_ms},
+        "op": op,
+        "ts_ms": ts_ms,
+    })
@@ -0,0 +1,45 @@
+import unittest
+from typing import List
+
+import pyarrow as pa
+
+from fake_events import FakeChangeEvent
+from pydbzengine.handlers.arrow import ArrowChangeHandler, change_events_to_record_batch, \
+    CHANGE_EVENT_BATCH_SCHEMA, BINARY_CHANGE_EVENT_BATCH_SCHEMA
+
+
+class CollectingArrowChangeHandler(ArrowChangeHandler):
+    def __init__(self):
+        super().__init__()
+        self.batches: List[pa.RecordBatch] = []
+
+    def handleArrowBatch(self, batch: pa.RecordBatch):
+        self.batches.append(batch)
+
+
+class TestArrowChangeHandler(unittest.TestCase):
+    RECORDS = [
+        FakeChangeEvent('{"id": 1}', '{"op": "c"}', "testc.inventory.customers"),
+        FakeChangeEvent('{"id": 2}', None, "testc.inventory.customers", 0),
+        FakeChangeEvent(None, '{"op": "r"}', "testc.inventory.orders"),
+    ]
+
+    def test_change_events_to_record_batch(self):
+        batch = change_events_to_record_batch(self.RECORDS)
+        self.assertEqual(batch.schema, CHANGE_EVENT_BATCH_SCHEMA)
+        self.assertEqual(batch.num_rows, 3)
+        self.assertEqual(batch.column("key").to_pylist(), ['{"id": 1}', '{"id": 2}', None])
+        self.assertEqual(batch.column("value").to_pylist(), ['{"op": "c"}', None, '{"op": "r"}'])
+
+    def test_handler_receives_arrow_batch(self):
+        handler = CollectingArrowChangeHandler()
+        handler.handleJsonBatch(records=self.RECORDS)
+        self.assertEqual(len(handler.batches), 1)
+        self.assertEqual(handler.batches[0].column("destination").to_pylist(),
+                         ["testc.inventory.customers", "testc.inventory.customers", "testc.inventory.orders"])
+
+    def test_binary_record_batch(self):
+        records = [FakeChangeEvent(b'{"id": 1}', b'{"op": "c"}', "testc.inventory.customers")] + self.RECORDS
+        batch = change_events_to_record_batch(records, binary=True)
+        self.assertEqual(batch.schema, BINARY_CHANGE_EVENT_BATCH_SCHEMA)
+        self.assertEqual(batch.column("value").to_pylist()[:2], [b'{"op": "c"}', b'{"op": "c"}'])
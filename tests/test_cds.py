@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from pydbzengine import cds
+
+
+class TestCds(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self.tmp.name)
+        self.cds_dir = self.tmp_dir.joinpath("cds")
+        env = mock.patch.dict(os.environ, {cds.CDS_DIR_ENV: self.cds_dir.as_posix()})
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.libs_dir = self.tmp_dir.joinpath("libs")
+        self.libs_dir.mkdir()
+        for name in ["b.jar", "a.jar", "notes.txt"]:
+            self.libs_dir.joinpath(name).write_text("")
+        self.conf_dir = self.tmp_dir.joinpath("config")
+        self.conf_dir.mkdir()
+        self.conf_dir.joinpath("log4j.properties").write_text("log4j.rootLogger=INFO")
+        self.class_paths = [self.libs_dir.joinpath("*").as_posix(), self.conf_dir.as_posix()]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_archivable_class_paths(self):
+        paths = cds.archivable_class_paths(self.class_paths, create_jars=True)
+        self.assertEqual(paths[:2], [self.libs_dir.joinpath("a.jar").as_posix(),
+                                     self.libs_dir.joinpath("b.jar").as_posix()])
+        # directories are replaced by jars, the jnius classes directory is the last entry
+        self.assertEqual(len(paths), 4)
+        for jar in paths[2:]:
+            self.assertTrue(jar.startswith(self.cds_dir.as_posix()))
+            self.assertTrue(jar.endswith(".jar"))
+        with zipfile.ZipFile(paths[2]) as z:
+            self.assertEqual(z.read("log4j.properties"), b"log4j.rootLogger=INFO")
+        self.assertIn("org/jnius/NativeInvocationHandler.class", zipfile.ZipFile(paths[3]).namelist())
+
+    def test_directory_jar_named_by_content(self):
+        jar = cds.archivable_class_paths(self.class_paths)[2]
+        self.assertFalse(Path(jar).exists())
+        self.assertEqual(cds.archivable_class_paths(self.class_paths)[2], jar)
+        self.conf_dir.joinpath("log4j.properties").write_text("log4j.rootLogger=DEBUG")
+        self.assertNotEqual(cds.archivable_class_paths(self.class_paths)[2], jar)
+
+    def test_archive_file_keyed_by_class_path(self):
+        paths = cds.archivable_class_paths(self.class_paths)
+        self.assertEqual(cds.archive_file(paths), cds.archive_file(list(paths)))
+        self.assertNotEqual(cds.archive_file(paths), cds.archive_file(paths[1:]))
+        self.assertEqual(cds.archive_file(paths).parent, self.cds_dir)
+
+    def test_configure_jvm(self):
+        # no archive, the classpath is unchanged and no jars are written
+        self.assertEqual(cds.configure_jvm(self.class_paths), (self.class_paths, [], None))
+        self.assertFalse(self.cds_dir.exists())
+
+        paths, options, archive = cds.configure_jvm(self.class_paths, training=True)
+        self.assertEqual(options, [f"-XX:ArchiveClassesAtExit={archive.as_posix()}"])
+        # the directories and the jnius classes are put on the classpath as jars
+        self.assertEqual(len(paths), 4)
+        self.assertTrue(all(Path(p).is_file() and p.endswith(".jar") for p in paths[2:]))
+
+        archive.write_bytes(b"")
+        paths, options, used_archive = cds.configure_jvm(self.class_paths)
+        self.assertEqual(used_archive, archive)
+        self.assertEqual(options, [f"-XX:SharedArchiveFile={archive.as_posix()}", "-Xshare:auto"])
+
+    def test_without_jnius_class_dir(self):
+        import jnius_config
+        class_dir = cds._jnius_class_dir()
+        with mock.patch.object(jnius_config, "get_classpath", return_value=["a.jar", class_dir]):
+            with cds.without_jnius_class_dir():
+                self.assertEqual(jnius_config.get_classpath(), ["a.jar"])
+            self.assertEqual(jnius_config.get_classpath(), ["a.jar", class_dir])
+
+    def test_default_cds_dir(self):
+        with mock.patch.dict(os.environ, {cds.CDS_DIR_ENV: "", "XDG_CACHE_HOME": self.tmp.name}):
+            self.assertEqual(cds.cds_dir(), self.tmp_dir.joinpath("pydbzengine"))
+
+    def test_read_properties_file(self):
+        properties_file = self.tmp_dir.joinpath("engine.properties")
+        properties_file.write_text("# comment\nname=engine\n\n! comment\nsnapshot.mode = initial\nx=a=b\n")
+        self.assertEqual(cds.read_properties_file(properties_file),
+                         {"name": "engine", "snapshot.mode": "initial", "x": "a=b"})
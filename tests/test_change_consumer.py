@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+from typing import List
+
+from fake_events import FakeChangeEvent, FakeRecordCommitter
+
+from pydbzengine import BasePythonChangeHandler, ChangeEvent, PythonChangeConsumer, JavaLangThread, to_payload, \
+    to_bytes, to_memoryview
+# jnius is imported after the JVM is started by pydbzengine, importing it first starts the JVM without the
+# Debezium classpath
+from jnius import autoclass
+
+JavaString = autoclass('java.lang.String')
+
+
+class SlowChangeHandler(BasePythonChangeHandler):
+    def __init__(self, sleep_sec=0.05, fail_on_value=None):
+        self.sleep_sec = sleep_sec
+        self.fail_on_value = fail_on_value
+        self.handled = []
+        self.handler_threads = set()
+
+    def handleJsonBatch(self, records: List[ChangeEvent]):
+        time.sleep(self.sleep_sec)
+        self.handler_threads.add(threading.current_thread().name)
+        for r in records:
+            if r.value() == self.fail_on_value:
+                raise ValueError(f"Failed to process {r.value()}")
+        self.handled.extend(r.value() for r in records)
+
+
+class TestPythonChangeConsumer(unittest.TestCase):
+
+    @staticmethod
+    def batch(*values) -> List[ChangeEvent]:
+        return [FakeChangeEvent(key=None, value=v, destination="testc.inventory.customers") for v in values]
+
+    def tearDown(self):
+        JavaLangThread.interrupted()  # clear the interrupt flag set by failing tests
+
+    def test_synchronous_execution(self):
+        handler = SlowChangeHandler(sleep_sec=0)
+        consumer = PythonChangeConsumer()
+        consumer.set_change_handler(handler)
+        committer = FakeRecordCommitter()
+        consumer.handleBatch(self.batch("1", "2"), committer)
+        self.assertEqual(handler.handled, ["1", "2"])
+        self.assertEqual([r.value() for r in committer.processed], ["1", "2"])
+        self.assertEqual(handler.handler_threads, {threading.current_thread().name})
+
+    def test_pipelined_execution(self):
+        handler = SlowChangeHandler()
+        consumer = PythonChangeConsumer()
+        consumer.set_change_handler(handler)
+        consumer.set_pipelined(max_queued_batches=2)
+        committer = FakeRecordCommitter()
+
+        start = time.perf_counter()
+        consumer.handleBatch(self.batch("1", "2"), committer)
+        # the engine thread is not blocked by the handler
+        self.assertLess(time.perf_counter() - start, handler.sleep_sec)
+        consumer.handleBatch(self.batch("3"), committer)
+        consumer.handleBatch(self.batch("4"), committer)
+        consumer.close()
+
+        self.assertEqual(handler.handled, ["1", "2", "3", "4"])
+        self.assertEqual([r.value() for r in committer.processed], ["1", "2", "3", "4"])
+        self.assertEqual(committer.finished_batches, 3)
+        self.assertEqual(handler.handler_threads, {"pydbzengine-sink-worker"})
+
+    def test_drain(self):
+        handler = SlowChangeHandler(sleep_sec=0.1)
+        consumer = PythonChangeConsumer()
+        consumer.set_change_handler(handler)
+        self.assertTrue(consumer.drain(timeout=0))
+        consumer.set_pipelined(max_queued_batches=2)
+        committer = FakeRecordCommitter()
+        consumer.handleBatch(self.batch("1"), committer)
+        consumer.handleBatch(self.batch("2"), committer)
+        self.assertFalse(consumer.drain(timeout=0.01))
+        self.assertTrue(consumer.drain(timeout=10))
+        self.assertEqual(committer.finished_batches, 2)
+        consumer.close()
+
+    def test_pipelined_execution_stops_committing_after_failure(self):
+        handler = SlowChangeHandler(sleep_sec=0, fail_on_value="2")
+        consumer = PythonChangeConsumer()
+        consumer.set_change_handler(handler)
+        consumer.set_pipelined(max_queued_batches=1)
+        committer = FakeRecordCommitter()
+
+        consumer.handleBatch(self.batch("1"), committer)
+        consumer.handleBatch(self.batch("2"), committer)
+        consumer.handleBatch(self.batch("3"), committer)
+        consumer.close()
+
+        self.assertEqual(handler.handled, ["1"])
+        self.assertEqual([r.value() for r in committer.processed], ["1"])
+        self.assertIsInstance(consumer._worker_error, ValueError)
+
+
+class TestPayloadConversion(unittest.TestCase):
+
+    def test_java_byte_array(self):
+        value = JavaString('{"op": "c"}').getBytes("UTF-8")
+        self.assertEqual(to_payload(value), b'{"op": "c"}')
+        self.assertEqual(to_bytes(value), b'{"op": "c"}')
+        self.assertEqual(to_memoryview(value)[2:4].tobytes(), b'op')
+
+    def test_python_values(self):
+        self.assertEqual(to_payload('{"op": "c"}'), '{"op": "c"}')
+        self.assertEqual(to_bytes('{"op": "é"}'), '{"op": "é"}'.encode("utf-8"))
+        self.assertIsNone(to_payload(None))
+        self.assertIsNone(to_memoryview(None))
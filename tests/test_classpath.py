@@ -0,0 +1,126 @@
+import json
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from pydbzengine.classpath import (LIBS_DIR, build_libs_index_from_jars, load_libs_index, parse_dependency_tree,
+                                   required_artifacts, scoped_class_paths)
+
+DEPENDENCY_TREE = """org.memiiso:pydebezium:jar:1.0-SNAPSHOT
++- io.debezium:debezium-api:jar:3.2.0.Final:compile
++- io.debezium:debezium-embedded:jar:3.2.0.Final:compile
+|  +- org.apache.kafka:connect-runtime:jar:3.9.0:compile
+|  |  \\- org.slf4j:slf4j-api:jar:2.0.16:compile
+|  \\- (io.debezium:debezium-api:jar:3.2.0.Final:compile - omitted for duplicate)
++- io.debezium:debezium-connector-mysql:jar:3.2.0.Final:compile
+|  +- io.debezium:debezium-connector-binlog:jar:3.2.0.Final:compile
+|  |  \\- com.zendesk:mysql-binlog-connector-java:jar:0.31.0:compile
+|  \\- com.mysql:mysql-connector-j:jar:9.1.0:compile
++- io.debezium:debezium-connector-postgres:jar:3.2.0.Final:compile
+|  +- org.postgresql:postgresql:jar:42.7.5:compile
+|  \\- (io.debezium:debezium-connector-binlog:jar:3.2.0.Final:compile - omitted for duplicate)
++- io.debezium:debezium-storage-jdbc:jar:3.2.0.Final:compile
+\\- (org.slf4j:slf4j-api:jar:2.0.16:compile - omitted for duplicate)
+"""
+
+
+def pom(group_id, artifact_id, *dependencies):
+    deps = "".join(f"<dependency><groupId>{d.split(':')[0]}</groupId><artifactId>{d.split(':')[1]}</artifactId>"
+                   f"{''.join(f'<{t}>{v}</{t}>' for t, v in zip(('scope', 'optional'), d.split(':')[2:]) if v)}"
+                   f"</dependency>" for d in dependencies)
+    return (f'<project xmlns="http://maven.apache.org/POM/4.0.0"><groupId>{group_id}</groupId>'
+            f'<artifactId>{artifact_id}</artifactId><dependencies>{deps}</dependencies></project>')
+
+
+def write_jar(libs_dir, name, group_id=None, artifact_id=None, version=None, pom_xml=None):
+    with zipfile.ZipFile(libs_dir.joinpath(name), "w") as zf:
+        if group_id is not None:
+            base = f"META-INF/maven/{group_id}/{artifact_id}/"
+            zf.writestr(base + "pom.properties", f"groupId={group_id}\nartifactId={artifact_id}\nversion={version}\n")
+            zf.writestr(base + "pom.xml", pom_xml)
+
+
+class TestConnectorClasspath(unittest.TestCase):
+
+    def test_parse_dependency_tree(self):
+        index = parse_dependency_tree(DEPENDENCY_TREE.splitlines())
+        self.assertEqual(index["roots"][:3], ["io.debezium:debezium-api", "io.debezium:debezium-embedded",
+                                              "io.debezium:debezium-connector-mysql"])
+        self.assertIn("org.slf4j:slf4j-api", index["roots"])
+        self.assertEqual(index["jars"]["org.postgresql:postgresql"], "postgresql-42.7.5.jar")
+        self.assertEqual(index["dependencies"]["io.debezium:debezium-connector-postgres"],
+                         ["org.postgresql:postgresql", "io.debezium:debezium-connector-binlog"])
+
+    def test_required_artifacts(self):
+        index = parse_dependency_tree(DEPENDENCY_TREE.splitlines())
+        artifacts = required_artifacts({"connector.class": "io.debezium.connector.postgresql.PostgresConnector"}, index)
+        self.assertIn("org.apache.kafka:connect-runtime", artifacts)
+        self.assertIn("org.postgresql:postgresql", artifacts)
+        # shared dependency, omitted as duplicate under the postgres connector
+        self.assertIn("com.zendesk:mysql-binlog-connector-java", artifacts)
+        self.assertNotIn("com.mysql:mysql-connector-j", artifacts)
+        self.assertNotIn("io.debezium:debezium-storage-jdbc", artifacts)
+
+        artifacts = required_artifacts({"connector.class": "io.debezium.connector.postgresql.PostgresConnector",
+                                        "offset.storage": "io.debezium.storage.jdbc.offset.JdbcOffsetBackingStore"},
+                                       index)
+        self.assertIn("io.debezium:debezium-storage-jdbc", artifacts)
+        self.assertIsNone(required_artifacts({"connector.class": "com.example.UnknownConnector"}, index))
+
+    def test_scoped_class_paths(self):
+        index = parse_dependency_tree(DEPENDENCY_TREE.splitlines())
+        with tempfile.TemporaryDirectory() as tmp:
+            index_file = Path(tmp).joinpath("libs_index.json")
+            props = {"connector.class": "io.debezium.connector.mysql.MySqlConnector"}
+            self.assertIsNone(scoped_class_paths(props, libs_dir=Path(tmp), index_file=index_file))
+            index_file.write_text(json.dumps(index))
+            paths = scoped_class_paths(props, libs_dir=Path(tmp), index_file=index_file)
+        self.assertIn(Path(tmp).joinpath("mysql-connector-j-9.1.0.jar").as_posix(), paths)
+        self.assertNotIn(Path(tmp).joinpath("postgresql-42.7.5.jar").as_posix(), paths)
+
+    def test_build_libs_index_from_jars(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            libs_dir = Path(tmp)
+            pom_file = libs_dir.joinpath("pom.xml")
+            pom_file.write_text(pom("org.memiiso", "pydebezium", "io.debezium:debezium-embedded",
+                                    "io.debezium:debezium-connector-mysql", "io.debezium:debezium-connector-postgres",
+                                    "junit:junit:test"))
+            write_jar(libs_dir, "debezium-embedded-3.2.0.Final.jar", "io.debezium", "debezium-embedded",
+                      "3.2.0.Final", pom("io.debezium", "debezium-embedded", "org.apache.kafka:connect-runtime"))
+            # built without Maven metadata, its dependencies are unknown
+            write_jar(libs_dir, "connect-runtime-3.9.0.jar")
+            write_jar(libs_dir, "lz4-java-1.8.0.jar")
+            write_jar(libs_dir, "debezium-connector-mysql-3.2.0.Final.jar", "io.debezium", "debezium-connector-mysql",
+                      "3.2.0.Final", pom("io.debezium", "debezium-connector-mysql", "com.mysql:mysql-connector-j",
+                                         "org.lz4:lz4-java::true"))
+            write_jar(libs_dir, "mysql-connector-j-9.1.0.jar", "com.mysql", "mysql-connector-j", "9.1.0",
+                      pom("com.mysql", "mysql-connector-j"))
+            write_jar(libs_dir, "debezium-connector-postgres-3.2.0.Final.jar", "io.debezium",
+                      "debezium-connector-postgres", "3.2.0.Final",
+                      pom("io.debezium", "debezium-connector-postgres", "org.postgresql:postgresql"))
+            write_jar(libs_dir, "postgresql-42.7.5.jar", "org.postgresql", "postgresql", "42.7.5",
+                      pom("org.postgresql", "postgresql"))
+            index = build_libs_index_from_jars(libs_dir=libs_dir, pom_file=pom_file)
+
+        self.assertEqual(index["roots"], ["io.debezium:debezium-embedded", "io.debezium:debezium-connector-mysql",
+                                          "io.debezium:debezium-connector-postgres"])
+        self.assertEqual(index["jars"]["org.apache.kafka:connect-runtime"], "connect-runtime-3.9.0.jar")
+        self.assertEqual(index["dependencies"]["io.debezium:debezium-embedded"], ["org.apache.kafka:connect-runtime"])
+        # optional dependency, not declared
+        self.assertEqual(index["dependencies"]["io.debezium:debezium-connector-mysql"], ["com.mysql:mysql-connector-j"])
+
+        artifacts = required_artifacts({"connector.class": "io.debezium.connector.postgresql.PostgresConnector"}, index)
+        self.assertIn("org.postgresql:postgresql", artifacts)
+        self.assertNotIn("com.mysql:mysql-connector-j", artifacts)
+        # jars which aren't dependencies of an unused connector are kept
+        self.assertIn("lz4-java-1.8.0.jar", artifacts)
+
+    def test_bundled_libs_index(self):
+        index = load_libs_index()
+        self.assertIsNotNone(index)
+        self.assertEqual(sorted(index["jars"].values()), sorted(p.name for p in LIBS_DIR.glob("*.jar")))
+        artifacts = required_artifacts({"connector.class": "io.debezium.connector.postgresql.PostgresConnector"}, index)
+        self.assertIn("io.debezium:debezium-embedded", artifacts)
+        self.assertIn("org.postgresql:postgresql", artifacts)
+        self.assertNotIn("com.mysql:mysql-connector-j", artifacts)
@@ -0,0 +1,57 @@
+import unittest
+
+from fake_events import FakeChangeEvent, FakeRecordCommitter
+from pydbzengine import CommitStrategy
+
+
+class SourceRecord:
+    def __init__(self, source_partition: str):
+        self._source_partition = source_partition
+
+    def sourcePartition(self):
+        return self
+
+    def toString(self):
+        return self._source_partition
+
+
+class PartitionedChangeEvent(FakeChangeEvent):
+    def __init__(self, value, source_partition):
+        super().__init__(key=None, value=value, destination="testc.inventory.customers")
+        self._source_record = SourceRecord(source_partition)
+
+    def sourceRecord(self):
+        return self._source_record
+
+
+class TestCommitStrategy(unittest.TestCase):
+    RECORDS = [
+        PartitionedChangeEvent("1", "{server=testc, database=db1}"),
+        PartitionedChangeEvent("2", "{server=testc, database=db2}"),
+        PartitionedChangeEvent("3", "{server=testc, database=db1}"),
+        PartitionedChangeEvent("4", "{server=testc, database=db1}"),
+    ]
+
+    def commit(self, commit_strategy: CommitStrategy) -> FakeRecordCommitter:
+        committer = FakeRecordCommitter()
+        commit_strategy.commit(records=self.RECORDS, committer=committer)
+        self.assertEqual(committer.finished_batches, 1)
+        return committer
+
+    def test_per_record(self):
+        committer = self.commit(CommitStrategy.PER_RECORD)
+        self.assertEqual([r.value() for r in committer.processed], ["1", "2", "3", "4"])
+
+    def test_last_per_partition(self):
+        committer = self.commit(CommitStrategy.LAST_PER_PARTITION)
+        self.assertEqual([r.value() for r in committer.processed], ["2", "4"])
+
+    def test_last_record(self):
+        committer = self.commit(CommitStrategy.LAST_RECORD)
+        self.assertEqual([r.value() for r in committer.processed], ["4"])
+
+    def test_empty_batch(self):
+        committer = FakeRecordCommitter()
+        CommitStrategy.LAST_RECORD.commit(records=[], committer=committer)
+        self.assertEqual(committer.processed, [])
+        self.assertEqual(committer.finished_batches, 1)
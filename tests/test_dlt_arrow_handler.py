@@ -0,0 +1,185 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import dlt
+import pyarrow as pa
+
+from fake_events import FakeChangeEvent, debezium_event
+from pydbzengine.handlers.dlt import DltChangeHandler, collapse_changes, json_values_to_arrow
+
+
+def event(destination: str, id: int, op: str = "c", **row):
+    return FakeChangeEvent(json.dumps({"id": id}), debezium_event(op, after={"id": id, **row}), destination)
+
+
+class TestJsonValuesToArrow(unittest.TestCase):
+
+    def test_flattened_columns(self):
+        table = json_values_to_arrow([debezium_event("c", after={"id": 1, "address": {"city": "Hanoi"}}),
+                                      debezium_event("c", after={"id": 2, "address": None}).encode()])
+        self.assertIn("after__address__city", table.column_names)
+        self.assertEqual(table["after__id"].to_pylist(), [1, 2])
+        self.assertEqual(table["after__address__city"].to_pylist(), ["Hanoi", None])
+        # `before` is null in all events
+        self.assertNotIn("before", table.column_names)
+
+    def test_type_inference(self):
+        # the types are inferred from all events, numbers are promoted
+        values = [json.dumps({"v": 1})] * 100000 + [json.dumps({"v": 1.5})]
+        self.assertEqual(json_values_to_arrow(values)["v"].type, pa.float64())
+        with self.assertRaises(pa.ArrowInvalid):
+            json_values_to_arrow([json.dumps({"v": 1}), json.dumps({"v": "a"})])
+
+
+class TestDltArrowChangeHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        tmp = Path(self.tmp_dir.name)
+        self.pipeline = dlt.pipeline(pipeline_name="dbz_arrow_test", pipelines_dir=str(tmp.joinpath("pipelines")),
+                                     destination=dlt.destinations.duckdb(str(tmp.joinpath("test.duckdb"))),
+                                     dataset_name="dbz_data")
+        self.runs = 0
+        run = self.pipeline.run
+
+        def counting_run(*args, **kwargs):
+            self.runs += 1
+            return run(*args, **kwargs)
+
+        self.pipeline.run = counting_run
+
+    def query(self, sql: str) -> list:
+        with self.pipeline.sql_client() as client:
+            return client.execute_sql(sql)
+
+    def test_arrow_per_batch(self):
+        handler = DltChangeHandler(dlt_pipeline=self.pipeline, arrow=True)
+        handler.handleJsonBatch([event("t.inventory.a", 1, name="x"), event("t.inventory.b", 2),
+                                 FakeChangeEvent('{"id": 1}', None, "t.inventory.a")])
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(self.query("select after__id, after__name, op from t_inventory_a"), [(1, "x", "c")])
+        self.assertEqual(self.query("select count(*) from t_inventory_b"), [(1,)])
+
+    def test_type_conflict_loaded_without_arrow(self):
+        handler = DltChangeHandler(dlt_pipeline=self.pipeline, arrow=True)
+        with self.assertLogs(DltChangeHandler.LOGGER_NAME, level="WARNING"):
+            handler.handleJsonBatch([event("t.a", 1, v=1), event("t.a", 2, v="a")])
+        self.assertEqual(self.query("select count(*) from t_a"), [(2,)])
+
+    def test_same_columns_as_json_mode(self):
+        DltChangeHandler(dlt_pipeline=self.pipeline, arrow=True).handleJsonBatch([event("t.arrow", 1, name="x")])
+        DltChangeHandler(dlt_pipeline=self.pipeline).handleJsonBatch([event("t.json", 1, name="x")])
+        columns = {table: {c[0] for c in self.query(
+            f"select column_name from information_schema.columns where table_name = '{table}' "
+            f"and column_name not like '_dlt%'")} for table in ("t_arrow", "t_json")}
+        self.assertEqual(columns["t_arrow"], columns["t_json"])
+
+    def test_rows_threshold(self):
+        handler = DltChangeHandler(dlt_pipeline=self.pipeline, arrow=True, flush_max_rows=5)
+        durable = []
+        self.assertTrue(handler.set_commit_listener(durable.append))
+        for i in range(4):
+            handler.handleJsonBatch([event("t.a", 2 * i), event("t.b", 2 * i + 1)])
+        # loaded once after the third batch, the fourth is still buffered
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(durable, [3])
+        self.assertEqual(self.query("select count(*) from t_a"), [(3,)])
+        handler.close()
+        self.assertEqual(self.runs, 2)
+        self.assertEqual(durable, [3, 4])
+        self.assertEqual(self.query("select count(*) from t_a"), [(4,)])
+
+    def test_json_mode_buffered(self):
+        handler = DltChangeHandler(dlt_pipeline=self.pipeline, flush_max_bytes=1)
+        handler.handleJsonBatch([event("t.a", 1), event("t.a", 2)])
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(self.query("select count(*) from t_a"), [(2,)])
+
+    def test_age_threshold(self):
+        handler = DltChangeHandler(dlt_pipeline=self.pipeline, arrow=True, flush_max_age_sec=0.2)
+        self.addCleanup(handler.close)
+        durable = []
+        handler.set_commit_listener(durable.append)
+        handler.handleJsonBatch([event("t.a", 1)])
+        deadline = time.monotonic() + 10
+        while not durable and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(durable, [1])
+        self.assertEqual(self.query("select count(*) from t_a"), [(1,)])
+
+    def test_commit_listener_requires_buffering(self):
+        self.assertFalse(DltChangeHandler(dlt_pipeline=self.pipeline, arrow=True).set_commit_listener(print))
+        with self.assertRaises(ValueError):
+            DltChangeHandler(dlt_pipeline=self.pipeline, flush_max_rows=-1)
+
+
+
+class TestDltMergeChangeHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        tmp = Path(self.tmp_dir.name)
+        self.pipeline = dlt.pipeline(pipeline_name="dbz_merge_test", pipelines_dir=str(tmp.joinpath("pipelines")),
+                                     destination=dlt.destinations.duckdb(str(tmp.joinpath("test.duckdb"))),
+                                     dataset_name="dbz_data")
+
+    def query(self, sql: str) -> list:
+        with self.pipeline.sql_client() as client:
+            return client.execute_sql(sql)
+
+    def test_collapse_changes(self):
+        keys = ['{"id": 1}', '{"id": 2}', '{"id": 1}', '{"id": 2}', '{"id": 2}']
+        values = [debezium_event("c", after={"id": 1, "name": "a"}),
+                  debezium_event("c", after={"id": 2, "name": "b"}),
+                  debezium_event("u", before={"id": 1, "name": "a"}, after={"id": 1, "name": "c"}),
+                  debezium_event("d", before={"id": 2, "name": "b"}),
+                  None]
+        primary_key, rows = collapse_changes(keys, values)
+        self.assertEqual(primary_key, ["id"])
+        self.assertEqual(rows, [{"id": 1, "name": "c", "_dbz_deleted": False, "_dbz_op": "u",
+                                 "_dbz_ts_ms": 1700000000000},
+                                {"id": 2, "_dbz_deleted": True}])
+
+    def test_collapse_unwrapped_and_keyless(self):
+        schema_key = json.dumps({"schema": {"type": "struct"}, "payload": {"id": 1}})
+        primary_key, rows = collapse_changes([schema_key, schema_key],
+                                             ['{"id": 1, "name": "a"}', '{"id": 1, "__deleted": "true"}'])
+        self.assertEqual(rows, [{"id": 1, "_dbz_deleted": True}])
+        primary_key, rows = collapse_changes([None, None], [debezium_event("c", after={"v": 1}),
+                                                            debezium_event("d", before={"v": 1})])
+        self.assertIsNone(primary_key)
+        self.assertEqual([row["v"] for row in rows], [1])
+
+    def test_invalid_write_disposition(self):
+        with self.assertRaises(ValueError):
+            DltChangeHandler(dlt_pipeline=self.pipeline, write_disposition="replace")
+
+    def assert_merged(self, **handler_args):
+        handler = DltChangeHandler(dlt_pipeline=self.pipeline, write_disposition="merge", **handler_args)
+        handler.handleJsonBatch([event("t.a", 1, name="a"), event("t.a", 2, name="b"), event("t.a", 3, name="c")])
+        handler.handleJsonBatch([
+            FakeChangeEvent('{"id": 1}', debezium_event("u", after={"id": 1, "name": "a2"}), "t.a"),
+            FakeChangeEvent('{"id": 1}', debezium_event("u", after={"id": 1, "name": "a3"}), "t.a"),
+            FakeChangeEvent('{"id": 2}', debezium_event("d", before={"id": 2, "name": "b"}), "t.a"),
+            FakeChangeEvent('{"id": 2}', None, "t.a"),
+            event("t.a", 4, name="d"),
+        ])
+        handler.handleJsonBatch([FakeChangeEvent('{"id": 3}', None, "t.a")])
+        handler.close()
+        self.assertEqual(self.query("select id, name, _dbz_op from t_a order by id"),
+                         [(1, "a3", "u"), (4, "d", "c")])
+
+    def test_merge(self):
+        self.assert_merged()
+
+    def test_merge_arrow_buffered(self):
+        self.assert_merged(arrow=True, flush_max_rows=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
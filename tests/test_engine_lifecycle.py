@@ -0,0 +1,169 @@
+import threading
+import time
+import unittest
+from typing import List
+
+from fake_events import FakeChangeEvent, FakeRecordCommitter
+from pydbzengine import BasePythonChangeHandler, ChangeEvent, DebeziumJsonEngine, EngineCompletion, JavaLangThread
+from pydbzengine.helper import Utils
+
+
+class FakeDebeziumEngine:
+    """
+    Mimics the Java engine: delivers a batch to the consumer, blocks until it's closed, then reports the outcome.
+    """
+
+    def __init__(self, consumer, completion_callback, error=None):
+        self.consumer = consumer
+        self.completion_callback = completion_callback
+        self.error = error
+        self.closed = threading.Event()
+        self.committer = FakeRecordCommitter()
+
+    def run(self):
+        self.consumer.handleBatch([FakeChangeEvent('{"id": 1}', '{"op": "c"}', "t.a")], self.committer)
+        if self.error is None:
+            self.closed.wait()
+        self.completion_callback.handle(self.error is None, "Connector stopped" if self.error is None else "Failed",
+                                        None)
+
+    def close(self):
+        self.closed.set()
+
+
+class PollingDebeziumEngine(FakeDebeziumEngine):
+    """
+    Keeps delivering batches until it's closed, like the Java engine under load.
+    """
+
+    def run(self):
+        i = 0
+        while not self.closed.is_set():
+            i += 1
+            self.consumer.handleBatch([FakeChangeEvent(f'{{"id": {i}}}', str(i), "t.a")], self.committer)
+        self.completion_callback.handle(True, "Connector stopped", None)
+
+
+class FakeJsonEngine(DebeziumJsonEngine):
+    error = None
+
+    def __init__(self, **kwargs):
+        super().__init__(engine_format="fake", **kwargs)  # the format classes require the Debezium jars
+
+    def _build_engine(self):
+        return FakeDebeziumEngine(self.consumer, self._completion_callback, error=self.error)
+
+
+class FailingJsonEngine(FakeJsonEngine):
+    error = "connector failed"
+
+
+class PollingJsonEngine(FakeJsonEngine):
+    def _build_engine(self):
+        return PollingDebeziumEngine(self.consumer, self._completion_callback)
+
+
+class ClosingHandler(BasePythonChangeHandler):
+    def __init__(self):
+        self.handled = []
+        self.closed = threading.Event()
+
+    def handleJsonBatch(self, records: List[ChangeEvent]):
+        self.handled.extend(r.value() for r in records)
+
+    def close(self):
+        self.closed.set()
+
+
+class SlowHandler(ClosingHandler):
+    def handleJsonBatch(self, records: List[ChangeEvent]):
+        time.sleep(0.01)
+        super().handleJsonBatch(records)
+
+
+class TestEngineLifecycle(unittest.TestCase):
+
+    def test_start_and_stop(self):
+        handler = ClosingHandler()
+        completions = []
+        engine = FakeJsonEngine(properties={"name": "test"}, handler=handler, completion_callback=completions.append)
+        future = engine.start()
+        with self.assertRaises(RuntimeError):
+            engine.start()
+        while not handler.handled:
+            time.sleep(0.01)
+        self.assertFalse(future.done())
+        self.assertTrue(engine.stop(timeout=10))
+        self.assertTrue(handler.closed.is_set())
+        self.assertEqual(future.result(timeout=0), EngineCompletion(success=True, message="Connector stopped"))
+        self.assertEqual(completions, [engine.completion])
+        self.assertEqual(len(engine.engine.committer.processed), 1)
+
+    def test_stop_while_the_engine_delivers_batches(self):
+        handler = SlowHandler()
+        engine = PollingJsonEngine(properties={"name": "test"}, handler=handler, max_queued_batches=2)
+        future = engine.start()
+        while len(handler.handled) < 5:
+            time.sleep(0.01)
+        self.assertTrue(engine.stop(timeout=10))
+        self.assertTrue(future.result(timeout=0).success)
+        # the batches handled before the stop are acknowledged, the batches delivered after it are dropped
+        self.assertEqual([r.value() for r in engine.engine.committer.processed], handler.handled)
+
+    def test_failed_engine(self):
+        engine = FailingJsonEngine(properties={"name": "test"}, handler=ClosingHandler())
+        with self.assertRaisesRegex(RuntimeError, "Debezium engine failed: Failed"):
+            engine.start().result(timeout=10)
+        self.assertFalse(engine.completion.success)
+
+    def test_context_manager(self):
+        handler = ClosingHandler()
+        with FakeJsonEngine(properties={"name": "test"}, handler=handler) as engine:
+            self.assertIsNotNone(engine._future)
+        self.assertTrue(handler.closed.is_set())
+        self.assertTrue(engine._future.done())
+
+    def test_stop_before_start(self):
+        engine = FakeJsonEngine(properties={"name": "test"}, handler=ClosingHandler())
+        self.assertTrue(engine.stop(timeout=10))
+
+    def test_run_engine_async_off_the_main_thread(self):
+        handler = ClosingHandler()
+        engine = FakeJsonEngine(properties={"name": "test"}, handler=handler)
+        thread = threading.Thread(target=Utils.run_engine_async, args=(engine, 0.2))
+        thread.start()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+        # the engine was stopped, not left running
+        self.assertTrue(handler.closed.is_set())
+        self.assertTrue(engine._future.done())
+
+
+class TestInterrupt(unittest.TestCase):
+
+    def test_consumer_interrupts_the_engine_thread(self):
+        engine = FakeJsonEngine(properties={"name": "test"}, handler=ClosingHandler())
+        consumer = engine.consumer
+        delivered = threading.Event()
+        release = threading.Event()
+        interrupted = []
+
+        def engine_thread():
+            consumer.handleBatch([FakeChangeEvent(None, "1", "t.a")], FakeRecordCommitter())
+            delivered.set()
+            release.wait()
+            interrupted.append(JavaLangThread.interrupted())
+
+        thread = threading.Thread(target=engine_thread)
+        thread.start()
+        delivered.wait(10)
+        engine.interrupt()
+        release.set()
+        thread.join(10)
+        self.assertEqual(interrupted, [True])
+        # the thread calling interrupt isn't interrupted
+        self.assertFalse(JavaLangThread.interrupted())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+from fake_events import FakeChangeEvent, FakeRecordCommitter
+
+from pydbzengine import BasePythonChangeHandler, ChangeEvent, PythonChangeConsumer, JavaLangThread
+from pydbzengine.errors import ErrorPolicy, FileDeadLetterHandler, read_dead_letters
+from pydbzengine.metrics import InMemoryMetricsSink, DEAD_LETTER_RECORDS, HANDLER_BATCH_RETRIES
+
+
+class PoisonChangeHandler(BasePythonChangeHandler):
+    """
+    Fails on batches containing a poison value, and on the first `transient_failures` batches.
+    """
+
+    def __init__(self, poison=None, transient_failures=0):
+        self.poison = poison
+        self.transient_failures = transient_failures
+        self.calls = 0
+        self.handled = []
+
+    def handleJsonBatch(self, records: List[ChangeEvent]):
+        self.calls += 1
+        if self.calls <= self.transient_failures:
+            raise ConnectionError("destination unavailable")
+        if any(r.value() == self.poison for r in records):
+            raise ValueError("poison record")
+        self.handled.extend(r.value() for r in records)
+
+
+class TestErrorPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dead_letter_path = Path(self.tmpdir.name) / "dead-letters.jsonl"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        JavaLangThread.interrupted()  # clear the interrupt flag set by failing tests
+
+    @staticmethod
+    def batch(*values) -> List[ChangeEvent]:
+        return [FakeChangeEvent(key=f'{{"id": {i}}}', value=v, destination="testc.inventory.customers")
+                for i, v in enumerate(values)]
+
+    def consume(self, handler, policy, records, sink=None) -> FakeRecordCommitter:
+        consumer = PythonChangeConsumer()
+        consumer.set_change_handler(handler)
+        consumer.set_metrics_sink(sink)
+        consumer.set_error_policy(policy)
+        committer = FakeRecordCommitter()
+        consumer.handleBatch(records, committer)
+        consumer.close()
+        return committer
+
+    def test_retries_transient_failures(self):
+        handler = PoisonChangeHandler(transient_failures=2)
+        sink = InMemoryMetricsSink()
+        committer = self.consume(handler, ErrorPolicy(max_retries=2, retry_backoff_sec=0), self.batch("1", "2"), sink)
+        self.assertEqual(handler.handled, ["1", "2"])
+        self.assertEqual(len(committer.processed), 2)
+        self.assertEqual(sink.counter(HANDLER_BATCH_RETRIES), 2)
+
+    def test_bisects_poison_records_to_dead_letters(self):
+        handler = PoisonChangeHandler(poison=None)
+        sink = InMemoryMetricsSink()
+        policy = ErrorPolicy(max_retries=1, retry_backoff_sec=0,
+                             dead_letter_handler=FileDeadLetterHandler(self.dead_letter_path))
+        records = self.batch("1", "2", None, "4", "5", None, "7")
+        committer = self.consume(handler, policy, records, sink)
+
+        # the healthy records are handled in order and the whole batch is acknowledged
+        self.assertEqual(handler.handled, ["1", "2", "4", "5", "7"])
+        self.assertEqual(len(committer.processed), 7)
+        self.assertEqual(committer.finished_batches, 1)
+
+        letters = list(read_dead_letters(self.dead_letter_path))
+        self.assertEqual([letter.record.key() for letter in letters], ['{"id": 2}', '{"id": 5}'])
+        self.assertTrue(all(letter.record.value() is None for letter in letters))
+        self.assertEqual(letters[0].record.destination(), "testc.inventory.customers")
+        self.assertEqual(letters[0].error, "ValueError: poison record")
+        self.assertEqual(policy.dead_letters, 2)
+        self.assertEqual(sink.counter(DEAD_LETTER_RECORDS, destination="testc.inventory.customers"), 2)
+
+    def test_dead_letters_whole_batch_without_bisect(self):
+        handler = PoisonChangeHandler(poison="2")
+        policy = ErrorPolicy(max_retries=0, bisect=False,
+                             dead_letter_handler=FileDeadLetterHandler(self.dead_letter_path))
+        committer = self.consume(handler, policy, self.batch("1", "2", "3"))
+        self.assertEqual(handler.handled, [])
+        self.assertEqual(len(committer.processed), 3)
+        self.assertEqual([letter.record.value() for letter in read_dead_letters(self.dead_letter_path)],
+                         ["1", "2", "3"])
+
+    def test_binary_dead_letters(self):
+        handler = FileDeadLetterHandler(self.dead_letter_path)
+        handler.handle([FakeChangeEvent(key=b"\x00\x01", value=b"\xff", destination="t", partition=3)],
+                       ValueError("bad"))
+        handler.close()
+        letter, = read_dead_letters(self.dead_letter_path)
+        self.assertEqual((letter.record.key(), letter.record.value(), letter.record.partition()),
+                         (b"\x00\x01", b"\xff", 3))
+
+    def test_stops_without_dead_letter_handler(self):
+        handler = PoisonChangeHandler(poison="2")
+        committer = self.consume(handler, ErrorPolicy(max_retries=1, retry_backoff_sec=0), self.batch("1", "2"))
+        self.assertEqual(handler.calls, 2)
+        self.assertEqual(committer.processed, [])
+        self.assertTrue(JavaLangThread.interrupted())
+
+    def test_stops_after_max_dead_letters(self):
+        handler = PoisonChangeHandler(poison="2")
+        policy = ErrorPolicy(max_retries=0, max_dead_letters=1,
+                             dead_letter_handler=FileDeadLetterHandler(self.dead_letter_path))
+        committer = self.consume(handler, policy, self.batch("1", "2", "2"))
+        self.assertEqual(committer.processed, [])
+        self.assertEqual(len(list(read_dead_letters(self.dead_letter_path))), 1)
+
+    def test_stops_when_the_handler_fails_longer_than_the_retries(self):
+        handler = PoisonChangeHandler(transient_failures=100)
+        policy = ErrorPolicy(max_retries=2, retry_backoff_sec=0,
+                             dead_letter_handler=FileDeadLetterHandler(self.dead_letter_path))
+        committer = self.consume(handler, policy, self.batch("1", "2", "3", "4"))
+        self.assertEqual(committer.processed, [])
+        self.assertTrue(JavaLangThread.interrupted())
+        self.assertFalse(self.dead_letter_path.exists())
+
+    def test_empty_batch_failure(self):
+        handler = PoisonChangeHandler(transient_failures=10)
+        policy = ErrorPolicy(max_retries=0, dead_letter_handler=FileDeadLetterHandler(self.dead_letter_path))
+        committer = self.consume(handler, policy, [])
+        self.assertEqual(handler.calls, 1)
+        self.assertEqual(committer.finished_batches, 1)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            ErrorPolicy(max_retries=-1)
@@ -0,0 +1,108 @@
+import datetime
+import json
+import unittest
+import uuid
+
+import pyarrow as pa
+
+from catalog_sql import LocalSqlCatalog
+from fake_events import FakeChangeEvent, debezium_event
+from pydbzengine.handlers.envelope import split_envelope, envelope_columns, uuid5_array
+from pydbzengine.handlers.iceberg import IcebergChangeHandler
+
+
+def compact(document: dict) -> str:
+    return json.dumps(document, separators=(",", ":"), ensure_ascii=False)
+
+
+ROW = {"id": 1, "name": 'a "quoted" {brace} [bracket] \\ ü', "tags": [1, {"x": None}], "before": "after"}
+ENVELOPE = {
+    "before": None,
+    "after": ROW,
+    "source": {"connector": "postgresql", "table": "customers", "sequence": "[null,\"1\"]"},
+    "transaction": None,
+    "op": "c",
+    "ts_ms": 1700000000000,
+    "ts_us": 1700000000000001,
+    "ts_ns": 1700000000000000002,
+}
+
+
+class TestEnvelope(unittest.TestCase):
+
+    def test_split_envelope(self):
+        fields = split_envelope(' { "a" : {"x":"}{[","y":[1,{"z":null}]} , "b":"q\\"}", "c":-1.5e3,"d":null, '
+                                '"e":[], "f":{} } ')
+        self.assertEqual(fields, {"a": '{"x":"}{[","y":[1,{"z":null}]}', "b": '"q\\"}"', "c": "-1.5e3",
+                                  "d": "null", "e": "[]", "f": "{}"})
+        self.assertEqual(split_envelope("{}"), {})
+        with self.assertRaises(ValueError):
+            split_envelope('{"a":{"b":1}')
+        with self.assertRaises(ValueError):
+            split_envelope('["a"]')
+
+    def assert_envelope_columns(self, values, expected):
+        columns = envelope_columns(pa.array(values, type=pa.string()))
+        for name, column in columns.items():
+            actual = column.to_pylist()
+            if name in ("before", "after", "source"):
+                actual = [json.loads(v) if v is not None else None for v in actual]
+            self.assertEqual(actual, [e.get(name) if e is not None else None for e in expected], name)
+
+    def test_envelope_columns(self):
+        update = {**ENVELOPE, "before": ROW, "op": "u"}
+        without_ts = {k: v for k, v in ENVELOPE.items() if k not in ("ts_us", "ts_ns", "transaction")}
+        deep = {**ENVELOPE, "after": {"a": {"b": {"c": {"d": 1}}}}}
+        values = [compact(ENVELOPE), compact(update), compact(without_ts), compact(deep),
+                  # not compact, and a different field order, split one by one
+                  json.dumps(ENVELOPE), compact(dict(reversed(list(ENVELOPE.items())))),
+                  None]
+        expected = [ENVELOPE, update, without_ts, deep, ENVELOPE, ENVELOPE, None]
+        self.assert_envelope_columns(values, expected)
+
+    def test_raw_documents_kept(self):
+        value = compact(ENVELOPE)
+        columns = envelope_columns(pa.array([value]))
+        self.assertEqual(columns["after"][0].as_py(), compact(ROW))
+        self.assertEqual(columns["before"][0].as_py(), None)
+
+    def test_uuid5_array(self):
+        keys = ['{"id":1}', None, "", "ü"]
+        array = uuid5_array(keys)
+        self.assertEqual(array.to_pylist(), [uuid.uuid5(uuid.NAMESPACE_DNS, '{"id":1}').bytes, None, None,
+                                             uuid.uuid5(uuid.NAMESPACE_DNS, "ü").bytes])
+        self.assertEqual(uuid5_array(keys, type=pa.uuid()).type, pa.uuid())
+
+
+class TestIcebergVectorizedConversion(unittest.TestCase):
+    RECORDS = [
+        FakeChangeEvent('{"id":1}', debezium_event("c", after={"id": 1, "name": "ü {x}"}), "t.a"),
+        FakeChangeEvent('{"id":1}', debezium_event("u", before={"id": 1}, after={"id": 1, "name": "y"}), "t.a"),
+        FakeChangeEvent(None, compact(ENVELOPE), "t.a"),
+        FakeChangeEvent('{"id":1}'.encode("utf-8"), compact({**ENVELOPE, "op": "d"}).encode("utf-8"), "t.a"),
+    ]
+
+    def test_same_as_row_conversion(self):
+        handler = IcebergChangeHandler(catalog=None, destination_namespace=("ns",))
+        consumed_at = datetime.datetime.now(datetime.timezone.utc)
+        vectorized = handler._records_to_arrow_table(records=self.RECORDS, consumed_at=consumed_at)
+        rows = pa.Table.from_pylist([handler._transform_event_to_row_dict(record=r, consumed_at=consumed_at)
+                                     for r in self.RECORDS], schema=handler._target_arrow_schema)
+        self.assertEqual(vectorized.schema, rows.schema)
+        for name in vectorized.column_names:
+            actual, expected = vectorized.column(name).to_pylist(), rows.column(name).to_pylist()
+            if name in ("before", "after", "source"):
+                actual = [json.loads(v) if v is not None else None for v in actual]
+                expected = [json.loads(v) if v is not None else None for v in expected]
+            self.assertEqual(actual, expected, name)
+
+    def test_append(self):
+        local = LocalSqlCatalog()
+        self.addCleanup(local.cleanup)
+        for vectorized in (True, False):
+            handler = IcebergChangeHandler(catalog=local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE,
+                                           vectorized=vectorized)
+            handler.handleJsonBatch(self.RECORDS)
+        table = local.catalog.load_table(LocalSqlCatalog.NAMESPACE + ("t_a",)).scan().to_arrow()
+        self.assertEqual(table.num_rows, 8)
+        self.assertEqual(table.column("op").to_pylist(), ["c", "u", "c", "d"] * 2)
@@ -0,0 +1,102 @@
+import datetime
+import json
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from catalog_sql import LocalSqlCatalog
+from fake_events import FakeChangeEvent, debezium_event
+from pydbzengine.handlers.iceberg import IcebergChangeHandler
+from pydbzengine.handlers.iceberg_maintenance import IcebergTableMaintenance
+
+TABLE = LocalSqlCatalog.NAMESPACE + ("t_a",)
+
+
+def batch(start: int, size: int = 10):
+    return [FakeChangeEvent(json.dumps({"id": i}), debezium_event("c", after={"id": i}), "t.a")
+            for i in range(start, start + size)]
+
+
+class TestIcebergTableMaintenance(unittest.TestCase):
+
+    def setUp(self):
+        self.local = LocalSqlCatalog()
+        self.addCleanup(self.local.cleanup)
+        self.handler = IcebergChangeHandler(catalog=self.local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE)
+        for b in range(8):
+            self.handler.handleJsonBatch(batch(b * 10))
+
+    def load_table(self):
+        return self.local.catalog.load_table(TABLE)
+
+    def maintenance(self, **kwargs) -> IcebergTableMaintenance:
+        return IcebergTableMaintenance(catalog=self.local.catalog, namespace=LocalSqlCatalog.NAMESPACE, **kwargs)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            self.maintenance(min_input_files=1)
+
+    def test_compaction(self):
+        [result] = self.maintenance(max_manifests=1000, snapshot_max_age=datetime.timedelta(days=1)).run_once()
+        self.assertIsNone(result.error)
+        self.assertEqual((result.compacted_partitions, result.rewritten_files, result.added_files), (1, 8, 1))
+        table = self.load_table()
+        self.assertEqual(len(list(table.scan().plan_files())), 1)
+        self.assertEqual(sorted(json.loads(r)["id"] for r in table.scan().to_arrow().column("after").to_pylist()),
+                         list(range(80)))
+        self.assertEqual(table.current_snapshot().summary["pydbzengine.maintenance"], "compaction")
+
+    def test_compaction_without_the_pyiceberg_internals(self):
+        with mock.patch("pydbzengine.handlers.iceberg_maintenance.ArrowScan", None):
+            [result] = self.maintenance().run_once()
+        self.assertIn("Compaction isn't supported with pyiceberg", result.error)
+        self.assertEqual(len(list(self.load_table().scan().plan_files())), 8)
+
+    def test_not_enough_small_files(self):
+        [result] = self.maintenance(min_input_files=20, max_manifests=1000).run_once()
+        self.assertEqual(result.rewritten_files, 0)
+        self.assertEqual(len(list(self.load_table().scan().plan_files())), 8)
+
+    def test_merge_manifests(self):
+        [result] = self.maintenance(min_input_files=20, max_manifests=4).run_once()
+        self.assertEqual(result.manifests_before, 8)
+        self.assertLess(result.manifests_after, 8)
+        table = self.load_table()
+        self.assertEqual(table.scan().to_arrow().num_rows, 80)
+        # the merge settings are not kept in the table properties
+        self.assertNotIn("commit.manifest-merge.enabled", table.properties)
+
+    def test_expire_snapshots_and_files(self):
+        warehouse = Path(self.local.tmp_dir.name)
+        parquet_files = set(warehouse.rglob("*.parquet"))
+        [result] = self.maintenance(snapshot_max_age=datetime.timedelta(0), min_snapshots_to_keep=1).run_once()
+        self.assertIsNone(result.error)
+        table = self.load_table()
+        self.assertEqual(len(table.metadata.snapshots), 1)
+        self.assertEqual(result.expired_snapshots, 8)
+        # the compacted files were referenced only by the expired snapshots
+        remaining = set(warehouse.rglob("*.parquet"))
+        self.assertTrue(parquet_files.isdisjoint(remaining))
+        self.assertEqual(table.scan().to_arrow().num_rows, 80)
+
+    def test_ingestion_after_maintenance(self):
+        # the handler caches the table, its snapshot is expired by the maintenance
+        self.maintenance(snapshot_max_age=datetime.timedelta(0)).run_once()
+        self.handler.handleJsonBatch(batch(100))
+        self.assertEqual(self.load_table().scan().to_arrow().num_rows, 90)
+
+    def test_background_thread(self):
+        maintenance = self.maintenance()
+        maintenance.start(interval_sec=60)
+        with self.assertRaises(RuntimeError):
+            maintenance.start(interval_sec=60)
+        deadline = time.monotonic() + 30
+        while len(list(self.load_table().scan().plan_files())) > 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        maintenance.stop(timeout=30)
+        self.assertEqual(len(list(self.load_table().scan().plan_files())), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+import unittest
+
+import pyarrow as pa
+
+from catalog_sql import LocalSqlCatalog
+from fake_events import FakeChangeEvent, FakeRecordCommitter, debezium_event
+from pydbzengine import PythonChangeConsumer, JavaLangThread
+from pydbzengine.handlers.iceberg import IcebergChangeHandler
+
+NUM_TABLES = 6
+
+
+def fan_out_batch(rows_per_table: int = 2):
+    return [FakeChangeEvent(json.dumps({"id": i}), debezium_event("c", after={"id": i}), f"t.table_{t}")
+            for t in range(NUM_TABLES) for i in range(rows_per_table)]
+
+
+class SlowIcebergChangeHandler(IcebergChangeHandler):
+    """
+    Records the writing threads, sleeps instead of writing, and fails the writes of `fail_destinations`.
+    """
+
+    def __init__(self, sleep_sec=0.2, fail_destinations=(), **kwargs):
+        super().__init__(catalog=None, destination_namespace=("ns",), **kwargs)
+        self.sleep_sec = sleep_sec
+        self.fail_destinations = set(fail_destinations)
+        self.written = {}
+        self.threads = set()
+
+    def _write_changes(self, destination: str, data: pa.Table):
+        time.sleep(self.sleep_sec)
+        self.threads.add(threading.current_thread().name)
+        if destination in self.fail_destinations:
+            raise ValueError(f"Failed to write {destination}")
+        self.written[destination] = data.num_rows
+
+
+class TestIcebergParallelWrites(unittest.TestCase):
+
+    def tearDown(self):
+        JavaLangThread.interrupted()  # clear the interrupt flag set by failing batches
+
+    def test_invalid_max_parallel_writes(self):
+        with self.assertRaises(ValueError):
+            IcebergChangeHandler(catalog=None, destination_namespace=("ns",), max_parallel_writes=0)
+
+    def test_tables_written_concurrently(self):
+        handler = SlowIcebergChangeHandler(max_parallel_writes=NUM_TABLES)
+        self.addCleanup(handler.close)
+        start = time.perf_counter()
+        handler.handleJsonBatch(fan_out_batch())
+        elapsed = time.perf_counter() - start
+        self.assertEqual(handler.written, {f"t.table_{t}": 2 for t in range(NUM_TABLES)})
+        self.assertLess(elapsed, handler.sleep_sec * NUM_TABLES / 2)
+        self.assertTrue(all(name.startswith("pydbzengine-iceberg-write") for name in handler.threads))
+
+    def test_sequential_by_default(self):
+        handler = SlowIcebergChangeHandler(sleep_sec=0)
+        handler.handleJsonBatch(fan_out_batch())
+        self.assertEqual(len(handler.written), NUM_TABLES)
+        self.assertEqual(handler.threads, {threading.current_thread().name})
+
+    def test_errors_aggregated(self):
+        handler = SlowIcebergChangeHandler(sleep_sec=0, fail_destinations=["t.table_1", "t.table_4"],
+                                           max_parallel_writes=3)
+        self.addCleanup(handler.close)
+        with self.assertRaisesRegex(RuntimeError, "2 of 6 tables failed: t.table_1, t.table_4") as cm:
+            handler.handleJsonBatch(fan_out_batch())
+        self.assertIsInstance(cm.exception.__cause__, ValueError)
+        # the other tables are written, the batch is replayed after the restart
+        self.assertEqual(len(handler.written), NUM_TABLES - 2)
+
+    def test_failed_batch_not_acknowledged(self):
+        handler = SlowIcebergChangeHandler(sleep_sec=0, fail_destinations=["t.table_2"], max_parallel_writes=4)
+        self.addCleanup(handler.close)
+        consumer = PythonChangeConsumer()
+        consumer.set_change_handler(handler)
+        committer = FakeRecordCommitter()
+        consumer.handleBatch(fan_out_batch(), committer)
+        self.assertEqual(committer.processed, [])
+        self.assertEqual(committer.finished_batches, 0)
+
+    def test_buffered_flush_keeps_failed_tables(self):
+        handler = SlowIcebergChangeHandler(sleep_sec=0, fail_destinations=["t.table_0"], max_parallel_writes=4,
+                                           flush_max_rows=2)
+        durable = []
+        handler.set_commit_listener(durable.append)
+        with self.assertRaises(RuntimeError):
+            handler.handleJsonBatch(fan_out_batch())
+        self.assertEqual(list(handler._buffers), ["t.table_0"])
+        self.assertEqual(durable, [])
+        handler.fail_destinations.clear()
+        handler.close()
+        self.assertEqual(durable, [1])
+        self.assertEqual(len(handler.written), NUM_TABLES)
+
+    def test_append_to_catalog(self):
+        local = LocalSqlCatalog()
+        self.addCleanup(local.cleanup)
+        handler = IcebergChangeHandler(catalog=local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE,
+                                       max_parallel_writes=3)
+        self.addCleanup(handler.close)
+        handler.handleJsonBatch(fan_out_batch())
+        handler.handleJsonBatch(fan_out_batch())
+        for t in range(NUM_TABLES):
+            table = local.catalog.load_table(LocalSqlCatalog.NAMESPACE + (f"t_table_{t}",))
+            self.assertEqual(table.scan().to_arrow().num_rows, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+
+from pyiceberg.exceptions import CommitFailedException
+
+from catalog_sql import LocalSqlCatalog
+from fake_events import FakeChangeEvent, debezium_event
+from pydbzengine.handlers.iceberg import IcebergChangeHandler
+
+
+def events(destination: str, count: int = 2):
+    return [FakeChangeEvent(f'{{"id": {i}}}', debezium_event("c", after={"id": i}), destination)
+            for i in range(count)]
+
+
+class TestIcebergTableCache(unittest.TestCase):
+
+    def setUp(self):
+        self.local = LocalSqlCatalog()
+        self.catalog = self.local.catalog
+
+    def tearDown(self):
+        self.local.cleanup()
+
+    def handler(self, **kwargs) -> IcebergChangeHandler:
+        handler = IcebergChangeHandler(catalog=self.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE, **kwargs)
+        # counts the table loads of the handler, the catalog loads tables internally when committing
+        handler.load_table = mock.Mock(wraps=handler.load_table)
+        return handler
+
+    def row_count(self, table_name: str) -> int:
+        table = self.catalog.load_table(LocalSqlCatalog.NAMESPACE + (table_name,))
+        return table.scan().to_arrow().num_rows
+
+    def test_table_loaded_once(self):
+        handler = self.handler()
+        for _ in range(3):
+            handler.handleJsonBatch(events("testc.inventory.customers"))
+        # the first load creates the table
+        self.assertEqual(handler.load_table.call_count, 1)
+        self.assertEqual(self.row_count("testc_inventory_customers"), 6)
+
+    def test_lru_eviction(self):
+        handler = self.handler(table_cache_size=2)
+        for destination in ["t.a", "t.b", "t.a", "t.c", "t.a", "t.b"]:
+            handler.handleJsonBatch(events(destination, count=1))
+        # t.b was evicted by t.c, t.a stayed as most recently used
+        self.assertEqual(handler.load_table.call_count, 4)
+        self.assertEqual(list(handler._table_cache.keys()),
+                         [LocalSqlCatalog.NAMESPACE + ("t_a",), LocalSqlCatalog.NAMESPACE + ("t_b",)])
+
+    def test_cache_disabled(self):
+        handler = self.handler(table_cache_size=0)
+        for _ in range(3):
+            handler.handleJsonBatch(events("t.a", count=1))
+        self.assertEqual(handler.load_table.call_count, 3)
+        with self.assertRaises(ValueError):
+            self.handler(table_cache_size=-1)
+
+    def test_concurrent_commit(self):
+        handler = self.handler()
+        handler.handleJsonBatch(events("t.a"))
+        # another writer commits to the table, the cached table is stale
+        self.handler().handleJsonBatch(events("t.a"))
+        handler.handleJsonBatch(events("t.a"))
+        self.assertEqual(self.row_count("t_a"), 6)
+
+    def test_reload_on_commit_failure(self):
+        handler = self.handler()
+        handler.handleJsonBatch(events("t.a"))
+        tables = []
+
+        def commit(table):
+            tables.append(table)
+            if len(tables) == 1:
+                raise CommitFailedException("Requirement failed: branch main has changed")
+
+        with self.assertLogs(IcebergChangeHandler.LOGGER_NAME, level="WARNING") as cm:
+            handler.commit_with_retry("t.a", commit)
+        self.assertRegex(str(cm.output), ".*Commit to t.a failed, reloading the table.*")
+        self.assertEqual(handler.load_table.call_count, 2)
+        self.assertIsNot(tables[0], tables[1])
+
+        # the second failure is raised
+        with self.assertRaises(CommitFailedException):
+            handler.commit_with_retry("t.a", mock.Mock(side_effect=CommitFailedException("failed")))
+
+    def test_target_schema_cached(self):
+        handler = self.handler()
+        self.assertIs(handler._target_schema, handler._target_schema)
+        self.assertIs(handler._target_arrow_schema, handler._target_arrow_schema)
@@ -0,0 +1,93 @@
+import json
+import unittest
+
+import pyarrow.parquet as pq
+from pyiceberg.table.sorting import SortDirection
+from pyiceberg.transforms import BucketTransform, DayTransform, IdentityTransform
+
+from catalog_sql import LocalSqlCatalog
+from fake_events import FakeChangeEvent, debezium_event
+from pydbzengine.handlers.iceberg import IcebergChangeHandler, IcebergTableOptions, IcebergTypedChangeHandler
+from test_iceberg_typed_handler import product, schema_event
+
+DESTINATION = "testc.inventory.customers"
+TABLE = LocalSqlCatalog.NAMESPACE + ("testc_inventory_customers",)
+
+
+def customer_events(ids, destination=DESTINATION):
+    return [FakeChangeEvent(json.dumps({"id": i}), debezium_event("c", after={"id": i}), destination) for i in ids]
+
+
+class TestIcebergTableOptions(unittest.TestCase):
+
+    def setUp(self):
+        self.local = LocalSqlCatalog()
+        self.addCleanup(self.local.cleanup)
+
+    def handler(self, handler_class=IcebergChangeHandler, **kwargs):
+        return handler_class(catalog=self.local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE, **kwargs)
+
+    def test_default_layout(self):
+        self.handler().handleJsonBatch(customer_events([1]))
+        table = self.local.catalog.load_table(TABLE)
+        self.assertEqual([(f.name, f.transform) for f in table.spec().fields], [("_consumed_at_day", DayTransform())])
+        self.assertTrue(table.sort_order().is_unsorted)
+
+    def test_bucketed_by_key(self):
+        options = IcebergTableOptions.bucketed_by_key(4, properties={"write.parquet.compression-codec": "snappy",
+                                                                     "write.parquet.row-group-limit": "2"})
+        self.handler(table_options=options).handleJsonBatch(customer_events(range(20)))
+        table = self.local.catalog.load_table(TABLE)
+        self.assertEqual([(f.name, f.transform) for f in table.spec().fields],
+                         [("_dbz_event_key_hash_bucket", BucketTransform(4)), ("_consumed_at_day", DayTransform())])
+        sort_field, = table.sort_order().fields
+        self.assertEqual(table.schema().find_column_name(sort_field.source_id), "_dbz_event_key_hash")
+        self.assertEqual(sort_field.direction, SortDirection.ASC)
+        self.assertEqual(table.properties["write.parquet.compression-codec"], "snappy")
+
+        files = [task.file for task in table.scan().plan_files()]
+        self.assertGreater(len(files), 1)
+        self.assertEqual(sum(f.record_count for f in files), 20)
+        for data_file in files:
+            metadata = pq.ParquetFile(data_file.file_path.replace("file://", "")).metadata
+            self.assertEqual(metadata.row_group(0).column(0).compression, "SNAPPY")
+            self.assertLessEqual(metadata.row_group(0).num_rows, 2)
+            # the rows of each file are clustered by the key hash
+            key_hashes = pq.read_table(data_file.file_path.replace("file://", ""),
+                                       columns=["_dbz_event_key_hash"]).column(0).to_pylist()
+            self.assertEqual(key_hashes, sorted(key_hashes))
+
+    def test_destination_options(self):
+        handler = self.handler(
+            table_options=IcebergTableOptions(partition_by=[]),
+            destination_table_options={"testc.inventory.orders": IcebergTableOptions(
+                partition_by=[("op", IdentityTransform())], sort_by=[("ts_ms", "descending")])})
+        handler.handleJsonBatch(customer_events([1]) + customer_events([2], "testc.inventory.orders"))
+        customers = self.local.catalog.load_table(TABLE)
+        orders = self.local.catalog.load_table(LocalSqlCatalog.NAMESPACE + ("testc_inventory_orders",))
+        self.assertTrue(customers.spec().is_unpartitioned())
+        self.assertEqual([(f.name, f.transform) for f in orders.spec().fields], [("op", IdentityTransform())])
+        self.assertEqual(orders.sort_order().fields[0].direction, SortDirection.DESC)
+
+    def test_typed_handler(self):
+        handler = self.handler(IcebergTypedChangeHandler, table_options=IcebergTableOptions.bucketed_by_key(2))
+        events = [FakeChangeEvent(json.dumps({"id": i}), schema_event("c", after=product(i)), DESTINATION)
+                  for i in range(6)]
+        handler.handleJsonBatch(events)
+        table = self.local.catalog.load_table(TABLE)
+        self.assertEqual(len(table.spec().fields), 2)
+        self.assertEqual(table.scan().to_arrow().num_rows, 6)
+
+    def test_unknown_column(self):
+        handler = self.handler(table_options=IcebergTableOptions(sort_by=["id"]))
+        with self.assertRaisesRegex(ValueError, "Column id not found"):
+            handler.handleJsonBatch(customer_events([1]))
+
+    def test_invalid_sort_direction(self):
+        handler = self.handler(table_options=IcebergTableOptions(sort_by=[("ts_ms", "up")]))
+        with self.assertRaisesRegex(ValueError, "ascending or descending"):
+            handler.handleJsonBatch(customer_events([1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
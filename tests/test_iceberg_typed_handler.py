@@ -0,0 +1,183 @@
+import base64
+import datetime
+import decimal
+import json
+import unittest
+
+from pyiceberg.types import (DateType, DecimalType, IntegerType, ListType, LongType, MapType, StringType, StructType,
+                             TimestampType, TimestamptzType, TimeType, BinaryType)
+
+from catalog_sql import LocalSqlCatalog
+from fake_events import FakeChangeEvent, debezium_event
+from pydbzengine.handlers.connect_schema import iceberg_type, value_converter
+from pydbzengine.handlers.iceberg import IcebergTypedChangeHandler
+
+DESTINATION = "testc.inventory.products"
+TABLE = LocalSqlCatalog.NAMESPACE + ("testc_inventory_products",)
+
+ROW_FIELDS = [
+    {"type": "int32", "optional": False, "field": "id"},
+    {"type": "string", "optional": True, "field": "name"},
+    {"type": "bytes", "optional": True, "name": "org.apache.kafka.connect.data.Decimal", "version": 1,
+     "parameters": {"scale": "2", "connect.decimal.precision": "10"}, "field": "price"},
+    {"type": "int32", "optional": True, "name": "io.debezium.time.Date", "version": 1, "field": "created_on"},
+    {"type": "int64", "optional": True, "name": "io.debezium.time.MicroTimestamp", "version": 1, "field": "updated_at"},
+]
+
+
+def decimal_json(value: str, scale: int) -> str:
+    unscaled = int(decimal.Decimal(value).scaleb(scale))
+    return base64.b64encode(unscaled.to_bytes(8, byteorder="big", signed=True)).decode()
+
+
+def schema_event(op: str, before=None, after=None, fields=ROW_FIELDS, ts_ms: int = 1700000000000) -> str:
+    row_schema = {"type": "struct", "fields": fields, "optional": True, "name": "testc.inventory.products.Value"}
+    schema = {
+        "type": "struct",
+        "fields": [
+            {**row_schema, "field": "before"},
+            {**row_schema, "field": "after"},
+            {"type": "struct", "fields": [{"type": "string", "optional": False, "field": "connector"}],
+             "optional": False, "name": "io.debezium.connector.postgresql.Source", "field": "source"},
+            {"type": "string", "optional": False, "field": "op"},
+            {"type": "int64", "optional": True, "field": "ts_ms"},
+        ],
+        "optional": False,
+        "name": "testc.inventory.products.Envelope",
+    }
+    payload = {"before": before, "after": after, "source": {"connector": "postgresql"}, "op": op, "ts_ms": ts_ms}
+    # compact like the Debezium JSON converter
+    return json.dumps({"schema": schema, "payload": payload}, separators=(",", ":"))
+
+
+def product(id: int, price: str = "9.99", **extra) -> dict:
+    return {"id": id, "name": f"product {id}", "price": decimal_json(price, 2), "created_on": 19723,
+            "updated_at": 1704067200123456, **extra}
+
+
+def event(value: str, id: int = 1):
+    return FakeChangeEvent(json.dumps({"id": id}), value, DESTINATION)
+
+
+class TestConnectSchema(unittest.TestCase):
+
+    def test_iceberg_types(self):
+        self.assertEqual(iceberg_type({"type": "int16"}), IntegerType())
+        self.assertEqual(iceberg_type({"type": "int64", "name": "io.debezium.time.NanoTimestamp"}), TimestampType())
+        self.assertEqual(iceberg_type({"type": "string", "name": "io.debezium.time.ZonedTimestamp"}), TimestamptzType())
+        self.assertEqual(iceberg_type({"type": "int64", "name": "io.debezium.time.MicroTime"}), TimeType())
+        self.assertEqual(iceberg_type({"type": "bytes"}), BinaryType())
+        self.assertEqual(iceberg_type(ROW_FIELDS[2]), DecimalType(10, 2))
+        self.assertEqual(iceberg_type({"type": "bytes", "name": "org.apache.kafka.connect.data.Decimal",
+                                       "parameters": {"scale": "0", "connect.decimal.precision": "50"}}), StringType())
+        self.assertEqual(iceberg_type({"type": "struct", "name": "io.debezium.data.VariableScaleDecimal",
+                                       "fields": []}), StringType())
+        self.assertIsInstance(iceberg_type({"type": "array", "items": {"type": "int64"}}), ListType)
+        self.assertIsInstance(iceberg_type({"type": "map", "keys": {"type": "string"}, "values": {"type": "int32"}}),
+                              MapType)
+        struct = iceberg_type({"type": "struct", "fields": ROW_FIELDS})
+        self.assertIsInstance(struct, StructType)
+        self.assertEqual([f.name for f in struct.fields], ["id", "name", "price", "created_on", "updated_at"])
+        self.assertTrue(all(not f.required for f in struct.fields))
+        self.assertEqual(struct.fields[3].field_type, DateType())
+        self.assertEqual(struct.fields[0].field_type, IntegerType())
+        self.assertEqual(iceberg_type({"type": "int64"}), LongType())
+        with self.assertRaises(ValueError):
+            iceberg_type({"type": "unknown"})
+
+    def test_value_converters(self):
+        self.assertIsNone(value_converter({"type": "int32"}))
+        self.assertEqual(value_converter(ROW_FIELDS[2])(decimal_json("-12.34", 2)), decimal.Decimal("-12.34"))
+        self.assertEqual(value_converter({"type": "int64", "name": "io.debezium.time.Timestamp"})(1), 1000)
+        self.assertEqual(value_converter({"type": "int64", "name": "io.debezium.time.NanoTimestamp"})(1999), 1)
+        self.assertEqual(value_converter({"type": "string", "name": "io.debezium.time.ZonedTimestamp"})(
+            "2024-01-01T10:00:00.123456789Z"),
+            datetime.datetime(2024, 1, 1, 10, 0, 0, 123456, tzinfo=datetime.timezone.utc))
+        self.assertEqual(value_converter({"type": "struct", "name": "io.debezium.data.VariableScaleDecimal"})(
+            {"scale": 3, "value": decimal_json("1.5", 3)}), "1.500")
+        self.assertEqual(value_converter({"type": "bytes"})("AQI="), b"\x01\x02")
+        self.assertEqual(value_converter({"type": "map", "keys": {"type": "string"}, "values": {"type": "bytes"}})(
+            {"a": "AQ==", "b": None}), [("a", b"\x01"), ("b", None)])
+        self.assertEqual(value_converter({"type": "array", "items": {"type": "bytes"}})(["AQ==", None]),
+                         [b"\x01", None])
+        struct = value_converter({"type": "struct", "fields": ROW_FIELDS})
+        self.assertEqual(struct(product(1))["price"], decimal.Decimal("9.99"))
+        self.assertIsNone(value_converter({"type": "struct", "fields": ROW_FIELDS[:2]}))
+
+
+class TestIcebergTypedChangeHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.local = LocalSqlCatalog()
+        self.addCleanup(self.local.cleanup)
+        self.handler = IcebergTypedChangeHandler(catalog=self.local.catalog,
+                                                 destination_namespace=LocalSqlCatalog.NAMESPACE)
+
+    def rows(self) -> list:
+        return self.local.catalog.load_table(TABLE).scan().to_arrow().to_pylist()
+
+    def test_typed_columns(self):
+        self.handler.handleJsonBatch([
+            event(schema_event("c", after=product(1)), id=1),
+            event(schema_event("u", before=product(1), after=product(1, price="10.50")), id=1),
+            event(schema_event("d", before=product(2)), id=2),
+            FakeChangeEvent(json.dumps({"id": 2}), None, DESTINATION),  # tombstone
+        ])
+        table = self.local.catalog.load_table(TABLE)
+        self.assertEqual(table.schema().find_field("after.price").field_type, DecimalType(10, 2))
+        self.assertEqual(table.schema().find_field("after.created_on").field_type, DateType())
+        self.assertEqual(table.schema().find_field("after.updated_at").field_type, TimestampType())
+
+        rows = self.rows()
+        self.assertEqual([r["op"] for r in rows], ["c", "u", "d"])
+        self.assertEqual(rows[0]["after"]["price"], decimal.Decimal("9.99"))
+        self.assertEqual(rows[1]["after"]["price"], decimal.Decimal("10.50"))
+        self.assertEqual(rows[1]["before"]["price"], decimal.Decimal("9.99"))
+        self.assertEqual(rows[0]["after"]["created_on"], datetime.date(2024, 1, 1))
+        self.assertEqual(rows[0]["after"]["updated_at"], datetime.datetime(2024, 1, 1, 0, 0, 0, 123456))
+        self.assertIsNone(rows[2]["after"])
+        self.assertEqual(json.loads(rows[0]["source"]), {"connector": "postgresql"})
+        self.assertEqual(rows[0]["_dbz_event_key"], '{"id": 1}')
+
+    def test_schema_evolution(self):
+        self.handler.handleJsonBatch([event(schema_event("c", after=product(1)))])
+        fields = ROW_FIELDS + [{"type": "int64", "optional": True, "field": "stock"}]
+        self.handler.handleJsonBatch([event(schema_event("c", after=product(2, stock=5), fields=fields), id=2)])
+        table = self.local.catalog.load_table(TABLE)
+        self.assertEqual(table.schema().find_field("after.stock").field_type, LongType())
+        rows = self.rows()
+        self.assertEqual(sorted((r["after"]["id"], r["after"]["stock"]) for r in rows), [(1, None), (2, 5)])
+        # events with the old schema are still accepted
+        self.handler.handleJsonBatch([event(schema_event("c", after=product(3)), id=3)])
+        self.assertEqual(len(self.rows()), 3)
+
+    def test_mixed_schemas_in_batch(self):
+        fields = ROW_FIELDS + [{"type": "boolean", "optional": True, "field": "active"}]
+        self.handler.handleJsonBatch([
+            event(schema_event("c", after=product(1))),
+            event(schema_event("c", after=product(2, active=True), fields=fields), id=2),
+        ])
+        rows = sorted(self.rows(), key=lambda r: r["after"]["id"])
+        self.assertEqual([r["after"]["active"] for r in rows], [None, True])
+
+    def test_buffered_batches_with_different_schemas(self):
+        handler = IcebergTypedChangeHandler(catalog=self.local.catalog,
+                                            destination_namespace=LocalSqlCatalog.NAMESPACE, flush_max_rows=100)
+        fields = ROW_FIELDS + [{"type": "string", "optional": True, "field": "color"}]
+        handler.handleJsonBatch([event(schema_event("c", after=product(1)))])
+        handler.handleJsonBatch([event(schema_event("c", after=product(2, color="red"), fields=fields), id=2)])
+        handler.close()
+        self.assertEqual(sorted(str(r["after"]["color"]) for r in self.rows()), ["None", "red"])
+
+    def test_schema_cache(self):
+        self.handler.handleJsonBatch([event(schema_event("c", after=product(i)), id=i) for i in range(3)])
+        self.assertEqual(len(self.handler._row_schemas), 1)
+
+    def test_requires_schemas(self):
+        with self.assertRaisesRegex(ValueError, "converter.schemas.enable=true"):
+            self.handler.handleJsonBatch([FakeChangeEvent('{"id": 1}', debezium_event("c", after={"id": 1}),
+                                                          DESTINATION)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import unittest
+
+from catalog_sql import LocalSqlCatalog
+from fake_events import FakeChangeEvent, debezium_event
+from pydbzengine.handlers.iceberg import IcebergUpsertChangeHandler
+
+DESTINATION = "testc.inventory.customers"
+
+
+def event(op: str, key_id, before=None, after=None, ts_ms: int = 1700000000000):
+    key = json.dumps({"id": key_id}) if key_id is not None else None
+    return FakeChangeEvent(key, debezium_event(op, before=before, after=after, ts_ms=ts_ms), DESTINATION)
+
+
+def row(id, name):
+    return {"id": id, "name": name}
+
+
+class TestIcebergUpsertChangeHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.local = LocalSqlCatalog()
+        self.handler = IcebergUpsertChangeHandler(catalog=self.local.catalog,
+                                                  destination_namespace=LocalSqlCatalog.NAMESPACE)
+
+    def tearDown(self):
+        self.local.cleanup()
+
+    def current_state(self) -> dict:
+        table = self.local.catalog.load_table(LocalSqlCatalog.NAMESPACE + ("testc_inventory_customers",))
+        rows = table.scan().to_arrow().to_pylist()
+        return {r["_dbz_event_key"]: (r["op"], json.loads(r["after"]) if r["after"] else None) for r in rows}
+
+    def test_collapse_within_batch(self):
+        self.handler.handleJsonBatch([
+            event("r", 1, after=row(1, "a")),
+            event("c", 2, after=row(2, "b")),
+            event("u", 1, before=row(1, "a"), after=row(1, "a2"), ts_ms=1700000000001),
+            event("c", 3, after=row(3, "c")),
+            event("d", 3, before=row(3, "c"), ts_ms=1700000000002),
+            FakeChangeEvent(json.dumps({"id": 3}), None, DESTINATION),  # tombstone
+        ])
+        self.assertEqual(self.current_state(), {
+            '{"id": 1}': ("u", row(1, "a2")),
+            '{"id": 2}': ("c", row(2, "b")),
+        })
+
+    def test_last_write_wins_by_timestamp(self):
+        self.handler.handleJsonBatch([
+            event("u", 1, after=row(1, "newer"), ts_ms=1700000000005),
+            event("u", 1, after=row(1, "older"), ts_ms=1700000000001),
+        ])
+        self.assertEqual(self.current_state(), {'{"id": 1}': ("u", row(1, "newer"))})
+
+    def test_upsert_across_batches(self):
+        self.handler.handleJsonBatch([event("r", i, after=row(i, "v1")) for i in range(5)])
+        self.handler.handleJsonBatch([
+            event("u", 1, before=row(1, "v1"), after=row(1, "v2")),
+            event("d", 2, before=row(2, "v1")),
+            event("c", 5, after=row(5, "v1")),
+        ])
+        self.handler.handleJsonBatch([
+            event("c", 2, after=row(2, "v3")),
+            event("d", 4, before=row(4, "v1")),
+        ])
+        self.assertEqual(self.current_state(), {
+            '{"id": 0}': ("r", row(0, "v1")),
+            '{"id": 1}': ("u", row(1, "v2")),
+            '{"id": 2}': ("c", row(2, "v3")),
+            '{"id": 3}': ("r", row(3, "v1")),
+            '{"id": 5}': ("c", row(5, "v1")),
+        })
+
+    def test_new_keys(self):
+        self.handler.handleJsonBatch([event("r", i, after=row(i, "v1")) for i in range(3)])
+        self.handler.handleJsonBatch([event("c", 10, after=row(10, "v1")), event("d", 11, before=row(11, "v1"))])
+        self.assertEqual(len(self.current_state()), 4)
+
+    def test_events_without_key_appended(self):
+        self.handler.handleJsonBatch([event("c", None, after=row(1, "a")), event("c", None, after=row(1, "a"))])
+        self.handler.handleJsonBatch([event("c", None, after=row(1, "a"))])
+        table = self.local.catalog.load_table(LocalSqlCatalog.NAMESPACE + ("testc_inventory_customers",))
+        self.assertEqual(table.scan().to_arrow().num_rows, 3)
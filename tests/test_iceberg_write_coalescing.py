@@ -0,0 +1,109 @@
+import json
+import time
+import unittest
+
+from catalog_sql import LocalSqlCatalog
+from fake_events import FakeChangeEvent, FakeRecordCommitter, debezium_event
+from pydbzengine import PythonChangeConsumer
+from pydbzengine.handlers.iceberg import IcebergChangeHandler, IcebergUpsertChangeHandler
+
+
+def event(destination: str, id: int, op: str = "c"):
+    return FakeChangeEvent(json.dumps({"id": id}), debezium_event(op, after={"id": id}), destination)
+
+
+class TestIcebergWriteCoalescing(unittest.TestCase):
+
+    def setUp(self):
+        self.local = LocalSqlCatalog()
+        self.addCleanup(self.local.cleanup)
+
+    def snapshots(self, table_name: str) -> int:
+        table = self.local.catalog.load_table(LocalSqlCatalog.NAMESPACE + (table_name,))
+        return len(table.metadata.snapshots)
+
+    def row_count(self, table_name: str) -> int:
+        table = self.local.catalog.load_table(LocalSqlCatalog.NAMESPACE + (table_name,))
+        return table.scan().to_arrow().num_rows
+
+    def test_invalid_thresholds(self):
+        with self.assertRaises(ValueError):
+            IcebergChangeHandler(catalog=None, destination_namespace=("ns",), flush_max_rows=-1)
+
+    def test_commit_listener_requires_buffering(self):
+        handler = IcebergChangeHandler(catalog=None, destination_namespace=("ns",))
+        self.assertFalse(handler.set_commit_listener(lambda n: None))
+        handler = IcebergChangeHandler(catalog=None, destination_namespace=("ns",), flush_max_rows=10)
+        self.assertTrue(handler.set_commit_listener(lambda n: None))
+
+    def test_rows_threshold(self):
+        handler = IcebergChangeHandler(catalog=self.local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE,
+                                       flush_max_rows=5)
+        durable = []
+        handler.set_commit_listener(durable.append)
+        for i in range(4):
+            handler.handleJsonBatch([event("t.a", 2 * i), event("t.a", 2 * i + 1)])
+        # written once after the third batch, the fourth is still buffered
+        self.assertEqual(self.snapshots("t_a"), 1)
+        self.assertEqual(self.row_count("t_a"), 6)
+        self.assertEqual(durable, [3])
+        handler.close()
+        self.assertEqual(self.snapshots("t_a"), 2)
+        self.assertEqual(self.row_count("t_a"), 8)
+        self.assertEqual(durable, [3, 4])
+
+    def test_durable_batches_wait_for_all_tables(self):
+        handler = IcebergChangeHandler(catalog=self.local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE,
+                                       flush_max_rows=2)
+        durable = []
+        handler.set_commit_listener(durable.append)
+        handler.handleJsonBatch([event("t.a", 1), event("t.b", 1)])
+        handler.handleJsonBatch([event("t.b", 2)])
+        # t.b is written, t.a still holds events of the first batch
+        self.assertEqual(durable, [])
+        handler.handleJsonBatch([event("t.a", 2)])
+        self.assertEqual(durable, [3])
+
+    def test_age_threshold(self):
+        handler = IcebergChangeHandler(catalog=self.local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE,
+                                       flush_max_age_sec=0.2)
+        self.addCleanup(handler.close)
+        durable = []
+        handler.set_commit_listener(durable.append)
+        handler.handleJsonBatch([event("t.a", 1)])
+        deadline = time.monotonic() + 5
+        while not durable and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(durable, [1])
+        self.assertEqual(self.row_count("t_a"), 1)
+
+    def test_upsert_across_batches(self):
+        handler = IcebergUpsertChangeHandler(catalog=self.local.catalog,
+                                             destination_namespace=LocalSqlCatalog.NAMESPACE, flush_max_rows=100)
+        handler.handleJsonBatch([event("t.a", 1), event("t.a", 2)])
+        handler.handleJsonBatch([event("t.a", 1, op="d")])
+        handler.close()
+        self.assertEqual(self.snapshots("t_a"), 1)
+        self.assertEqual(self.row_count("t_a"), 1)
+
+    def test_consumer_deferred_commits(self):
+        handler = IcebergChangeHandler(catalog=self.local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE,
+                                       flush_max_rows=3)
+        consumer = PythonChangeConsumer()
+        consumer.set_change_handler(handler)
+        committer = FakeRecordCommitter()
+        consumer.handleBatch([event("t.a", 1), event("t.a", 2)], committer)
+        self.assertEqual(committer.processed, [])
+        self.assertEqual(committer.finished_batches, 0)
+        consumer.handleBatch([event("t.a", 3)], committer)
+        self.assertEqual(len(committer.processed), 3)
+        self.assertEqual(committer.finished_batches, 2)
+        consumer.handleBatch([event("t.a", 4)], committer)
+        self.assertEqual(committer.finished_batches, 2)
+        consumer.close()
+        self.assertEqual(committer.finished_batches, 3)
+        self.assertEqual(self.row_count("t_a"), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import dataclasses
+import subprocess
+import sys
+import unittest
+
+from pydbzengine import jvm
+from pydbzengine.jvm import JvmOptions, GarbageCollector
+
+
+class TestJvmOptions(unittest.TestCase):
+
+    def test_to_options(self):
+        options = JvmOptions(initial_heap="512m", max_heap="2g", max_direct_memory="1g", max_metaspace="256m",
+                             thread_stack_size="1m", gc=GarbageCollector.G1, max_gc_pause_millis=50,
+                             always_pre_touch=True, extra_options=["-XX:+ExitOnOutOfMemoryError"])
+        self.assertEqual(options.to_options(), [
+            "-Xms512m", "-Xmx2g", "-XX:MaxDirectMemorySize=1g", "-XX:MaxMetaspaceSize=256m", "-Xss1m",
+            "-XX:+UseG1GC", "-XX:MaxGCPauseMillis=50", "-XX:+AlwaysPreTouch", "-XX:+ExitOnOutOfMemoryError",
+        ])
+        self.assertEqual(JvmOptions().to_options(), [])
+
+    def test_presets(self):
+        self.assertEqual(JvmOptions.low_latency(max_heap="8g").to_options(),
+                         ["-Xms8g", "-Xmx8g", "-XX:+UseZGC", "-XX:+AlwaysPreTouch"])
+        self.assertIn("-XX:+UseParallelGC", JvmOptions.high_throughput().to_options())
+        small = JvmOptions.small_footprint()
+        self.assertIn("-XX:+UseSerialGC", small.to_options())
+        self.assertIn("-XX:MaxDirectMemorySize=64m", small.to_options())
+        self.assertIn("-Xmx1g", dataclasses.replace(small, max_heap="1g").to_options())
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            JvmOptions(max_heap="2 GB")
+        with self.assertRaises(ValueError):
+            JvmOptions(gc="G1")
+        with self.assertRaises(ValueError):
+            JvmOptions(max_gc_pause_millis=0)
+
+    def test_import_does_not_start_jvm(self):
+        code = "import sys, pydbzengine, pydbzengine.jvm; sys.exit('jnius' in sys.modules)"
+        self.assertEqual(subprocess.run([sys.executable, "-c", code]).returncode, 0)
+
+    def test_use_jvm_options_after_start_raises(self):
+        jvm.start_jvm()
+        with self.assertRaises(RuntimeError):
+            jvm.use_jvm_options(JvmOptions.low_latency())
+
+
+class TestJvmMetrics(unittest.TestCase):
+
+    def test_jvm_metrics(self):
+        metrics = jvm.jvm_metrics()
+        self.assertGreater(metrics.heap_used, 0)
+        self.assertGreaterEqual(metrics.heap_committed, metrics.heap_used)
+        self.assertGreater(metrics.loaded_classes, 0)
+        self.assertGreaterEqual(metrics.total_loaded_classes, metrics.loaded_classes)
+        self.assertGreater(metrics.thread_count, 0)
+        self.assertGreaterEqual(metrics.peak_thread_count, metrics.thread_count)
+        self.assertGreater(metrics.uptime_ms, 0)
+        self.assertTrue(metrics.gc)
+        self.assertEqual(metrics.gc_collection_count, sum(g.collection_count for g in metrics.gc))
+
+        jvm.java_class("JavaLangSystem").gc()
+        after = jvm.jvm_metrics()
+        self.assertGreater(after.gc_collection_count, metrics.gc_collection_count)
+
+
+class TestCallOverload(unittest.TestCase):
+
+    def test_argument_implemented_in_python(self):
+        jvm.start_jvm()
+        from jnius import PythonJavaClass, autoclass, java_method
+
+        class Task(PythonJavaClass):
+            __javainterfaces__ = ["java/lang/Runnable"]
+
+            def __init__(self):
+                self.ran = False
+
+            @java_method("()V")
+            def run(self):
+                self.ran = True
+
+        # `submit` is overloaded for `Runnable` and `Callable`
+        executor = autoclass("java.util.concurrent.Executors").newSingleThreadExecutor()
+        task = Task()
+        jvm.call_overload(executor, "submit", "(Ljava/lang/Runnable;)Ljava/util/concurrent/Future;", task).get()
+        executor.shutdown()
+        self.assertTrue(task.ran)
@@ -0,0 +1,106 @@
+import json
+import math
+import time
+import unittest
+import urllib.request
+
+from catalog_sql import LocalSqlCatalog
+from fake_events import FakeChangeEvent, FakeRecordCommitter, debezium_event
+from pydbzengine import PythonChangeConsumer, metrics
+from pydbzengine.handlers.iceberg import IcebergChangeHandler
+from pydbzengine.metrics import Histogram, InMemoryMetricsSink, PrometheusExporter, event_ts_ms, prometheus_text
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_quantile(self):
+        histogram = Histogram(buckets=(1, 2, 4))
+        self.assertTrue(math.isnan(histogram.quantile(0.5)))
+        for value in (0.5, 1.5, 1.5, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative_counts(), [1, 3, 4, 5])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 16.5)
+        self.assertAlmostEqual(histogram.quantile(0.5), 1.75)
+        self.assertEqual(histogram.quantile(0.99), 4)  # +Inf bucket
+
+    def test_in_memory_sink(self):
+        sink = InMemoryMetricsSink()
+        sink.increment(metrics.RECORDS, 2, labels={"destination": "a"})
+        sink.increment(metrics.RECORDS, 3, labels={"destination": "b"})
+        sink.set_gauge(metrics.RECORDS_PER_SECOND, 100.5)
+        sink.observe(metrics.SOURCE_LAG_SECONDS, 120)
+        self.assertEqual(sink.counter(metrics.RECORDS), 5)
+        self.assertEqual(sink.counter(metrics.RECORDS, destination="b"), 3)
+        self.assertEqual(sink.gauge(metrics.RECORDS_PER_SECOND), 100.5)
+        self.assertEqual(sink.histogram(metrics.SOURCE_LAG_SECONDS).buckets, metrics.LAG_BUCKETS)
+
+    def test_prometheus_text(self):
+        sink = InMemoryMetricsSink(buckets={"x_seconds": (0.1, 1)})
+        sink.increment(metrics.RECORDS, 2, labels={"destination": 'a"b'})
+        sink.observe("x_seconds", 0.5)
+        text = prometheus_text(sink)
+        self.assertIn("# TYPE pydbzengine_records_total counter", text)
+        self.assertIn('pydbzengine_records_total{destination="a\\"b"} 2', text)
+        self.assertIn('x_seconds_bucket{le="0.1"} 0\nx_seconds_bucket{le="1"} 1\nx_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn("x_seconds_sum 0.5\nx_seconds_count 1", text)
+
+    def test_exporter(self):
+        sink = InMemoryMetricsSink()
+        sink.increment(metrics.BATCHES)
+        exporter = PrometheusExporter(sink, port=0).start()
+        self.addCleanup(exporter.stop)
+        with urllib.request.urlopen(f"http://127.0.0.1:{exporter.server_port}/metrics") as response:
+            self.assertIn("pydbzengine_batches_total 1", response.read().decode())
+
+    def test_event_ts_ms(self):
+        self.assertEqual(event_ts_ms(debezium_event("c", after={"id": 1}, ts_ms=1700000000123)), 1700000000123)
+        self.assertEqual(event_ts_ms(b'{"source": {"ts_ms": 1}, "op": "c", "ts_ms": 2, "ts_us": 2000}'), 2)
+        self.assertIsNone(event_ts_ms(None))
+        self.assertIsNone(event_ts_ms('{"id": 1}'))
+
+
+class TestPipelineMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.local = LocalSqlCatalog()
+        self.addCleanup(self.local.cleanup)
+
+    def test_consumer_and_handler_metrics(self):
+        sink = InMemoryMetricsSink()
+        handler = IcebergChangeHandler(catalog=self.local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE)
+        consumer = PythonChangeConsumer()
+        consumer.set_metrics_sink(sink)
+        consumer.set_change_handler(handler)
+        self.assertIs(handler.metrics, sink)
+        ts_ms = int(time.time() * 1000) - 5000
+        records = [FakeChangeEvent(json.dumps({"id": i}), debezium_event("c", after={"id": i}, ts_ms=ts_ms),
+                                   f"t.table_{i % 2}") for i in range(5)]
+        consumer.handleBatch(records, FakeRecordCommitter())
+
+        self.assertEqual(sink.counter(metrics.BATCHES), 1)
+        self.assertEqual(sink.counter(metrics.RECORDS, destination="t.table_0"), 3)
+        self.assertEqual(sink.counter(metrics.RECORDS, destination="t.table_1"), 2)
+        for name in (metrics.BATCH_MATERIALIZE_SECONDS, metrics.BATCH_HANDLER_SECONDS, metrics.BATCH_COMMIT_SECONDS,
+                     metrics.BATCH_SECONDS):
+            self.assertEqual(sink.histogram(name).count, 1, name)
+        self.assertGreater(sink.gauge(metrics.RECORDS_PER_SECOND), 0)
+        lag = sink.histogram(metrics.SOURCE_LAG_SECONDS, destination="t.table_0")
+        self.assertGreaterEqual(lag.sum, 5)
+        self.assertEqual(sink.histogram(metrics.HANDLER_CONVERT_SECONDS, handler="IcebergChangeHandler").count, 2)
+        self.assertEqual(sink.counter(metrics.HANDLER_WRITTEN_RECORDS, handler="IcebergChangeHandler",
+                                      destination="t.table_0"), 3)
+        self.assertIn("pydbzengine_handler_write_seconds_bucket", prometheus_text(sink))
+
+    def test_disabled_by_default(self):
+        handler = IcebergChangeHandler(catalog=self.local.catalog, destination_namespace=LocalSqlCatalog.NAMESPACE)
+        consumer = PythonChangeConsumer()
+        consumer.set_change_handler(handler)
+        consumer.handleBatch([FakeChangeEvent('{"id": 1}', debezium_event("c", after={"id": 1}), "t.a")],
+                             FakeRecordCommitter())
+        self.assertIsNone(consumer.metrics)
+        self.assertIsNone(handler.metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from fake_events import FakeChangeEvent, FakeRecordCommitter, debezium_event
+from pydbzengine import BasePythonChangeHandler, PythonChangeConsumer
+from pydbzengine.handlers.recording import RecordingChangeHandler, read_batches, rebatch, replay
+
+
+class CollectingHandler(BasePythonChangeHandler):
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    def handleJsonBatch(self, records):
+        self.batches.append([(r.key(), r.value(), r.destination(), r.partition()) for r in records])
+
+    def close(self):
+        self.closed = True
+
+
+def batch(start: int, size: int, destination: str = "t.inventory.a"):
+    return [FakeChangeEvent(json.dumps({"id": i}), debezium_event("c", after={"id": i}), destination, partition=0)
+            for i in range(start, start + size)]
+
+
+class TestRecording(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = Path(self.tmp_dir.name).joinpath("stream.dbzrec")
+
+    def test_record_and_replay(self):
+        wrapped = CollectingHandler()
+        recorder = RecordingChangeHandler(self.path, handler=wrapped)
+        consumer = PythonChangeConsumer()
+        consumer.set_change_handler(recorder)
+        records = batch(0, 3) + [FakeChangeEvent(b'{"id": 3}', None, "t.inventory.b"),
+                                 FakeChangeEvent(None, "ünïcode", "t.inventory.b", partition=7)]
+        consumer.handleBatch(records, FakeRecordCommitter())
+        consumer.handleBatch(batch(3, 2), FakeRecordCommitter())
+        consumer.close()
+        self.assertTrue(wrapped.closed)
+        self.assertEqual((recorder.recorded_batches, recorder.recorded_records), (2, 7))
+
+        replayed = CollectingHandler()
+        self.assertEqual(replay(replayed, self.path), 7)
+        # batch boundaries, payload types, tombstones and partitions are preserved
+        self.assertEqual(replayed.batches, wrapped.batches)
+        self.assertEqual(replayed.batches[0][3], (b'{"id": 3}', None, "t.inventory.b", None))
+        self.assertFalse(replayed.closed)
+
+    def test_rebatch(self):
+        recorder = RecordingChangeHandler(self.path)
+        for start, size in ((0, 3), (3, 3), (6, 1)):
+            recorder.handleJsonBatch(batch(start, size))
+        recorder.close()
+        replayed = CollectingHandler()
+        self.assertEqual(replay(replayed, [self.path, self.path], batch_size=4), 14)
+        self.assertEqual([len(b) for b in replayed.batches], [4, 4, 4, 2])
+        self.assertEqual([json.loads(key)["id"] for b in replayed.batches for key, *_ in b],
+                         list(range(7)) * 2)
+        with self.assertRaises(ValueError):
+            list(rebatch([], 0))
+
+    def test_append_after_crash(self):
+        recorder = RecordingChangeHandler(self.path)
+        recorder.handleJsonBatch(batch(0, 2))
+        recorder.close()
+        complete_size = self.path.stat().st_size
+        with self.path.open("ab") as f:
+            f.write(b"\x10\x00\x00\x00\x02")  # partial frame header of a batch interrupted by a crash
+        with self.assertLogs("pydbzengine.recording", level="WARNING"):
+            self.assertEqual([len(b) for b in read_batches(self.path)], [2])
+
+        with self.assertLogs("pydbzengine.recording", level="WARNING"):
+            recorder = RecordingChangeHandler(self.path)
+        self.assertEqual(self.path.stat().st_size, complete_size)
+        recorder.handleJsonBatch(batch(2, 3))
+        recorder.close()
+        self.assertEqual([len(b) for b in read_batches(self.path)], [2, 3])
+
+    def test_not_a_recording(self):
+        self.path.write_bytes(b"something else")
+        with self.assertRaises(ValueError):
+            list(read_batches(self.path))
+        with self.assertRaises(ValueError):
+            RecordingChangeHandler(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import threading
+import time
+import unittest
+
+from pydbzengine import BasePythonChangeHandler, metrics
+from pydbzengine.metrics import InMemoryMetricsSink
+from pydbzengine.supervisor import EngineSpec, EngineSupervisor, MemberState, shard_properties, shard_tables
+
+
+class FakeEngine:
+    """
+    Reports a batch of 10 records every 10 ms until it is closed, or fails after `fail_after` batches.
+    """
+
+    def __init__(self, metrics_sink, fail_after=None):
+        self.metrics_sink = metrics_sink
+        self.fail_after = fail_after
+        self.closed = threading.Event()
+
+    def run(self):
+        batches = 0
+        while not self.closed.wait(0.01):
+            self.metrics_sink.increment(metrics.BATCHES)
+            self.metrics_sink.increment(metrics.RECORDS, 10, labels={"destination": "t.a"})
+            batches += 1
+            if self.fail_after is not None and batches >= self.fail_after:
+                raise RuntimeError("connector failed")
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeEngineSpec(EngineSpec):
+
+    def build(self, metrics_sink):
+        return FakeEngine(metrics_sink, **self.engine_args.get("fake", {}))
+
+
+def fake_spec(name, **fake_args):
+    return FakeEngineSpec(name=name, properties={}, handler_factory=BasePythonChangeHandler,
+                          engine_args={"fake": fake_args})
+
+
+def wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+class TestSharding(unittest.TestCase):
+
+    def test_shard_tables(self):
+        properties = {"name": "engine", "connector.class": "io.debezium.connector.postgresql.PostgresConnector",
+                      "table.include.list": "inventory.a, inventory.b,inventory.c",
+                      "offset.storage.file.filename": "/data/offsets.dat", "topic.prefix": "dbz"}
+        specs = shard_tables("inventory", properties, shards=2, handler_factory=BasePythonChangeHandler,
+                             max_queued_batches=2)
+        self.assertEqual([spec.name for spec in specs], ["inventory-0", "inventory-1"])
+        self.assertEqual(specs[0].properties["table.include.list"], "inventory.a,inventory.c")
+        self.assertEqual(specs[1].properties["table.include.list"], "inventory.b")
+        self.assertEqual(specs[1].properties["offset.storage.file.filename"], "/data/offsets-1.dat")
+        self.assertEqual(specs[1].properties["name"], "engine-1")
+        self.assertEqual(specs[1].properties["slot.name"], "debezium_1")
+        self.assertEqual(specs[1].properties["publication.name"], "dbz_publication_1")
+        self.assertEqual(specs[1].properties["publication.autocreate.mode"], "filtered")
+        self.assertEqual(specs[1].properties["topic.prefix"], "dbz")
+        self.assertEqual(specs[1].engine_args, {"max_queued_batches": 2})
+        with self.assertRaises(ValueError):
+            shard_tables("inventory", properties, shards=4, handler_factory=BasePythonChangeHandler)
+
+    def test_mysql_server_id(self):
+        shard = shard_properties({"connector.class": "io.debezium.connector.mysql.MySqlConnector",
+                                  "database.server.id": "5400"}, 3, ["db.a"])
+        self.assertEqual(shard["database.server.id"], "5403")
+        self.assertNotIn("slot.name", shard)
+
+
+class TestEngineSupervisor(unittest.TestCase):
+
+    def supervisor(self, specs, **kwargs):
+        supervisor = EngineSupervisor(specs, check_interval_sec=0.02, report_interval_sec=0.1, **kwargs)
+        self.addCleanup(supervisor.stop, timeout=10)
+        return supervisor
+
+    def test_invalid_specs(self):
+        with self.assertRaises(ValueError):
+            EngineSupervisor([fake_spec("a"), fake_spec("a")])
+        with self.assertRaises(ValueError):
+            EngineSupervisor([fake_spec("a")], mode="fork")
+
+    def test_threads_health_and_stop(self):
+        sink = InMemoryMetricsSink()
+        spec = fake_spec("b")
+        spec.engine_args["metrics"] = sink
+        supervisor = self.supervisor([fake_spec("a"), spec]).start()
+        self.assertTrue(wait_for(lambda: all(h.records >= 100 for h in supervisor.health().values())))
+        self.assertTrue(wait_for(lambda: supervisor.health()["a"].records_per_second > 0))
+        health = supervisor.health()["a"]
+        self.assertEqual(health.state, MemberState.RUNNING)
+        self.assertLess(health.seconds_since_last_batch, 5)
+        self.assertTrue(supervisor.healthy)
+        self.assertIn("2 engines (2 running)", supervisor.summary())
+        supervisor.stop(timeout=10)
+        self.assertTrue(supervisor.wait(timeout=0))
+        self.assertEqual({h.state for h in supervisor.health().values()}, {MemberState.STOPPED})
+        # the metrics of the spec still receive the metrics of the engine
+        self.assertEqual(sink.counter(metrics.RECORDS), supervisor.health()["b"].records)
+
+    def test_restart_with_backoff(self):
+        supervisor = self.supervisor([fake_spec("a", fail_after=2)], max_restarts=2, restart_backoff_sec=0.05)
+        with self.assertLogs("pydbzengine.supervisor", level="ERROR") as logs:
+            supervisor.start()
+            self.assertTrue(supervisor.wait(timeout=20))
+        health = supervisor.health()["a"]
+        self.assertEqual(health.state, MemberState.FAILED)
+        self.assertEqual(health.restarts, 2)
+        self.assertEqual(health.records, 60)
+        self.assertEqual(health.last_error, "RuntimeError('connector failed')")
+        self.assertFalse(supervisor.healthy)
+        self.assertIn("giving up", logs.output[-1])
+
+    def test_processes(self):
+        supervisor = self.supervisor([fake_spec("a"), fake_spec("b", fail_after=3)], mode="process",
+                                     max_restarts=None, restart_backoff_sec=0.05)
+        supervisor.start()
+        self.assertTrue(wait_for(lambda: supervisor.health()["b"].restarts >= 1, timeout=60))
+        self.assertTrue(wait_for(lambda: supervisor.health()["a"].records >= 100, timeout=60))
+        self.assertEqual(supervisor.health()["b"].last_error, "Engine process exited with code 1")
+        supervisor.stop(timeout=30)
+        self.assertEqual({h.state for h in supervisor.health().values()}, {MemberState.STOPPED})
+
+
+if __name__ == '__main__':
+    unittest.main()